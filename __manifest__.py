@@ -1,6 +1,6 @@
 {
     "name": "Library Management",
-    "version": "19.0.1.0.0",
+    "version": "19.0.1.2.0",
     "author": "Mohamed Samir",
     "description": "Library Management System for Odoo 19",
     "license": 'LGPL-3',
@@ -13,6 +13,16 @@
         'views/library_book_views.xml',
         'views/library_member_views.xml',
         'views/library_rental_views.xml',
+        'views/library_hold_views.xml',
+        'views/library_circulation_stat_views.xml',
+        'views/library_rental_history_views.xml',
+        'views/library_fine_views.xml',
+        'views/library_metrics_views.xml',
+        'views/library_circulation_event_views.xml',
+        'views/library_reminder_shard_views.xml',
+        'views/res_config_settings_views.xml',
+        'wizard/library_rental_return_wizard_views.xml',
+        'wizard/library_import_wizard_views.xml',
         'data/library_mail_template.xml',
         'data/library_cron.xml',
         'views/base_menu.xml',
@@ -0,0 +1,90 @@
+from odoo import fields, http
+from odoo.exceptions import UserError
+from odoo.http import content_disposition, request
+from werkzeug.wsgi import FileWrapper
+from ..models.library_metrics import render_prometheus
+import hmac
+import tempfile
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+METRICS_TOKEN_PARAM = "library_management.metrics_token"
+KIOSK_MAX_ITEMS = 200
+KIOSK_MAX_EVENTS = 100000
+
+
+def _kiosk_items(items):
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise UserError("items must be a list of objects")
+    if len(items) > KIOSK_MAX_ITEMS:
+        raise UserError(f"At most {KIOSK_MAX_ITEMS} items per call")
+    return items
+
+
+class LibraryController(http.Controller):
+
+    @http.route("/library/rentals/export", type="http", auth="user", methods=["GET"])
+    def export_rentals(self, fmt="csv", **kwargs):
+        if fmt not in EXPORT_CONTENT_TYPES:
+            raise request.not_found()
+        Rental = request.env["library.rental"]
+        Rental.check_access("read")
+        # the export is spooled to a temporary file and sent back in blocks,
+        # neither the rows nor the file are ever held in memory at once
+        export_file = tempfile.TemporaryFile()
+        Rental._export_history(export_file, fmt)
+        export_file.seek(0)
+        filename = f"rental_history_{fields.Date.context_today(Rental)}.{fmt}"
+        return request.make_response(FileWrapper(export_file), headers=[
+            ("Content-Type", EXPORT_CONTENT_TYPES[fmt]),
+            ("Content-Disposition", content_disposition(filename)),
+        ])
+
+    @http.route("/library/metrics", type="http", auth="none", methods=["GET"], save_session=False)
+    def metrics(self, token=None, **kwargs):
+        # scraped by Prometheus, each worker answers with its own counters
+        if not request.db:
+            raise request.not_found()
+        expected = request.env["ir.config_parameter"].sudo().get_param(METRICS_TOKEN_PARAM)
+        authorization = request.httprequest.headers.get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            token = authorization[len("Bearer "):]
+        if not expected or not token or not hmac.compare_digest(token.encode(), expected.encode()):
+            raise request.not_found()
+        return request.make_response(render_prometheus(), headers=[
+            ("Content-Type", "text/plain; version=0.0.4; charset=utf-8"),
+        ])
+
+    # Kiosk API: JSON-RPC calls authenticated with an API key of a library
+    # user (Authorization: Bearer <key>), one transaction and one result per
+    # item for every call
+    @http.route("/library/kiosk/lookup", type="jsonrpc", auth="bearer", readonly=True)
+    def kiosk_lookup(self, codes):
+        if not isinstance(codes, list) or len(codes) > KIOSK_MAX_ITEMS:
+            raise UserError(f"codes must be a list of at most {KIOSK_MAX_ITEMS} ISBNs")
+        return request.env["library.book"]._kiosk_lookup(codes)
+
+    @http.route("/library/kiosk/availability", type="jsonrpc", auth="bearer", readonly=True)
+    def kiosk_availability(self, book_ids):
+        if not isinstance(book_ids, list) or len(book_ids) > KIOSK_MAX_ITEMS:
+            raise UserError(f"book_ids must be a list of at most {KIOSK_MAX_ITEMS} ids")
+        return request.env["library.book"]._kiosk_availability(book_ids)
+
+    @http.route("/library/kiosk/checkout", type="jsonrpc", auth="bearer")
+    def kiosk_checkout(self, items):
+        return request.env["library.rental"]._kiosk_checkout(_kiosk_items(items))
+
+    @http.route("/library/kiosk/return", type="jsonrpc", auth="bearer")
+    def kiosk_return(self, items):
+        return request.env["library.rental"]._kiosk_return(_kiosk_items(items))
+
+    @http.route("/library/kiosk/sync", type="jsonrpc", auth="bearer")
+    def kiosk_sync(self, events):
+        # events recorded offline, queued here and applied in the background
+        if not isinstance(events, list) or len(events) > KIOSK_MAX_EVENTS:
+            raise UserError(f"events must be a list of at most {KIOSK_MAX_EVENTS} events")
+        Event = request.env["library.circulation.event"]
+        Event.check_access("create")
+        return Event._ingest(events)
@@ -0,0 +1,27 @@
+def migrate(cr, version):
+    if not version:
+        return
+
+    # every existing title becomes one copy carrying its former status
+    cr.execute("""
+        INSERT INTO library_book_copy (book_id, status, create_uid, write_uid, create_date, write_date)
+             SELECT book.id, COALESCE(book.status, 'available'), 1, 1,
+                    now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+               FROM library_book book
+              WHERE NOT EXISTS (SELECT 1 FROM library_book_copy copy WHERE copy.book_id = book.id)
+    """)
+    cr.execute("""
+        UPDATE library_rental rental
+           SET copy_id = copy.id
+          FROM library_book_copy copy
+         WHERE copy.book_id = rental.book_id
+           AND rental.copy_id IS NULL
+    """)
+    cr.execute("""
+        UPDATE library_hold hold
+           SET copy_id = copy.id
+          FROM library_book_copy copy
+         WHERE copy.book_id = hold.book_id
+           AND hold.state = 'allocated'
+           AND hold.copy_id IS NULL
+    """)
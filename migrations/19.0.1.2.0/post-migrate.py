@@ -0,0 +1,24 @@
+def migrate(cr, version):
+    if not version:
+        return
+
+    # the copy counters and status of titles are stored again, the status
+    # column still holds whatever it had before the copy layer
+    cr.execute("""
+        UPDATE library_book book
+           SET copy_count = counts.total,
+               available_copy_count = counts.available,
+               available = counts.available > 0,
+               status = CASE WHEN counts.available > 0 THEN 'available'
+                             WHEN counts.reserved > 0 THEN 'reserved'
+                             WHEN counts.total > 0 THEN 'rented'
+                             ELSE 'no_copies' END
+          FROM (SELECT book.id,
+                       count(copy.id) AS total,
+                       count(copy.id) FILTER (WHERE copy.status = 'available') AS available,
+                       count(copy.id) FILTER (WHERE copy.status = 'reserved') AS reserved
+                  FROM library_book book
+             LEFT JOIN library_book_copy copy ON copy.book_id = book.id
+              GROUP BY book.id) counts
+         WHERE book.id = counts.id
+    """)
@@ -1,4 +1,15 @@
 from . import library_author
 from . import library_book
+from . import library_book_copy
 from . import library_rental
-from . import library_member
\ No newline at end of file
+from . import library_member
+from . import library_hold
+from . import library_circulation_stat
+from . import library_rental_archive
+from . import library_rental_history
+from . import library_fine
+from . import library_metrics
+from . import library_job_cursor
+from . import library_circulation_event
+from . import library_reminder_shard
+from . import res_config_settings
@@ -8,9 +8,9 @@ class LibraryAuthor(models.Model):
     
     
     # Fields
-    name = fields.Char(string="Name", required=True, index=True, help="Author Full name")
+    name = fields.Char(string="Name", required=True, index="trigram", help="Author Full name")
     biography = fields.Text(
-        string="Biography", help="Biographical information about the author"
+        string="Biography", index="trigram", help="Biographical information about the author"
     )
     book_ids = fields.One2many(
         comodel_name="library.book",
@@ -30,5 +30,10 @@ class LibraryAuthor(models.Model):
     # Methods
     @api.depends('book_ids')
     def _compute_book_count(self):
+        counts = dict(self.env['library.book']._read_group(
+            [('author_id', 'in', self.filtered('id').ids)],
+            ['author_id'],
+            ['__count'],
+        ))
         for author in self:
-            author.book_count = len(author.book_ids)
+            author.book_count = counts.get(author, 0) if author.id else len(author.book_ids)
@@ -1,5 +1,15 @@
 from odoo import models, fields, api
 from odoo.exceptions import UserError, ValidationError
+from odoo.fields import Domain
+from odoo.tools import SQL, ormcache
+from collections import Counter, defaultdict
+import re
+
+from .library_metrics import instrumented
+from .library_rental import _kiosk_id
+
+# per-worker counters of the ISBN lookup cache, see _get_isbn_cache_stats
+ISBN_CACHE_STATS = {"lookups": 0, "misses": 0}
 
 
 class LibraryBook(models.Model):
@@ -10,7 +20,7 @@ class LibraryBook(models.Model):
 
     # Fields
     name = fields.Char(
-        string="Title", required=True, index=True, help="Tile of the book",tracking=True,
+        string="Title", required=True, index="trigram", help="Tile of the book",tracking=True,
     )
     isbn = fields.Char(
         string="ISBN",
@@ -18,6 +28,13 @@ class LibraryBook(models.Model):
         copy=False,
         help="International Standard Book Number (must be unique)",
     )
+    isbn_normalized = fields.Char(
+        string="Normalized ISBN",
+        compute="_compute_isbn_normalized",
+        store=True,
+        index=True,
+        help="ISBN-13 digits used to resolve scanned ISBN-10, ISBN-13 and hyphenated codes",
+    )
     author_id = fields.Many2one(
         comodel_name="library.author",
         string="Author",
@@ -26,60 +43,307 @@ class LibraryBook(models.Model):
         help="Author of the book",
         tracking=True,
     )
+    catalog_text = fields.Char(
+        string="Catalog Text",
+        compute="_compute_catalog_text",
+        store=True,
+        index="trigram",
+        help="Title, ISBN and author name, indexed for substring and fuzzy catalog search",
+    )
+    catalog_search = fields.Char(
+        string="Catalog",
+        compute="_compute_catalog_search",
+        search="_search_catalog_search",
+        help="Search titles, ISBNs, author names and biographies at once",
+    )
     publication_date = fields.Date(
         string="Publication Date", help="Date when the book was published"
     )
     status = fields.Selection(
-        selection=[("available", "Available"), ("rented", "Rented")],
+        selection=[("available", "Available"), ("rented", "Rented"), ("reserved", "Reserved"), ("no_copies", "No Copies")],
         string="Status",
-        default="available",
-        required=True,
-        help="Current availability status of the book",
-        tracking=True,
+        compute='_compute_copy_counts',
+        store=True,
+        index=True,
+        help="Current availability status of the book, derived from its copies",
     )
     
     available = fields.Boolean(
         string='Is Available',
-        compute='_compute_available',
+        compute='_compute_copy_counts',
+        store=True,
+        help='Computed field indicating if a copy of the book is available for rental'
+    )
+    copy_ids = fields.One2many(
+        comodel_name='library.book.copy',
+        inverse_name='book_id',
+        string='Copies',
+        help='Physical copies of this title'
+    )
+    copy_count = fields.Integer(
+        string='Number of Copies',
+        compute='_compute_copy_counts',
         store=True,
-        help='Computed field indicating if the book is available for rental'
+        help='Number of physical copies of this title'
+    )
+    available_copy_count = fields.Integer(
+        string='Available Copies',
+        compute='_compute_copy_counts',
+        store=True,
+        help='Number of copies on the shelf'
     )
     
     rental_ids = fields.One2many(
         comodel_name='library.rental',
         inverse_name='book_id',
+        string='Rentals',
+        help='Rentals of this book that are not archived yet'
+    )
+    rental_history_ids = fields.One2many(
+        comodel_name='library.rental.history',
+        inverse_name='book_id',
         string='Rental History',
-        help='History of all rentals for this book'
+        help='History of all rentals for this book, archived ones included'
     )
     rental_count = fields.Integer(
         string='Rental Count',
         compute='_compute_rental_count',
         help='Total number of times this book has been rented'
     )
+    hold_ids = fields.One2many(
+        comodel_name='library.hold',
+        inverse_name='book_id',
+        string='Holds',
+        help='Members queueing for this book'
+    )
+    hold_count = fields.Integer(
+        string='Waiting Holds',
+        compute='_compute_hold_count',
+        help='Number of members waiting for this book'
+    )
+    rental_names_dirty = fields.Boolean(
+        string='Rental Titles Outdated',
+        readonly=True,
+        copy=False,
+        help='The title changed and its rentals still show the old one until the background job runs'
+    )
     
     # Constraints
     _isbn_unique = models.Constraint(
         "UNIQUE(isbn)", "The ISBN field must be unique! This ISBN already exists."
     )
+    _rental_names_dirty_idx = models.Index("(id) WHERE rental_names_dirty")
 
     
     # Methods
-    @api.depends('status')
-    def _compute_available(self):
+    @api.depends('hold_ids.state')
+    def _compute_hold_count(self):
+        counts = dict(self.env['library.hold']._read_group(
+            [('book_id', 'in', self.filtered('id').ids), ('state', '=', 'waiting')],
+            ['book_id'],
+            ['__count'],
+        ))
         for book in self:
-            book.available = bool(book.status == 'available')
-    
+            book.hold_count = counts.get(book, 0)
+
+    @api.model
+    def _normalize_isbn(self, code):
+        if not code:
+            return False
+        digits = re.sub(r"[^0-9X]", "", code.upper())
+        if re.fullmatch(r"\d{9}[\dX]", digits):
+            # ISBN-10 -> ISBN-13: add the 978 prefix and recompute the check digit
+            body = "978" + digits[:9]
+            total = sum(int(digit) * (3 if index % 2 else 1) for index, digit in enumerate(body))
+            return body + str(-total % 10)
+        if re.fullmatch(r"\d{13}", digits):
+            return digits
+        # not an ISBN, only ignore case, spaces and hyphens
+        return re.sub(r"[\s-]", "", code).upper()
+
+    @api.depends('isbn')
+    def _compute_isbn_normalized(self):
+        for book in self:
+            book.isbn_normalized = self._normalize_isbn(book.isbn)
+
+    @api.depends('name', 'isbn', 'author_id.name')
+    def _compute_catalog_text(self):
+        for book in self:
+            book.catalog_text = " ".join(
+                part for part in (book.name, book.isbn, book.author_id.name) if part
+            )
+
+    def _compute_catalog_search(self):
+        self.catalog_search = False
+
+    def _search_catalog_search(self, operator, value):
+        if operator not in ('ilike', '=') or not isinstance(value, str):
+            return NotImplemented
+        # every term has to match somewhere, "harr pot" finds "Harry Potter"
+        domain = Domain.TRUE
+        for term in value.split():
+            domain &= Domain('catalog_text', 'ilike', term) | Domain('author_id.biography', 'ilike', term)
+        return domain
+
+    @api.model
+    def _search_catalog(self, text, domain=None, limit=None):
+        query = self._search(Domain(domain or Domain.TRUE) & Domain('catalog_search', 'ilike', text), limit=limit)
+        if self.env.registry.has_trigram:
+            query.order = SQL(
+                "word_similarity(%s, %s) DESC, %s",
+                text,
+                SQL.identifier(query.table, 'catalog_text'),
+                SQL.identifier(query.table, 'id'),
+            )
+        return self.browse(query)
+
+    @api.model
+    def name_search(self, name='', domain=None, operator='ilike', limit=100):
+        if not name or operator != 'ilike':
+            return super().name_search(name, domain, operator, limit)
+        books = self._search_catalog(name, domain=domain, limit=limit)
+        return [(book.id, book.display_name) for book in books.sudo()]
+
+    @api.model
+    def lookup_isbn(self, code):
+        ISBN_CACHE_STATS["lookups"] += 1
+        normalized = self._normalize_isbn(code)
+        return self.browse(normalized and self._lookup_isbn_id(normalized))
+
+    @ormcache('normalized')
+    def _lookup_isbn_id(self, normalized):
+        ISBN_CACHE_STATS["misses"] += 1
+        return self.sudo().search([('isbn_normalized', '=', normalized)], limit=1).id
+
+    def _kiosk_payload(self):
+        # compact status for the kiosk API, the counters are stored on the title
+        return [{
+            "id": book.id,
+            "title": book.name,
+            "isbn": book.isbn or False,
+            "author": book.author_id.name or False,
+            "status": book.status,
+            "available_copies": book.available_copy_count,
+            "copies": book.copy_count,
+            "holds": book.hold_count,
+        } for book in self]
+
+    @api.model
+    def _kiosk_lookup(self, codes):
+        # one entry per scanned code, None when no book matches
+        books = [self.lookup_isbn(code) if isinstance(code, str) else self.browse() for code in codes]
+        payloads = dict(zip(
+            (book.id for book in books if book),
+            self.browse(book.id for book in books if book)._kiosk_payload(),
+        ))
+        return [payloads.get(book.id) if book else None for book in books]
+
+    @api.model
+    def _kiosk_availability(self, book_ids):
+        # one result per requested id, a bad or unknown id only fails its own item
+        ids = [_kiosk_id(book_id) for book_id in book_ids]
+        books = self.browse(book_id for book_id in ids if book_id).exists()
+        payloads = dict(zip(books.ids, books._kiosk_payload()))
+        results = []
+        for book_id, requested in zip(ids, book_ids):
+            if book_id in payloads:
+                results.append({"ok": True, **payloads[book_id]})
+            else:
+                results.append({"ok": False, "error": f"unknown book {requested}"})
+        return results
+
+    @api.model
+    def _get_isbn_cache_stats(self):
+        lookups, misses = ISBN_CACHE_STATS["lookups"], ISBN_CACHE_STATS["misses"]
+        return {"lookups": lookups, "hits": lookups - misses, "misses": misses}
+
+    @api.depends('copy_ids.status')
+    def _compute_copy_counts(self):
+        # stored, only the titles whose copies changed are counted again, in
+        # one grouped query per flush; reads never touch the copies
+        counts = defaultdict(Counter)
+        for book, status, count in self.env['library.book.copy']._read_group(
+            [('book_id', 'in', self.filtered('id').ids)],
+            ['book_id', 'status'],
+            ['__count'],
+        ):
+            counts[book.id][status] = count
+        for book in self:
+            if book.id:
+                book_counts = counts[book.id]
+            else:
+                book_counts = Counter(book.copy_ids.mapped('status'))
+            book.copy_count = book_counts.total()
+            book.available_copy_count = book_counts['available']
+            book.available = bool(book_counts['available'])
+            if book_counts['available']:
+                book.status = 'available'
+            elif book_counts['reserved']:
+                book.status = 'reserved'
+            elif book_counts:
+                book.status = 'rented'
+            else:
+                book.status = 'no_copies'
+
     @api.depends('rental_ids')
     def _compute_rental_count(self):
+        counts = dict(self.env['library.rental.history']._read_group(
+            [('book_id', 'in', self.filtered('id').ids)],
+            ['book_id'],
+            ['__count'],
+        ))
         for book in self:
-            book.rental_count = len(book.rental_ids)
+            book.rental_count = counts.get(book, 0) if book.id else len(book.rental_ids)
             
     
+    # CRUD Methods
+    # Only the ISBN -> id mapping is cached. Status is read fresh from the
+    # record, otherwise every checkout would flush the cache of all workers.
+    # Bulk writers set library_isbn_cache_deferred and clear it once at the end.
+    @api.model_create_multi
+    def create(self, vals_list):
+        books = super().create(vals_list)
+        # every title starts with one copy unless its copies were given
+        without_copies = books.filtered(lambda book: not book.copy_ids)
+        if without_copies:
+            self.env['library.book.copy'].create([
+                {'book_id': book.id} for book in without_copies
+            ])
+        if any(vals.get('isbn') for vals in vals_list) and not self.env.context.get('library_isbn_cache_deferred'):
+            self.env.registry.clear_cache()
+        return books
+
+    def write(self, vals):
+        Rental = self.env['library.rental']
+        deferred = 'name' in vals and Rental._names_deferred()
+        if deferred:
+            vals = {**vals, 'rental_names_dirty': True}
+        # only a changed normalized ISBN can make the lookup cache stale
+        previous_isbns = {}
+        if 'isbn' in vals and not self.env.context.get('library_isbn_cache_deferred'):
+            previous_isbns = {book: book.isbn_normalized for book in self}
+        res = super().write(vals)
+        if any(book.isbn_normalized != isbn for book, isbn in previous_isbns.items()):
+            self.env.registry.clear_cache()
+        if deferred:
+            Rental._trigger_names_sync()
+        elif 'name' in vals:
+            Rental._sync_names('book_title', self.ids)
+        return res
+
+    def unlink(self):
+        has_isbn = any(self.mapped('isbn'))
+        res = super().unlink()
+        if has_isbn:
+            self.env.registry.clear_cache()
+        return res
+
     # Actions
+    @instrumented("book.check_availability")
     def action_check_availability(self):
         self.ensure_one()
         if self.available:
-            message = f"'{self.name}' is available for rental."
+            message = f"'{self.name}' is available for rental ({self.available_copy_count} of {self.copy_count} copies)."
             notification_type = 'success'
         else:
             current_rental = self.env['library.rental'].search([
@@ -89,8 +353,14 @@ class LibraryBook(models.Model):
             
             if current_rental:
                 message = f"'{self.name}' is currently rented by {current_rental.member_id.name}. Due date: {current_rental.due_date}"
+            elif self.status == 'reserved':
+                message = f"'{self.name}' is waiting to be collected by the next members in line."
+            elif self.status == 'no_copies':
+                message = f"'{self.name}' has no copies yet."
             else:
                 message = f"'{self.name}' is not available."
+            if self.hold_count:
+                message += f" {self.hold_count} member(s) waiting."
             notification_type = 'warning'
             
         return {
@@ -104,12 +374,20 @@ class LibraryBook(models.Model):
             }
         }
         
+    @instrumented("book.open_rental_wizard")
     def action_open_rental_wizard(self):
         self.ensure_one()
-        if not self.available:
-            raise UserError(
-                f"Can't check out '{self.name}'. The book is currently not available."
-            )
+        context = {
+            'default_book_id': self.id,
+        }
+        if self.status == 'no_copies':
+            raise UserError(f"'{self.name}' has no copies to rent.")
+        if self.status == 'rented':
+            # members can queue instead of being turned away
+            return self.action_place_hold()
+        if self.status == 'reserved':
+            hold = self.hold_ids.filtered(lambda hold: hold.state == 'allocated')[:1]
+            context['default_member_id'] = hold.member_id.id
             
         return {
             'type': 'ir.actions.act_window',
@@ -117,8 +395,23 @@ class LibraryBook(models.Model):
             'res_model': 'library.rental', 
             'view_mode': 'form', 
             'target': 'new', # new: popup (wizard), current: change the page 
-            'context':{
-                'default_book_id':self.id,
+            'context': context,
+        }
+
+    def action_place_hold(self):
+        self.ensure_one()
+        if self.available:
+            raise UserError(
+                f"Can't place a hold on '{self.name}'. The book is available, rent it directly."
+            )
+        return {
+            'type': 'ir.actions.act_window',
+            'name': f'Hold: {self.name}',
+            'res_model': 'library.hold',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {
+                'default_book_id': self.id,
             }
         }
         
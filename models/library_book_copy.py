@@ -0,0 +1,96 @@
+from odoo import models, fields, api
+from odoo.tools import SQL
+from collections import defaultdict
+
+
+class LibraryBookCopy(models.Model):
+
+    _name = "library.book.copy"
+    _description = "Library Book Copy"
+    _order = "book_id, id"
+
+    # Copies carry the circulation status so checkouts and returns only lock
+    # the copy row they take, the title merely stores counters derived from
+    # its copies when the transaction is flushed.
+
+    # Fields
+    book_id = fields.Many2one(
+        comodel_name="library.book",
+        string="Book",
+        required=True,
+        index=True,
+        ondelete="cascade",
+        help="Title this physical copy belongs to",
+    )
+    barcode = fields.Char(
+        string="Barcode",
+        copy=False,
+        help="Label stuck on the physical copy (must be unique)",
+    )
+    status = fields.Selection(
+        selection=[("available", "Available"), ("rented", "Rented"), ("reserved", "Reserved")],
+        string="Status",
+        default="available",
+        required=True,
+        help="Circulation status of this copy",
+    )
+    rental_ids = fields.One2many(
+        comodel_name="library.rental",
+        inverse_name="copy_id",
+        string="Rental History",
+        help="History of all rentals of this copy",
+    )
+
+    # Constraints
+    _barcode_unique = models.Constraint(
+        "UNIQUE(barcode)", "The barcode must be unique! This barcode already exists."
+    )
+    _available_idx = models.Index("(book_id, id) WHERE status = 'available'")
+
+    # Methods
+    @api.depends("book_id.name", "barcode")
+    def _compute_display_name(self):
+        for copy in self:
+            copy.display_name = (
+                f"{copy.book_id.name} [{copy.barcode}]" if copy.barcode else copy.book_id.name
+            )
+
+    @api.model
+    def _lock_available(self, needs):
+        # Takes up to `needs[book_id]` free copies of each title. Copies being
+        # checked out at another desk are skipped rather than waited for.
+        # Returns {book_id: copies}.
+        allocated = defaultdict(lambda: self.browse())
+        if not needs:
+            return allocated
+        self.flush_model(["book_id", "status"])
+        self.env.cr.execute(SQL(
+            """
+            SELECT free.id, free.book_id
+              FROM unnest(%(book_ids)s::int[], %(counts)s::int[]) AS need(book_id, n)
+              CROSS JOIN LATERAL (
+                    SELECT id, book_id
+                      FROM library_book_copy
+                     WHERE book_id = need.book_id
+                       AND status = 'available'
+                  ORDER BY id
+                     LIMIT need.n
+                       FOR UPDATE SKIP LOCKED
+              ) free
+            """,
+            book_ids=list(needs),
+            counts=list(needs.values()),
+        ))
+        for copy_id, book_id in self.env.cr.fetchall():
+            allocated[book_id] |= self.browse(copy_id)
+        return allocated
+
+    def _release_to_queue(self):
+        # freed copies go to the next member in line, or back on the shelf
+        holds = self.env["library.hold"]._allocate_next(self)
+        shelved = self - holds.copy_id
+        if shelved:
+            shelved.write({"status": "available"})
+        if holds:
+            holds.copy_id.write({"status": "reserved"})
+        return holds
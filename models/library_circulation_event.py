@@ -0,0 +1,237 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+from datetime import datetime, timezone
+
+import json
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+EVENT_BATCH_SIZE = 1000
+EVENT_TYPES = ("checkout", "return")
+# payload key -> column, scans are kept as sent and resolved when applied
+EVENT_COLUMNS = {
+    "id": ("client_event_id", "varchar"),
+    "kiosk": ("kiosk", "varchar"),
+    "type": ("event_type", "varchar"),
+    "time": ("event_time", "timestamp"),
+    "isbn": ("isbn", "varchar"),
+    "barcode": ("barcode", "varchar"),
+    "book_id": ("book_ref", "int"),
+    "member_id": ("member_ref", "int"),
+    "member_email": ("member_email", "varchar"),
+    "due_date": ("due_date", "date"),
+}
+
+
+class LibraryCirculationEvent(models.Model):
+
+    _name = "library.circulation.event"
+    _description = "Library Circulation Event"
+    _order = "event_time desc, id desc"
+    _rec_name = "client_event_id"
+
+    # Checkouts and returns recorded by kiosks while offline. Events are
+    # only appended, the client id makes a replayed upload a no-op, and
+    # pending events are applied in time order by a background job.
+
+    # Fields
+    client_event_id = fields.Char(string="Event ID", required=True, readonly=True, help="Id generated by the kiosk")
+    kiosk = fields.Char(string="Kiosk", readonly=True)
+    event_type = fields.Selection(
+        selection=[("checkout", "Checkout"), ("return", "Return")],
+        string="Type",
+        required=True,
+        readonly=True,
+    )
+    event_time = fields.Datetime(string="Scanned On", required=True, readonly=True)
+    isbn = fields.Char(string="ISBN", readonly=True)
+    barcode = fields.Char(string="Barcode", readonly=True)
+    book_ref = fields.Integer(string="Book ID", readonly=True)
+    member_ref = fields.Integer(string="Member ID", readonly=True)
+    member_email = fields.Char(string="Member Email", readonly=True)
+    due_date = fields.Date(string="Due Date", readonly=True)
+    state = fields.Selection(
+        selection=[("pending", "Pending"), ("applied", "Applied"), ("conflict", "Conflict")],
+        string="Status",
+        default="pending",
+        required=True,
+        readonly=True,
+    )
+    message = fields.Char(string="Conflict", readonly=True)
+    rental_id = fields.Many2one(
+        comodel_name="library.rental",
+        string="Rental",
+        readonly=True,
+        ondelete="set null",
+    )
+
+    # Constraints
+    _client_event_unique = models.UniqueIndex("(client_event_id)", "Circulation events can only be received once.")
+    _pending_idx = models.Index("(event_time, id) WHERE state = 'pending'")
+
+    # Methods
+    @api.model
+    def _clean_event(self, event):
+        if not isinstance(event, dict):
+            return None, "expected an object"
+        if not event.get("id") or not isinstance(event["id"], str):
+            return None, "missing id"
+        if event.get("type") not in EVENT_TYPES:
+            return None, f"unknown type '{event.get('type')}'"
+        try:
+            event_time = datetime.fromisoformat(str(event.get("time")))
+        except ValueError:
+            return None, f"invalid time '{event.get('time')}'"
+        if event_time.tzinfo:
+            event_time = event_time.astimezone(timezone.utc).replace(tzinfo=None)
+        row = {
+            column: event[key] for key, (column, sql_type) in EVENT_COLUMNS.items()
+            if event.get(key) not in (None, "")
+        }
+        row["event_time"] = fields.Datetime.to_string(event_time)
+        try:
+            for column in ("book_ref", "member_ref"):
+                if column in row:
+                    row[column] = int(row[column])
+            if "due_date" in row:
+                row["due_date"] = fields.Date.to_string(fields.Date.to_date(row["due_date"]))
+        except (TypeError, ValueError):
+            return None, "invalid book_id, member_id or due_date"
+        if not any(row.get(column) for column in ("isbn", "barcode", "book_ref")):
+            return None, "missing isbn, barcode or book_id"
+        return row, None
+
+    @api.model
+    def _ingest(self, events):
+        # One insert for the whole upload, events already received are skipped
+        # by the unique index. Returns the counts and the rejected events.
+        rows, rejected = [], []
+        for index, event in enumerate(events):
+            row, error = self._clean_event(event)
+            if error:
+                rejected.append({"index": index, "id": isinstance(event, dict) and event.get("id"), "error": error})
+            else:
+                rows.append(row)
+        queued = 0
+        if rows:
+            self.env.cr.execute(SQL(
+                """
+                INSERT INTO library_circulation_event (%(columns)s, state,
+                                                       create_uid, write_uid, create_date, write_date)
+                     SELECT %(columns)s, 'pending',
+                            %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                       FROM jsonb_to_recordset(%(rows)s::jsonb) AS event(%(definitions)s)
+                ON CONFLICT (client_event_id) DO NOTHING
+                """,
+                columns=SQL(", ").join(SQL.identifier(column) for column, sql_type in EVENT_COLUMNS.values()),
+                definitions=SQL(", ").join(
+                    SQL("%s %s", SQL.identifier(column), SQL(sql_type)) for column, sql_type in EVENT_COLUMNS.values()
+                ),
+                rows=json.dumps(rows),
+                uid=self.env.uid,
+            ))
+            queued = self.env.cr.rowcount
+        if queued:
+            self._trigger_apply()
+        return {
+            "received": len(events),
+            "queued": queued,
+            "duplicates": len(rows) - queued,
+            "rejected": rejected,
+        }
+
+    @api.model
+    def _trigger_apply(self):
+        cron = self.env.ref("library_management.library_circulation_event_cron", raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    def _split_waves(self):
+        # Consecutive events touching different books are applied together,
+        # a book showing up again starts a new wave so that its events keep
+        # their order. Returns one recordset per wave.
+        items = [event._as_item() for event in self]
+        resolved = self.env["library.rental"]._kiosk_resolve_books(items)
+        waves, wave, seen = [], self.browse(), set()
+        for event, (book_id, copy_id, error) in zip(self, resolved):
+            if book_id and book_id in seen:
+                waves.append(wave)
+                wave, seen = self.browse(), set()
+            wave |= event
+            if book_id:
+                seen.add(book_id)
+        if wave:
+            waves.append(wave)
+        return waves
+
+    def _as_item(self):
+        item = {
+            "isbn": self.isbn,
+            "barcode": self.barcode,
+            "book_id": self.book_ref,
+            "member_id": self.member_ref,
+            "member_email": self.member_email,
+        }
+        if self.event_type == "checkout":
+            item.update(checkout_date=self.event_time.date(), due_date=self.due_date)
+        else:
+            item.update(return_date=self.event_time.date())
+        return {key: value for key, value in item.items() if value}
+
+    def _apply_wave(self):
+        # only replayed events may date a checkout or return in the past
+        Rental = self.env["library.rental"].with_context(library_kiosk_scan_dates=True)
+        outcome = {}
+        # books differ within a wave, returns go first to free loan slots
+        for event_type, apply in (("return", Rental._kiosk_return), ("checkout", Rental._kiosk_checkout)):
+            events = self.filtered(lambda event: event.event_type == event_type)
+            if events:
+                outcome.update(zip(events.ids, apply([event._as_item() for event in events])))
+        ids = list(outcome)
+        self.env.cr.execute(SQL(
+            """
+            UPDATE library_circulation_event event
+               SET state = result.state,
+                   message = result.message,
+                   rental_id = result.rental_id,
+                   write_uid = %(uid)s,
+                   write_date = now() AT TIME ZONE 'UTC'
+              FROM unnest(%(ids)s::int[], %(states)s::varchar[], %(messages)s::varchar[], %(rentals)s::int[])
+                   AS result(id, state, message, rental_id)
+             WHERE event.id = result.id
+            """,
+            uid=self.env.uid,
+            ids=ids,
+            states=["applied" if outcome[id_]["ok"] else "conflict" for id_ in ids],
+            messages=[outcome[id_].get("error") for id_ in ids],
+            rentals=[outcome[id_].get("rental_id") for id_ in ids],
+        ))
+        self.invalidate_recordset(["state", "message", "rental_id"])
+        return sum(result["ok"] for result in outcome.values())
+
+    # Action Methods
+    def action_retry(self):
+        if any(event.state != "conflict" for event in self):
+            raise UserError("Only events in conflict can be retried.")
+        self.write({"state": "pending", "message": False})
+        self._trigger_apply()
+
+    # CRON Methods
+    @api.model
+    def _cron_apply_events(self, batch_size=None):
+        batch_size = batch_size or EVENT_BATCH_SIZE
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        applied = conflicts = 0
+        while events := self.search([("state", "=", "pending")], order="event_time, id", limit=batch_size):
+            for wave in events._split_waves():
+                ok = wave._apply_wave()
+                applied += ok
+                conflicts += len(wave) - ok
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        _logger.info("Applied %s circulation events, %s in conflict", applied, conflicts)
+        return True
@@ -0,0 +1,169 @@
+from odoo import models, fields, api
+from odoo.tools import SQL
+from odoo.tools.sql import table_exists
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# (date, book_id, member_id) keys of rentals changed since the last refresh,
+# filled by triggers on library_rental so plain SQL updates are caught too
+STATS_QUEUE_TABLE = "library_circulation_stat_queue"
+# only changes to these columns can move a summary row
+STATS_COLUMNS = ("checkout_date", "book_id", "member_id", "state", "due_date", "return_date", "days_overdue")
+
+
+class LibraryCirculationStat(models.Model):
+
+    _name = "library.circulation.stat"
+    _description = "Library Circulation Statistics"
+    _order = "date desc, id"
+
+    # Summary of library.rental by checkout day, book and member, refreshed
+    # incrementally so reports never scan the live rentals table. Changed
+    # rentals are queued by triggers in the same transaction as the change,
+    # a refresh only consumes the keys committed before it started.
+
+    # Fields
+    date = fields.Date(string="Checkout Date", required=True, readonly=True, index=True)
+    book_id = fields.Many2one(
+        comodel_name="library.book", string="Book", required=True, readonly=True,
+        index=True, ondelete="cascade",
+    )
+    author_id = fields.Many2one(
+        comodel_name="library.author", string="Author", readonly=True,
+        index=True, ondelete="set null",
+    )
+    member_id = fields.Many2one(
+        comodel_name="library.member", string="Member", required=True, readonly=True,
+        index=True, ondelete="cascade",
+    )
+    loan_count = fields.Integer(string="Loans", readonly=True, aggregator="sum")
+    active_count = fields.Integer(string="Active Loans", readonly=True, aggregator="sum")
+    overdue_count = fields.Integer(string="Overdue Loans", readonly=True, aggregator="sum")
+    late_return_count = fields.Integer(string="Late Returns", readonly=True, aggregator="sum")
+    days_overdue = fields.Integer(string="Days Overdue", readonly=True, aggregator="sum")
+
+    # Constraints
+    _key_unique = models.UniqueIndex("(date, book_id, member_id)")
+
+    # Methods
+    def init(self):
+        cr = self.env.cr
+        if not table_exists(cr, STATS_QUEUE_TABLE):
+            cr.execute(SQL(
+                """
+                CREATE TABLE %(queue)s (date date, book_id int, member_id int);
+                INSERT INTO %(queue)s
+                SELECT DISTINCT checkout_date, book_id, member_id FROM library_rental
+                 UNION
+                SELECT DISTINCT checkout_date, book_id, member_id FROM library_rental_archive
+                """,
+                queue=SQL.identifier(STATS_QUEUE_TABLE),
+            ))
+        # statement level triggers: one INSERT ... SELECT per statement, bulk
+        # updates don't pay a trigger call per row
+        changed = SQL(" OR ").join(
+            SQL("o.%(column)s IS DISTINCT FROM n.%(column)s", column=SQL.identifier(column))
+            for column in STATS_COLUMNS
+        )
+        cr.execute(SQL(
+            """
+            CREATE OR REPLACE FUNCTION library_circulation_stat_enqueue() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO %(queue)s
+                    SELECT DISTINCT checkout_date, book_id, member_id FROM new_rows;
+                ELSIF TG_OP = 'DELETE' THEN
+                    INSERT INTO %(queue)s
+                    SELECT DISTINCT checkout_date, book_id, member_id FROM old_rows;
+                ELSE
+                    INSERT INTO %(queue)s
+                    SELECT o.checkout_date, o.book_id, o.member_id
+                      FROM old_rows o JOIN new_rows n ON n.id = o.id
+                     WHERE %(changed)s
+                     UNION
+                    SELECT n.checkout_date, n.book_id, n.member_id
+                      FROM old_rows o JOIN new_rows n ON n.id = o.id
+                     WHERE %(changed)s;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS library_rental_stat_insert ON library_rental;
+            DROP TRIGGER IF EXISTS library_rental_stat_update ON library_rental;
+            DROP TRIGGER IF EXISTS library_rental_stat_delete ON library_rental;
+            CREATE TRIGGER library_rental_stat_insert AFTER INSERT ON library_rental
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION library_circulation_stat_enqueue();
+            CREATE TRIGGER library_rental_stat_update AFTER UPDATE ON library_rental
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION library_circulation_stat_enqueue();
+            CREATE TRIGGER library_rental_stat_delete AFTER DELETE ON library_rental
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION library_circulation_stat_enqueue();
+            """,
+            queue=SQL.identifier(STATS_QUEUE_TABLE),
+            changed=changed,
+        ))
+
+    @api.model
+    def _rental_source(self):
+        # rows the summary is built from, archived rentals included
+        return SQL("library_rental_history")
+
+    @api.model
+    def _refresh_keys(self, keys):
+        # Rebuilds the summary rows of the given (date, book_id, member_id)
+        # keys. `keys` is an SQL query returning those three columns, it may
+        # be a DELETE ... RETURNING consuming the queue.
+        self.env["library.rental"].flush_model()
+        self.env["library.rental.archive"].flush_model()
+        self.env.cr.execute(SQL(
+            """
+            CREATE TEMPORARY TABLE IF NOT EXISTS library_stat_keys (
+                date date, book_id int, member_id int
+            ) ON COMMIT DROP;
+            TRUNCATE library_stat_keys;
+            WITH source_keys AS (%(keys)s)
+            INSERT INTO library_stat_keys SELECT * FROM source_keys;
+
+            DELETE FROM library_circulation_stat stat
+             USING library_stat_keys k
+             WHERE stat.date = k.date
+               AND stat.book_id = k.book_id
+               AND stat.member_id = k.member_id;
+
+            INSERT INTO library_circulation_stat (
+                   date, book_id, author_id, member_id,
+                   loan_count, active_count, overdue_count, late_return_count, days_overdue,
+                   create_uid, write_uid, create_date, write_date)
+            SELECT rental.checkout_date, rental.book_id, book.author_id, rental.member_id,
+                   count(*),
+                   count(*) FILTER (WHERE rental.state IN ('ongoing', 'overdue')),
+                   count(*) FILTER (WHERE rental.state = 'overdue'),
+                   count(*) FILTER (WHERE rental.return_date > rental.due_date),
+                   COALESCE(sum(rental.days_overdue), 0),
+                   %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+              FROM (SELECT DISTINCT date, book_id, member_id FROM library_stat_keys) k
+              JOIN %(source)s rental
+                ON rental.checkout_date = k.date
+               AND rental.book_id = k.book_id
+               AND rental.member_id = k.member_id
+              JOIN library_book book ON book.id = rental.book_id
+          GROUP BY rental.checkout_date, rental.book_id, book.author_id, rental.member_id
+            """,
+            keys=keys,
+            source=self._rental_source(),
+            uid=self.env.uid,
+        ))
+        self.invalidate_model()
+
+    # CRON Methods
+    def _cron_refresh_stats(self):
+        # rows queued by transactions still running are invisible to the
+        # DELETE, they stay queued for the next refresh
+        self._refresh_keys(SQL("DELETE FROM %s RETURNING date, book_id, member_id", SQL.identifier(STATS_QUEUE_TABLE)))
+        _logger.info("Circulation statistics refreshed")
+        return True
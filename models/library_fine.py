@@ -0,0 +1,107 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+FINE_PER_DAY_PARAM = "library_management.fine_per_day"
+
+
+class LibraryFine(models.Model):
+
+    _name = "library.fine"
+    _description = "Library Fine"
+    _inherit = ['mail.thread']
+    _order = "accrual_date desc, id desc"
+    _rec_name = "rental_id"
+
+    # Fields
+    rental_id = fields.Many2one(
+        comodel_name="library.rental",
+        string="Rental",
+        readonly=True,
+        ondelete="set null",
+        help="The late rental, cleared once the rental is archived",
+    )
+    member_id = fields.Many2one(
+        comodel_name="library.member",
+        string="Member",
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete="restrict",
+    )
+    book_id = fields.Many2one(
+        comodel_name="library.book",
+        string="Book",
+        readonly=True,
+        ondelete="set null",
+    )
+    days = fields.Integer(string="Days Late", readonly=True)
+    rate = fields.Float(string="Fine per Day", readonly=True, help="Rate in force when the fine was opened")
+    amount = fields.Float(string="Amount", readonly=True, aggregator="sum")
+    accrual_date = fields.Date(string="Last Accrual", readonly=True)
+    state = fields.Selection(
+        selection=[("open", "Open"), ("paid", "Paid"), ("waived", "Waived")],
+        string="Status",
+        default="open",
+        required=True,
+        tracking=True,
+    )
+
+    # Constraints
+    _rental_unique = models.UniqueIndex(
+        "(rental_id) WHERE rental_id IS NOT NULL",
+        "A rental can only have one fine.",
+    )
+
+    # Methods
+    @api.model
+    def _accrue_fines(self, rentals=None):
+        # One upsert for every late rental, or for the given ones. Open fines
+        # follow days_overdue at the rate they were opened with, settled
+        # fines are left alone.
+        rate = float(self.env["ir.config_parameter"].sudo().get_param(FINE_PER_DAY_PARAM, 0) or 0)
+        if rate <= 0:
+            return
+        if rentals is not None and not rentals:
+            return
+        self.env["library.rental"].flush_model(["member_id", "book_id", "state", "days_overdue"])
+        scope = SQL("rental.state IN ('ongoing', 'overdue')")
+        if rentals is not None:
+            scope = SQL("rental.id = ANY(%s)", rentals.ids)
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO library_fine (rental_id, member_id, book_id, days, rate, amount,
+                                      accrual_date, state,
+                                      create_uid, write_uid, create_date, write_date)
+                 SELECT rental.id, rental.member_id, rental.book_id, rental.days_overdue, %(rate)s,
+                        rental.days_overdue * %(rate)s, %(today)s, 'open',
+                        %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                   FROM library_rental rental
+                  WHERE %(scope)s
+                    AND rental.days_overdue > 0
+            ON CONFLICT (rental_id) WHERE rental_id IS NOT NULL
+            DO UPDATE SET days = EXCLUDED.days,
+                          amount = library_fine.rate * EXCLUDED.days,
+                          accrual_date = EXCLUDED.accrual_date,
+                          write_uid = EXCLUDED.write_uid,
+                          write_date = EXCLUDED.write_date
+                    WHERE library_fine.state = 'open'
+                      AND library_fine.days IS DISTINCT FROM EXCLUDED.days
+            """,
+            rate=rate,
+            today=fields.Date.context_today(self),
+            uid=self.env.uid,
+            scope=scope,
+        ))
+        self.invalidate_model()
+
+    # Action Methods
+    def action_mark_paid(self):
+        if any(fine.state != "open" for fine in self):
+            raise UserError("Only open fines can be marked as paid.")
+        self.write({"state": "paid"})
+
+    def action_waive(self):
+        if any(fine.state != "open" for fine in self):
+            raise UserError("Only open fines can be waived.")
+        self.write({"state": "waived"})
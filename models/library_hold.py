@@ -0,0 +1,178 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+from collections import defaultdict
+from datetime import timedelta
+
+
+HOLD_PICKUP_DAYS = 3
+
+
+class LibraryHold(models.Model):
+
+    _name = "library.hold"
+    _description = "Library Hold"
+    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _order = "priority desc, request_date, id"
+
+    # Fields
+    book_id = fields.Many2one(
+        comodel_name="library.book",
+        string="Book",
+        required=True,
+        index=True,
+        ondelete="cascade",
+        help="The book the member is waiting for",
+        tracking=True,
+    )
+    member_id = fields.Many2one(
+        comodel_name="library.member",
+        string="Member",
+        required=True,
+        index=True,
+        ondelete="cascade",
+        help="The member waiting for the book",
+        tracking=True,
+    )
+    priority = fields.Selection(
+        selection=[("0", "Normal"), ("1", "Urgent")],
+        string="Priority",
+        default="0",
+        help="Urgent holds are served before normal ones, then first come first served",
+    )
+    request_date = fields.Datetime(
+        string="Request Date",
+        default=fields.Datetime.now,
+        required=True,
+        help="Position in the queue among holds of the same priority",
+    )
+    allocation_date = fields.Datetime(
+        string="Allocation Date", help="When the returned book was set aside for the member"
+    )
+    expiry_date = fields.Date(
+        string="Pickup Before",
+        help="The book goes to the next member in line if not collected by this date",
+        tracking=True,
+    )
+    state = fields.Selection(
+        selection=[
+            ("waiting", "Waiting"),
+            ("allocated", "Ready for Pickup"),
+            ("collected", "Collected"),
+            ("expired", "Expired"),
+            ("cancelled", "Cancelled"),
+        ],
+        string="Status",
+        default="waiting",
+        required=True,
+        help="Current status of the hold",
+        tracking=True,
+    )
+    copy_id = fields.Many2one(
+        comodel_name="library.book.copy",
+        string="Copy",
+        ondelete="set null",
+        help="The copy set aside for the member once the hold is ready for pickup",
+    )
+    rental_id = fields.Many2one(
+        comodel_name="library.rental",
+        string="Rental",
+        ondelete="set null",
+        help="The rental created when the member collected the book",
+    )
+
+    # Constraints
+    _member_book_unique = models.UniqueIndex(
+        "(book_id, member_id) WHERE state IN ('waiting', 'allocated')",
+        "This member is already waiting for this book.",
+    )
+    # the head of each queue is one index lookup, whatever the queue length
+    _queue_idx = models.Index("(book_id, priority DESC, request_date, id) WHERE state = 'waiting'")
+
+    # CRUD Methods
+    @api.model_create_multi
+    def create(self, vals_list):
+        books = self.env["library.book"].browse(
+            dict.fromkeys(vals["book_id"] for vals in vals_list if vals.get("book_id"))
+        )
+        for book in books:
+            if book.available:
+                raise UserError(
+                    f"Can't place a hold: '{book.name}' is available, rent it directly."
+                )
+        return super().create(vals_list)
+
+    # Methods
+    @api.model
+    def _allocate_next(self, copies):
+        # Sets the freed copies aside for the next members in line. Queue heads
+        # are locked with SKIP LOCKED so concurrent returns never hand the same
+        # hold out twice. Returns the allocated holds.
+        if not copies:
+            return self
+        copies_by_book = defaultdict(list)
+        for copy in copies:
+            copies_by_book[copy.book_id.id].append(copy)
+        self.flush_model(["book_id", "state", "priority", "request_date"])
+        self.env.cr.execute(SQL(
+            """
+            SELECT head.id, head.book_id
+              FROM unnest(%(book_ids)s::int[], %(counts)s::int[]) AS book(id, n)
+              CROSS JOIN LATERAL (
+                    SELECT id, book_id
+                      FROM library_hold
+                     WHERE book_id = book.id
+                       AND state = 'waiting'
+                  ORDER BY priority DESC, request_date, id
+                     LIMIT book.n
+                       FOR UPDATE SKIP LOCKED
+              ) head
+            """,
+            book_ids=list(copies_by_book),
+            counts=[len(book_copies) for book_copies in copies_by_book.values()],
+        ))
+        rows = self.env.cr.fetchall()
+        holds = self.browse(hold_id for hold_id, _book_id in rows)
+        if holds:
+            pickup_days = int(self.env["ir.config_parameter"].sudo().get_param(
+                "library_management.hold_pickup_days", HOLD_PICKUP_DAYS
+            ))
+            holds.write({
+                "state": "allocated",
+                "allocation_date": fields.Datetime.now(),
+                "expiry_date": fields.Date.context_today(self) + timedelta(days=pickup_days),
+            })
+            for hold_id, book_id in rows:
+                self.browse(hold_id).copy_id = copies_by_book[book_id].pop()
+        return holds
+
+    def _mark_collected(self, rentals):
+        rental_by_copy = {rental.copy_id.id: rental for rental in rentals}
+        for hold in self:
+            if hold.copy_id.id in rental_by_copy:
+                hold.write({
+                    "state": "collected",
+                    "rental_id": rental_by_copy[hold.copy_id.id].id,
+                })
+
+    # Action Methods
+    def action_cancel(self):
+        allocated = self.filtered(lambda hold: hold.state == "allocated")
+        self.filtered(lambda hold: hold.state in ["waiting", "allocated"]).write({
+            "state": "cancelled"
+        })
+        if allocated:
+            allocated.copy_id._release_to_queue()
+        return True
+
+    # CRON Methods
+    def _cron_expire_holds(self):
+        today = fields.Date.context_today(self)
+        expired = self.search([
+            ("state", "=", "allocated"),
+            ("expiry_date", "<", today),
+        ])
+        if expired:
+            expired.write({"state": "expired"})
+            expired.copy_id._release_to_queue()
+        return True
@@ -0,0 +1,45 @@
+from odoo import models, fields, api
+from odoo.tools import SQL
+
+
+class LibraryJobCursor(models.Model):
+
+    _name = "library.job.cursor"
+    _description = "Library Job Cursor"
+    _rec_name = "job"
+
+    # Where a long background job stopped, so an interrupted run resumes
+    # there. Kept out of ir.config_parameter: each of its writes clears the
+    # registry caches of every worker.
+
+    # Fields
+    job = fields.Char(string="Job", required=True, readonly=True)
+    position = fields.Char(string="Position", readonly=True)
+
+    # Constraints
+    _job_unique = models.UniqueIndex("(job)", "A job has one cursor.")
+
+    # Methods
+    @api.model
+    def _get_position(self, job):
+        self.env.cr.execute(SQL("SELECT position FROM library_job_cursor WHERE job = %s", job))
+        row = self.env.cr.fetchone()
+        return row and row[0]
+
+    @api.model
+    def _set_position(self, job, position):
+        # plain SQL, committed with the work it tracks
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO library_job_cursor (job, position, create_uid, write_uid, create_date, write_date)
+                 VALUES (%(job)s, %(position)s, %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC')
+            ON CONFLICT (job) DO UPDATE
+                    SET position = EXCLUDED.position,
+                        write_uid = EXCLUDED.write_uid,
+                        write_date = EXCLUDED.write_date
+            """,
+            job=job,
+            position=position or None,
+            uid=self.env.uid,
+        ))
+        self.invalidate_model(["position"])
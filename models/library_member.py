@@ -1,6 +1,22 @@
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
+from odoo.tools import SQL
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+import logging
 import re
+import threading
+
+_logger = logging.getLogger(__name__)
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+DIGEST_BATCH_SIZE = 1000
+REMINDER_INTERVAL_PARAM = "library_management.reminder_interval_days"
+REMINDER_RATE_PARAM = "library_management.reminder_rate"
+# failed digests are queued again during this window, unless the address itself is wrong
+DIGEST_RETRY_WINDOW = timedelta(days=1)
+DIGEST_PERMANENT_FAILURES = ["mail_email_invalid", "mail_email_missing"]
 
 
 class LibraryMember(models.Model):
@@ -24,14 +40,58 @@ class LibraryMember(models.Model):
         comodel_name='library.rental',
         inverse_name='member_id',
         string='Rentals',
-        help='All rentals by this member'
+        help='Rentals by this member that are not archived yet'
+    )
+    rental_history_ids = fields.One2many(
+        comodel_name='library.rental.history',
+        inverse_name='member_id',
+        string='Rental History',
+        help='All rentals by this member, archived ones included'
     )
     current_rental_ids = fields.One2many(
         comodel_name='library.rental',
         inverse_name='member_id',
         string='Current Rentals',
         help='Active rentals by this member',
-        compute='_compute_current_rentals'
+        domain=[('state', 'in', ['ongoing', 'overdue'])],
+    )
+    fine_ids = fields.One2many(
+        comodel_name='library.fine',
+        inverse_name='member_id',
+        string='Fines',
+        help='Fines charged for late returns'
+    )
+    fine_balance = fields.Float(
+        string="Fines Due",
+        compute="_compute_fine_balance",
+        help="Total of the open fines of this member",
+    )
+    overdue_rental_ids = fields.One2many(
+        comodel_name='library.rental',
+        inverse_name='member_id',
+        string='Overdue Rentals',
+        help='Rentals of this member past their due date',
+        domain=[('state', '=', 'overdue')],
+    )
+    rental_names_dirty = fields.Boolean(
+        string="Rental Names Outdated",
+        readonly=True,
+        copy=False,
+        help="The name changed and its rentals still show the old one until the background job runs",
+    )
+    last_overdue_reminder_date = fields.Date(
+        string="Last Overdue Reminder",
+        readonly=True,
+        copy=False,
+        help="Day the last overdue digest was queued, members get at most one per reminder interval",
+    )
+    overdue_digest_mail_id = fields.Many2one(
+        comodel_name='mail.mail',
+        string="Last Overdue Digest",
+        readonly=True,
+        copy=False,
+        ondelete="set null",
+        help="Queued digest email, kept until it is sent to retry failed deliveries",
     )
     rental_count = fields.Integer(
         string="Total Rentals",
@@ -54,11 +114,12 @@ class LibraryMember(models.Model):
 
 
     # Constraints
+    _rental_names_dirty_idx = models.Index("(id) WHERE rental_names_dirty")
+
     @api.constrains('email')
     def _check_email(self):
-        email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
         for member in self:
-            if member.email and not email_pattern.match(member.email):
+            if member.email and not EMAIL_PATTERN.match(member.email):
                 raise ValidationError(
                     f"Invalid email format: {member.email}"
                     "Please enter a valid email address."
@@ -68,16 +129,130 @@ class LibraryMember(models.Model):
     # Methods
     @api.depends('rental_ids', 'rental_ids.state')
     def _compute_rental_count(self):
+        # one grouped aggregate for the whole batch instead of loading the
+        # full rental history of every member
+        counts = defaultdict(Counter)
+        members = self.filtered('id')
+        if members:
+            for member, state, count in self.env['library.rental.history']._read_group(
+                [('member_id', 'in', members.ids)],
+                ['member_id', 'state'],
+                ['__count'],
+            ):
+                counts[member.id][state] = count
         for member in self:
-            member.rental_count = len(member.rental_ids)
-            member.active_rental_count = len(
-                member.rental_ids.filtered(lambda r: r.state == 'ongoing')
-            )
-            member.overdue_rental_count = len(
-                member.rental_ids.filtered(lambda r: r.state == 'overdue')
-            )
-            
-    def _compute_current_rentals(self):
+            if member.id:
+                member_counts = counts[member.id]
+            else:
+                member_counts = Counter(member.rental_ids.mapped('state'))
+            member.rental_count = member_counts.total()
+            member.active_rental_count = member_counts['ongoing']
+            member.overdue_rental_count = member_counts['overdue']
+
+    @api.depends('fine_ids.amount', 'fine_ids.state')
+    def _compute_fine_balance(self):
+        balances = dict(self.env['library.fine']._read_group(
+            [('member_id', 'in', self.filtered('id').ids), ('state', '=', 'open')],
+            ['member_id'],
+            ['amount:sum'],
+        ))
         for member in self:
-            member.current_rental_ids = member.rental_ids.filtered(lambda rental: rental.state in ['ongoing', 'overdue'])
+            member.fine_balance = balances.get(member, 0.0)
+
+    # CRUD Methods
+    def write(self, vals):
+        Rental = self.env['library.rental']
+        deferred = 'name' in vals and Rental._names_deferred()
+        if deferred:
+            vals = {**vals, 'rental_names_dirty': True}
+        res = super().write(vals)
+        if deferred:
+            Rental._trigger_names_sync()
+        elif 'name' in vals:
+            Rental._sync_names('member_name', self.ids)
+        return res
+
+    # CRON Methods
+    @api.model
+    def _send_overdue_digests(self, batch_size=None, member_ids=None):
+        # One email per member listing all their overdue books. Digests are
+        # rendered a batch at a time and left in the mail queue. With a rate
+        # set, each batch is scheduled a minute after the previous one.
+        # member_ids restricts the run to some members, it then commits
+        # nothing and leaves that to the caller.
+        template = self.env.ref(
+            "library_management.email_template_overdue_digest", raise_if_not_found=False
+        )
+        if not template:
+            return
+        ICP = self.env["ir.config_parameter"].sudo()
+        # an interval of 0 would match the members reminded a moment ago
+        interval = max(1, int(ICP.get_param(REMINDER_INTERVAL_PARAM, 1) or 1))
+        rate = int(ICP.get_param(REMINDER_RATE_PARAM, 0) or 0)
+        batch_size = rate or batch_size or DIGEST_BATCH_SIZE
+        auto_commit = member_ids is None and not getattr(threading.current_thread(), "testing", False)
+        today = fields.Date.context_today(self)
+        start = fields.Datetime.now()
+
+        domain = [
+            ("overdue_rental_ids", "!=", False),
+            ("email", "!=", False),
+            "|",
+            ("last_overdue_reminder_date", "=", False),
+            ("last_overdue_reminder_date", "<=", today - timedelta(days=interval)),
+        ]
+        if member_ids is not None:
+            domain.append(("id", "in", member_ids))
+        sent = last_id = 0
+        while members := self.search(domain + [("id", ">", last_id)], order="id", limit=batch_size):
+            email_values = {"scheduled_date": start + timedelta(minutes=sent // batch_size)} if rate else None
+            if not members._queue_overdue_digests(template, email_values):
+                break
+            last_id = members[-1].id
+            sent += len(members)
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        _logger.info("Queued %s overdue digests", sent)
+
+    def _queue_overdue_digests(self, template=None, email_values=None):
+        template = template or self.env.ref(
+            "library_management.email_template_overdue_digest", raise_if_not_found=False
+        )
+        if not template or not self:
+            return False
+        try:
+            with self.env.cr.savepoint():
+                mails = template.send_mail_batch(self.ids, email_values=email_values)
+        except Exception as e:
+            _logger.error("Could not queue overdue digests: %s", e)
+            return False
+        mail_by_member = {mail.res_id: mail.id for mail in mails}
+        # the reminder date is stored with the queued mails, a crashed run
+        # never reminds the same member twice
+        self.env.cr.execute(SQL(
+            """
+            UPDATE library_member member
+               SET last_overdue_reminder_date = %s,
+                   overdue_digest_mail_id = digest.mail_id
+              FROM unnest(%s::int[], %s::int[]) AS digest(member_id, mail_id)
+             WHERE member.id = digest.member_id
+            """,
+            fields.Date.context_today(self),
+            self.ids,
+            [mail_by_member.get(member_id) for member_id in self.ids],
+        ))
+        self.invalidate_recordset(["last_overdue_reminder_date", "overdue_digest_mail_id"])
+        return True
 
+    @api.model
+    def _cron_retry_overdue_digests(self):
+        failed = self.search([
+            ("overdue_digest_mail_id.state", "=", "exception"),
+            ("overdue_digest_mail_id.failure_type", "not in", DIGEST_PERMANENT_FAILURES),
+            ("overdue_digest_mail_id.create_date", ">=", fields.Datetime.now() - DIGEST_RETRY_WINDOW),
+        ]).overdue_digest_mail_id
+        if failed:
+            failed.sudo().mark_outgoing()
+            _logger.info("Queued %s failed overdue digests again", len(failed))
+        return True
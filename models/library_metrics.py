@@ -0,0 +1,179 @@
+from odoo import models, fields, api
+from functools import wraps
+
+import logging
+import os
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+SLOW_CALL_PARAM = "library_management.slow_call_ms"
+SLOW_CALL_MS = 1000
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# per-worker aggregates of the instrumented calls, see instrumented()
+METRICS = {}
+METRICS_LOCK = threading.Lock()
+METRICS_ENABLED = True
+
+
+def instrumented(operation):
+    # Records latency, SQL queries and records handled by a model method.
+    # Only counters are updated in memory, nothing is written to the database.
+    # Calls that raise are recorded too and counted as errors.
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not METRICS_ENABLED:
+                return method(self, *args, **kwargs)
+            cr = self.env.cr
+            queries = cr.sql_log_count
+            start = time.perf_counter()
+            result, failed = None, True
+            try:
+                result = method(self, *args, **kwargs)
+                failed = False
+            finally:
+                elapsed = time.perf_counter() - start
+                queries = cr.sql_log_count - queries
+                rows = len(self) or (len(result) if isinstance(result, (models.BaseModel, list)) else 0)
+                _record_call(operation, elapsed, queries, rows, failed)
+            # only reached on success, a failed call may have aborted the transaction
+            threshold = int(self.env["ir.config_parameter"].sudo().get_param(SLOW_CALL_PARAM, SLOW_CALL_MS))
+            if elapsed * 1000 >= threshold:
+                with METRICS_LOCK:
+                    METRICS[operation]["slow"] += 1
+                _logger.warning(
+                    "Slow %s: %.0f ms, %s queries, %s records (uid %s)",
+                    operation, elapsed * 1000, queries, rows, self.env.uid,
+                )
+            return result
+        return wrapper
+    return decorator
+
+
+def _record_call(operation, elapsed, queries, rows, failed=False):
+    with METRICS_LOCK:
+        stats = METRICS.get(operation)
+        if stats is None:
+            stats = METRICS[operation] = {
+                "count": 0, "seconds": 0.0, "max": 0.0, "queries": 0, "rows": 0, "slow": 0, "errors": 0,
+                "buckets": [0] * len(LATENCY_BUCKETS),
+            }
+        stats["count"] += 1
+        stats["errors"] += failed
+        stats["seconds"] += elapsed
+        stats["max"] = max(stats["max"], elapsed)
+        stats["queries"] += queries
+        stats["rows"] += rows
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                stats["buckets"][index] += 1
+                break
+
+
+def get_metrics():
+    with METRICS_LOCK:
+        return {
+            operation: {**stats, "buckets": list(stats["buckets"])}
+            for operation, stats in METRICS.items()
+        }
+
+
+def reset_metrics():
+    with METRICS_LOCK:
+        METRICS.clear()
+
+
+def _percentile(stats, ratio):
+    # upper bound of the bucket holding the given share of the calls
+    target = stats["count"] * ratio
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS, stats["buckets"]):
+        seen += count
+        if seen >= target:
+            return bound
+    return stats["max"]
+
+
+def render_prometheus():
+    # Prometheus text exposition format, labelled with the worker pid since
+    # every worker keeps its own aggregates
+    pid = os.getpid()
+    lines = [
+        "# HELP library_call_duration_seconds Latency of library hot paths.",
+        "# TYPE library_call_duration_seconds histogram",
+    ]
+    metrics = get_metrics()
+    for operation, stats in sorted(metrics.items()):
+        labels = f'operation="{operation}",pid="{pid}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, stats["buckets"]):
+            cumulative += count
+            lines.append(f'library_call_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'library_call_duration_seconds_bucket{{{labels},le="+Inf"}} {stats["count"]}')
+        lines.append(f"library_call_duration_seconds_sum{{{labels}}} {stats['seconds']:.6f}")
+        lines.append(f"library_call_duration_seconds_count{{{labels}}} {stats['count']}")
+    for name, key, description in (
+        ("library_call_queries_total", "queries", "SQL queries run by library hot paths."),
+        ("library_call_records_total", "rows", "Records handled by library hot paths."),
+        ("library_slow_calls_total", "slow", "Library calls slower than the slow call threshold."),
+        ("library_call_errors_total", "errors", "Library calls that raised an exception."),
+    ):
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} counter")
+        for operation, stats in sorted(metrics.items()):
+            lines.append(f'{name}{{operation="{operation}",pid="{pid}"}} {stats[key]}')
+    return "\n".join(lines) + "\n"
+
+
+class LibraryMetricsReport(models.TransientModel):
+
+    _name = "library.metrics.report"
+    _description = "Library Performance Metrics"
+    _order = "total_ms desc"
+
+    # Snapshot of the in-memory aggregates of the worker serving the request.
+
+    # Fields
+    operation = fields.Char(string="Operation", readonly=True)
+    calls = fields.Integer(string="Calls", readonly=True)
+    total_ms = fields.Float(string="Total (ms)", readonly=True, digits=(16, 1))
+    avg_ms = fields.Float(string="Average (ms)", readonly=True, digits=(16, 1), aggregator="avg")
+    p95_ms = fields.Float(string="95th Percentile (ms)", readonly=True, digits=(16, 1), aggregator="max")
+    max_ms = fields.Float(string="Max (ms)", readonly=True, digits=(16, 1), aggregator="max")
+    avg_queries = fields.Float(string="Queries per Call", readonly=True, digits=(16, 1), aggregator="avg")
+    rows = fields.Integer(string="Records", readonly=True)
+    slow_calls = fields.Integer(string="Slow Calls", readonly=True)
+    error_calls = fields.Integer(string="Errors", readonly=True)
+
+    # Action Methods
+    @api.model
+    def action_open_dashboard(self):
+        self.search([("create_uid", "=", self.env.uid)]).unlink()
+        self.create([{
+            "operation": operation,
+            "calls": stats["count"],
+            "total_ms": stats["seconds"] * 1000,
+            "avg_ms": stats["seconds"] * 1000 / stats["count"],
+            "p95_ms": _percentile(stats, 0.95) * 1000,
+            "max_ms": stats["max"] * 1000,
+            "avg_queries": stats["queries"] / stats["count"],
+            "rows": stats["rows"],
+            "slow_calls": stats["slow"],
+            "error_calls": stats["errors"],
+        } for operation, stats in get_metrics().items() if stats["count"]])
+        return {
+            "type": "ir.actions.act_window",
+            "name": f"Performance Metrics (worker {os.getpid()})",
+            "res_model": self._name,
+            "view_mode": "list,graph",
+            "domain": [("create_uid", "=", self.env.uid)],
+            "target": "current",
+        }
+
+    @api.model
+    def action_reset_metrics(self):
+        reset_metrics()
+        return self.action_open_dashboard()
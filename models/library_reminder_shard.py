@@ -0,0 +1,176 @@
+from odoo import models, fields, api
+from odoo.tools import SQL
+from datetime import datetime, time, timedelta
+
+import logging
+import os
+import threading
+
+_logger = logging.getLogger(__name__)
+
+REMINDER_SHARDS_PARAM = "library_management.reminder_shards"
+PRE_DUE_DAYS_PARAM = "library_management.reminder_pre_due_days"
+POST_DUE_DAYS_PARAM = "library_management.reminder_post_due_days"
+PRE_DUE_DAYS = "2"
+POST_DUE_DAYS = "1,3,7"
+# shards of a day are spread between these hours (UTC)
+WINDOW_START_HOUR = 8
+WINDOW_END_HOUR = 18
+
+
+def _parse_days(value, minimum=0):
+    return sorted({
+        int(day) for day in (value or "").split(",")
+        if day.strip().isdigit() and int(day) >= minimum
+    })
+
+
+class LibraryReminderShard(models.Model):
+
+    _name = "library.reminder.shard"
+    _description = "Library Reminder Shard"
+    _order = "reminder_date desc, bucket"
+    _rec_name = "reminder_date"
+
+    # One slice of a day's reminders: the members whose id falls in the
+    # bucket. Cron slices claim due shards with SKIP LOCKED, so they can run
+    # side by side on several workers without sending twice. Flagging late
+    # rentals stays with the nightly check, shards only send reminders.
+
+    # Fields
+    reminder_date = fields.Date(string="Day", required=True, readonly=True)
+    bucket = fields.Integer(string="Bucket", required=True, readonly=True, help="Members with id % buckets == bucket")
+    bucket_count = fields.Integer(string="Buckets", required=True, readonly=True)
+    scheduled_at = fields.Datetime(string="Scheduled At", required=True, readonly=True)
+    state = fields.Selection(
+        selection=[("pending", "Pending"), ("done", "Done")],
+        string="Status",
+        default="pending",
+        required=True,
+        readonly=True,
+    )
+    done_at = fields.Datetime(string="Done At", readonly=True)
+    worker = fields.Char(string="Worker", readonly=True)
+    due_soon_count = fields.Integer(string="Due Soon Reminders", readonly=True)
+    overdue_count = fields.Integer(string="Overdue Reminders", readonly=True)
+
+    # Constraints
+    _day_bucket_unique = models.UniqueIndex("(reminder_date, bucket)", "A day has one shard per bucket.")
+    _pending_idx = models.Index("(scheduled_at, id) WHERE state = 'pending'")
+
+    # Methods
+    @api.model
+    def _plan_day(self, day):
+        # The shards of a day are planned once, the bucket count in force at
+        # that time is kept for the whole day. Returns the number planned.
+        buckets = int(self.env["ir.config_parameter"].sudo().get_param(REMINDER_SHARDS_PARAM, 0) or 0)
+        if buckets <= 0:
+            return 0
+        start = datetime.combine(day, time(WINDOW_START_HOUR))
+        step = (WINDOW_END_HOUR - WINDOW_START_HOUR) * 3600 / buckets
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO library_reminder_shard (reminder_date, bucket, bucket_count, scheduled_at, state,
+                                                create_uid, write_uid, create_date, write_date)
+                 SELECT %(day)s, bucket, %(buckets)s,
+                        %(start)s + make_interval(secs => bucket * %(step)s), 'pending',
+                        %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                   FROM generate_series(0, %(buckets)s - 1) bucket
+                  WHERE NOT EXISTS (SELECT 1 FROM library_reminder_shard WHERE reminder_date = %(day)s)
+            ON CONFLICT (reminder_date, bucket) DO NOTHING
+            """,
+            day=day,
+            buckets=buckets,
+            start=start,
+            step=step,
+            uid=self.env.uid,
+        ))
+        return self.env.cr.rowcount
+
+    @api.model
+    def _claim(self):
+        # the row stays locked until the caller commits, other slices skip it
+        now = fields.Datetime.now()
+        self.env.cr.execute(SQL(
+            """
+               SELECT id
+                 FROM library_reminder_shard
+                WHERE state = 'pending'
+                  AND scheduled_at <= %s
+             ORDER BY scheduled_at, id
+                LIMIT 1
+                  FOR UPDATE SKIP LOCKED
+            """,
+            now,
+        ))
+        row = self.env.cr.fetchone()
+        return self.browse(row and row[0])
+
+    def _rentals(self, domain):
+        # active rentals of the shard's members, the modulo can't be
+        # expressed as a domain so the ids come from one query
+        Rental = self.env["library.rental"]
+        Rental.flush_model(["member_id", "state", "due_date"])
+        query = Rental._search(domain)
+        self.env.cr.execute(SQL(
+            "SELECT id FROM library_rental WHERE id IN (%s) AND member_id %% %s = %s ORDER BY id",
+            query.subselect(),
+            self.bucket_count,
+            self.bucket,
+        ))
+        return Rental.browse(row[0] for row in self.env.cr.fetchall())
+
+    def _run(self):
+        self.ensure_one()
+        ICP = self.env["ir.config_parameter"].sudo()
+        Rental = self.env["library.rental"]
+        day = self.reminder_date
+        pre_due = [day + timedelta(days=days) for days in _parse_days(ICP.get_param(PRE_DUE_DAYS_PARAM, PRE_DUE_DAYS))]
+        # a rental is only late from the day after its due date
+        post_due = [day - timedelta(days=days) for days in _parse_days(ICP.get_param(POST_DUE_DAYS_PARAM, POST_DUE_DAYS), 1)]
+
+        # late rentals are flagged by the nightly check, only the post-due
+        # offsets get a reminder
+        reminded = self._rentals([("state", "in", ["ongoing", "overdue"]), ("due_date", "in", post_due)]) if post_due else Rental
+        if reminded:
+            if ICP.get_param("library_management.reminder_mode", "rental") == "digest":
+                # same interval check and rate as the nightly digests
+                self.env["library.member"]._send_overdue_digests(member_ids=reminded.member_id.ids)
+            else:
+                template = self.env.ref("library_management.email_template_overdue_remainder", raise_if_not_found=False)
+                if template:
+                    reminded._queue_reminders(template)
+
+        due_soon = self._rentals([("state", "=", "ongoing"), ("due_date", "in", pre_due)]) if pre_due else Rental
+        due_soon._send_due_soon_reminders()
+
+        self.write({
+            "state": "done",
+            "done_at": fields.Datetime.now(),
+            "worker": f"{os.getpid()}:{threading.current_thread().name}",
+            "due_soon_count": len(due_soon),
+            "overdue_count": len(reminded),
+        })
+
+    # CRON Methods
+    @api.model
+    def _cron_run_shards(self, limit=None):
+        # Every cron slice calls this: plan today if needed, then work
+        # through the shards that are due, one transaction per shard. Shards
+        # missed on an earlier day are caught up first, oldest first.
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        today = fields.Date.context_today(self)
+        self._plan_day(today)
+        if auto_commit:
+            self.env.cr.commit()
+
+        done = 0
+        while (limit is None or done < limit) and (shard := self._claim()):
+            shard._run()
+            done += 1
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        if done:
+            _logger.info("Ran %s reminder shards", done)
+        return True
@@ -1,11 +1,60 @@
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError, UserError
+from odoo.fields import Domain
+from odoo.tools import SQL, str2bool
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 from datetime import timedelta
+from uuid import uuid4
 
+from .library_metrics import instrumented
+
+import csv
+import io
+import json
 import logging
+import re
+import threading
+
+import psycopg2.errors
 
 _logger = logging.getLogger(__name__)
 
+OVERDUE_BATCH_SIZE = 1000
+OVERDUE_CURSOR_JOB = "overdue_sweep"
+# without reminders to resend, a crash only costs a rescan: the cursor is
+# saved every few batches rather than after each one
+OVERDUE_CURSOR_EVERY = 10
+ACTIVE_RENTAL_INDEX = "library_rental_copy_active_unique"
+TRACKING_POLICY_PARAM = "library_management.tracking_policy"
+MAX_ACTIVE_LOANS_PARAM = "library_management.max_active_loans"
+BLOCK_WHEN_OVERDUE_PARAM = "library_management.block_when_overdue"
+REMINDER_MODE_PARAM = "library_management.reminder_mode"
+REMINDER_SHARDS_PARAM = "library_management.reminder_shards"
+NAMES_POLICY_PARAM = "library_management.names_propagation"
+NAMES_BATCH_SIZE = 5000
+# denormalized column -> (source table, rental foreign key)
+NAME_SOURCES = {
+    "book_title": ("library_book", "book_id"),
+    "member_name": ("library_member", "member_id"),
+}
+KIOSK_LOAN_DAYS_PARAM = "library_management.kiosk_loan_days"
+KIOSK_LOAN_DAYS = 14
+EXPORT_CHUNK_SIZE = 10000
+EXPORT_COLUMNS = (
+    "id", "book", "isbn", "copy", "member", "email",
+    "checkout_date", "due_date", "return_date", "state", "days_overdue",
+)
+
+
+def _kiosk_id(value):
+    # ids come from JSON as numbers or digit strings, None when malformed
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value if value > 0 else None
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
 
 class LibraryRental(models.Model):
 
@@ -23,6 +72,14 @@ class LibraryRental(models.Model):
         help="The book being rented",
         tracking=True,
     )
+    copy_id = fields.Many2one(
+        comodel_name="library.book.copy",
+        string="Copy",
+        index=True,
+        ondelete="restrict",
+        help="The physical copy handed out, any free copy of the book if left empty",
+        tracking=True,
+    )
     member_id = fields.Many2one(
         comodel_name="library.member",
         string="Member",
@@ -40,7 +97,7 @@ class LibraryRental(models.Model):
         tracking=True,
     )
     due_date = fields.Date(
-        string="Due Date", required=True, help="Date whan the book should be returned",tracking=True,
+        string="Due Date", required=True, index=True, help="Date whan the book should be returned",tracking=True,
     )
     return_date = fields.Date(
         string="Return Date", help="Actual date when the book was returned",tracking=True,
@@ -60,17 +117,21 @@ class LibraryRental(models.Model):
     days_overdue = fields.Integer(
         string="Days Overdue",
         compute="_compute_days_overdue",
-        help="Number of days the rental is overdue",
+        store=True,
+        index=True,
+        help="Number of days the rental is overdue, refreshed nightly by the overdue check",
     )
+    # copied when the rental is created, later renames are propagated by
+    # _sync_names instead of the ORM rewriting the whole history
     book_title = fields.Char(
-        related="book_id.name",
         string="Book Title",
+        compute="_compute_names",
         store=True,
         help="Title of the rented book",
     )
     member_name = fields.Char(
-        related="member_id.name",
         string="Member Name",
+        compute="_compute_names",
         store=True,
         help="Name of the member rented the book",
     )
@@ -81,24 +142,70 @@ class LibraryRental(models.Model):
     )
 
     # Constraints
-    @api.constrains("book_id", "state")
-    def _check_availability(self):
-        for rental in self:
-            if rental.state == "ongoing":
-                existing_rental = self.search(
-                    [
-                        ("book_id", "=", rental.book_id.id),
-                        ("state", "in", ["ongoing", "overdue"]),
-                        ("id", "!=", rental.id),
-                    ],
-                    limit=1,
+    _copy_active_unique = models.UniqueIndex(
+        "(copy_id) WHERE state IN ('ongoing', 'overdue')",
+        "Cannot create rental: this copy is already rented. "
+        "Please wait until the book is returned.",
+    )
+    _state_due_date_idx = models.Index("(state, due_date)")
+    _write_date_idx = models.Index("(write_date)")
+    _archive_idx = models.Index("(return_date, id) WHERE state = 'returned'")
+    _member_active_idx = models.Index("(member_id) WHERE state IN ('ongoing', 'overdue')")
+
+    @api.model
+    def _check_loan_rules(self, vals_list):
+        # one aggregated lookup for the whole batch, members are never
+        # queried one by one
+        ICP = self.env["ir.config_parameter"].sudo()
+        max_loans = int(ICP.get_param(MAX_ACTIVE_LOANS_PARAM, 0) or 0)
+        block_overdue = str2bool(ICP.get_param(BLOCK_WHEN_OVERDUE_PARAM) or "False")
+        new_loans = Counter(vals["member_id"] for vals in vals_list if vals.get("member_id"))
+        if not (max_loans or block_overdue) or not new_loans:
+            return
+        loans = defaultdict(Counter)
+        for member, state, count in self._read_group(
+            [("member_id", "in", list(new_loans)), ("state", "in", ["ongoing", "overdue"])],
+            ["member_id", "state"],
+            ["__count"],
+        ):
+            loans[member.id][state] = count
+        errors = []
+        for member_id, count in new_loans.items():
+            member_loans = loans[member_id]
+            if block_overdue and member_loans["overdue"]:
+                errors.append(
+                    f"{self.env['library.member'].browse(member_id).name} has "
+                    f"{member_loans['overdue']} overdue book(s) to return first."
                 )
-                if existing_rental:
-                    raise ValidationError(
-                        f"Cannot create rental: '{rental.book_id.name}' is already "
-                        f"rented by {existing_rental.member_name}"
-                        f"Please wait until the book is returned."
-                    )
+            elif max_loans and member_loans.total() + count > max_loans:
+                errors.append(
+                    f"{self.env['library.member'].browse(member_id).name} would hold "
+                    f"{member_loans.total() + count} books, the limit is {max_loans}."
+                )
+        if errors:
+            raise UserError("Can't create rental:\n" + "\n".join(errors))
+
+    @contextmanager
+    def _map_active_rental_violation(self):
+        # the partial unique index is the real guard against double renting,
+        # turn its violation back into the usual message
+        try:
+            with self.env.cr.savepoint():
+                yield
+        except psycopg2.errors.UniqueViolation as error:
+            if error.diag.constraint_name != ACTIVE_RENTAL_INDEX:
+                raise
+            match = re.search(r"\(copy_id\)=\((\d+)\)", error.diag.message_detail or "")
+            copy = self.env["library.book.copy"].browse(int(match.group(1)) if match else [])
+            existing_rental = self.search([
+                ("copy_id", "=", copy.id),
+                ("state", "in", ["ongoing", "overdue"]),
+            ], limit=1)
+            raise ValidationError(
+                f"Cannot create rental: '{copy.display_name}' is already "
+                f"rented by {existing_rental.member_name}"
+                f"Please wait until the book is returned."
+            ) from None
 
     @api.constrains("due_date", "checkout_date")
     def _check_due_date(self):
@@ -136,27 +243,438 @@ class LibraryRental(models.Model):
             else:
                 rental.days_overdue = 0
 
+    @api.depends("book_id", "member_id")
+    def _compute_names(self):
+        for rental in self:
+            rental.book_title = rental.book_id.name
+            rental.member_name = rental.member_id.name
+
+    @api.model
+    def _names_deferred(self):
+        # 'deferred' leaves renames to the background job, 'immediate'
+        # propagates them in the renaming transaction
+        policy = self.env["ir.config_parameter"].sudo().get_param(NAMES_POLICY_PARAM, "deferred")
+        return policy == "deferred"
+
+    @api.model
+    def _sync_names(self, column, source_ids=None, limit=None):
+        # Copies the current book or member names onto their rentals in one
+        # UPDATE ... FROM, either for the given sources or for those flagged
+        # dirty, at most `limit` rentals. Returns the number of rentals fixed.
+        # The background job skips rentals locked by another transaction,
+        # their sources stay dirty for the next run. A rename propagated in
+        # its own transaction waits for them instead, nothing would flag them.
+        table, key = NAME_SOURCES[column]
+        self.env.flush_all()
+        if source_ids is None:
+            scope = SQL("source.rental_names_dirty")
+            lock = SQL("FOR UPDATE OF stale SKIP LOCKED")
+        else:
+            scope = SQL("source.id = ANY(%s)", list(source_ids))
+            lock = SQL("FOR UPDATE OF stale")
+        self.env.cr.execute(SQL(
+            """
+            UPDATE library_rental rental
+               SET %(column)s = source.name,
+                   write_date = now() AT TIME ZONE 'UTC'
+              FROM %(table)s source
+             WHERE rental.id IN (
+                    SELECT stale.id
+                      FROM library_rental stale
+                      JOIN %(table)s source ON source.id = %(stale_key)s
+                     WHERE %(scope)s
+                       AND %(stale_column)s IS DISTINCT FROM source.name
+                           %(limit)s
+                           %(lock)s
+                   )
+               AND source.id = %(rental_key)s
+            """,
+            column=SQL.identifier(column),
+            table=SQL.identifier(table),
+            stale_key=SQL.identifier("stale", key),
+            stale_column=SQL.identifier("stale", column),
+            rental_key=SQL.identifier("rental", key),
+            scope=scope,
+            limit=SQL("LIMIT %s", limit) if limit else SQL(),
+            lock=lock,
+        ))
+        count = self.env.cr.rowcount
+        self.invalidate_model([column, "write_date"])
+        return count
+
+    @api.model
+    def _trigger_names_sync(self):
+        cron = self.env.ref("library_management.library_rental_names_cron", raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    def _system_tracking(self, batch=True):
+        # Interactive edits keep full chatter tracking. System and batch paths
+        # follow the tracking policy: 'full', 'summary' (one note per batch)
+        # or 'none'. Returns the records to write with and the policy.
+        if not (batch or self.env.context.get("library_system_write")):
+            return self, "full"
+        policy = self.env["ir.config_parameter"].sudo().get_param(TRACKING_POLICY_PARAM, "summary")
+        if policy == "full":
+            return self, policy
+        return self.with_context(tracking_disable=True), policy
+
+    def _log_batch_summary(self, policy, body):
+        if policy == "summary" and self:
+            self[:1]._message_log(body=f"{body}: {len(self)} rental(s) in this batch.")
+
+    def _refresh_days_overdue(self):
+        # days_overdue only moves with the calendar for active rentals, bump
+        # them all in one statement instead of recomputing record by record.
+        # write_date moves too, so incremental consumers see the change.
+        today = fields.Date.context_today(self)
+        self.flush_model(["due_date", "state", "days_overdue"])
+        self.env.cr.execute(SQL(
+            """
+            UPDATE library_rental
+               SET days_overdue = GREATEST(%(today)s::date - due_date, 0),
+                   write_date = now() AT TIME ZONE 'UTC'
+             WHERE state IN ('ongoing', 'overdue')
+               AND days_overdue IS DISTINCT FROM GREATEST(%(today)s::date - due_date, 0)
+            """,
+            today=today,
+        ))
+        self.invalidate_model(["days_overdue", "write_date"])
+
+    @contextmanager
+    def _streaming_cursor(self, chunk_size):
+        # The ORM cursor fetches a whole result set into memory. A named
+        # psycopg2 cursor keeps it on the server and hands it out in chunks;
+        # opened on the connection of self.env.cr it shares its transaction
+        # and snapshot. odoo.sql_db has no public API for named cursors.
+        with self.env.cr._cnx.cursor(f"library_rental_export_{uuid4().hex}") as cursor:
+            cursor.itersize = chunk_size
+            yield cursor
+
+    @api.model
+    def _export_history(self, fileobj, fmt="csv", domain=None, chunk_size=EXPORT_CHUNK_SIZE):
+        # rows come from a server-side cursor and are written as they arrive,
+        # memory stays flat whatever the size of the history
+        if fmt not in ("csv", "jsonl"):
+            raise UserError(f"Unsupported export format: {fmt}")
+        # archived rentals are part of the history, read through the view;
+        # _search applies the record rules of the user
+        History = self.env["library.rental.history"]
+        for model in (History._name, "library.book", "library.book.copy", "library.member"):
+            self.env[model].check_access("read")
+        query = History._search(domain or [], order="id")
+        rental = query.table
+        book = query.make_alias(rental, "book_id")
+        query.add_join("JOIN", book, "library_book", SQL(
+            "%s = %s", SQL.identifier(book, "id"), SQL.identifier(rental, "book_id"),
+        ))
+        member = query.make_alias(rental, "member_id")
+        query.add_join("JOIN", member, "library_member", SQL(
+            "%s = %s", SQL.identifier(member, "id"), SQL.identifier(rental, "member_id"),
+        ))
+        copy = query.make_alias(rental, "copy_id")
+        query.add_join("LEFT JOIN", copy, "library_book_copy", SQL(
+            "%s = %s", SQL.identifier(copy, "id"), SQL.identifier(rental, "copy_id"),
+        ))
+        export_sql = query.select(
+            SQL.identifier(rental, "id"),
+            SQL.identifier(book, "name"),
+            SQL.identifier(book, "isbn"),
+            SQL.identifier(copy, "barcode"),
+            SQL.identifier(member, "name"),
+            SQL.identifier(member, "email"),
+            *(SQL.identifier(rental, column) for column in (
+                "checkout_date", "due_date", "return_date", "state", "days_overdue",
+            )),
+        )
+        self.env.flush_all()
+        text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        if fmt == "csv":
+            writer.writerow(EXPORT_COLUMNS)
+        count = 0
+        with self._streaming_cursor(chunk_size) as cursor:
+            cursor.execute(export_sql.code, export_sql.params)
+            while rows := cursor.fetchmany(chunk_size):
+                if fmt == "csv":
+                    writer.writerows(rows)
+                else:
+                    text.writelines(
+                        json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + "\n" for row in rows
+                    )
+                count += len(rows)
+        # hand the file back to the caller open
+        text.detach()
+        return count
+
+    @api.model
+    def _kiosk_resolve_books(self, items):
+        # scanned codes -> (book id, copy id, error) per item, barcodes and
+        # book ids are checked in one query each, ISBNs go through the cache.
+        # A malformed field only fails its own item.
+        Book = self.env["library.book"]
+        barcodes = [item["barcode"] for item in items if isinstance(item.get("barcode"), str)]
+        copies = {
+            copy.barcode: copy
+            for copy in self.env["library.book.copy"].search_fetch([("barcode", "in", barcodes)], ["barcode", "book_id"])
+        } if barcodes else {}
+        book_ids = set(Book.browse(
+            book_id for item in items
+            if not item.get("barcode") and (book_id := _kiosk_id(item.get("book_id")))
+        ).exists().ids)
+        resolved = []
+        for item in items:
+            if item.get("barcode"):
+                copy = copies.get(item["barcode"]) if isinstance(item["barcode"], str) else None
+                resolved.append((copy.book_id.id, copy.id, None) if copy else (False, False, f"unknown barcode '{item['barcode']}'"))
+            elif item.get("isbn"):
+                book = Book.lookup_isbn(item["isbn"]) if isinstance(item["isbn"], str) else Book
+                resolved.append((book.id, False, None) if book else (False, False, f"unknown ISBN '{item['isbn']}'"))
+            elif item.get("book_id"):
+                book_id = _kiosk_id(item["book_id"])
+                resolved.append((book_id, False, None) if book_id in book_ids else (False, False, f"unknown book '{item['book_id']}'"))
+            else:
+                resolved.append((False, False, "missing isbn, barcode or book_id"))
+        return resolved
+
+    @api.model
+    def _kiosk_resolve_members(self, items):
+        Member = self.env["library.member"]
+        emails = [item["member_email"].strip() for item in items if isinstance(item.get("member_email"), str)]
+        by_email = {
+            member.email: member.id
+            for member in Member.search_fetch([("email", "in", emails)], ["email"])
+        } if emails else {}
+        member_ids = set(Member.browse(
+            member_id for item in items if (member_id := _kiosk_id(item.get("member_id")))
+        ).exists().ids)
+        resolved = []
+        for item in items:
+            if item.get("member_id"):
+                member_id = _kiosk_id(item["member_id"])
+                resolved.append((member_id, None) if member_id in member_ids else (False, f"unknown member '{item['member_id']}'"))
+            elif item.get("member_email"):
+                email = item["member_email"]
+                member_id = isinstance(email, str) and by_email.get(email.strip())
+                resolved.append((member_id, None) if member_id else (False, f"unknown member '{item['member_email']}'"))
+            else:
+                resolved.append((False, None))
+        return resolved
+
+    def _kiosk_apply(self, pending, results, operation):
+        # The whole batch is tried at once, a failure replays it item by item
+        # so every scan gets its own verdict. operation takes the payloads
+        # and returns one result per payload.
+        if not pending:
+            return
+        try:
+            with self.env.cr.savepoint():
+                outcome = operation([payload for index, payload in pending])
+        except (psycopg2.Error, UserError, ValidationError):
+            outcome = []
+            for index, payload in pending:
+                try:
+                    with self.env.cr.savepoint():
+                        outcome += operation([payload])
+                except (psycopg2.Error, UserError, ValidationError) as e:
+                    outcome.append({"ok": False, "error": str(e).strip()})
+        for (index, payload), result in zip(pending, outcome):
+            results[index] = result
+
+    @api.model
+    @instrumented("kiosk.checkout")
+    def _kiosk_checkout(self, items):
+        # items: {"isbn" | "barcode" | "book_id", "member_id" | "member_email",
+        # "due_date"?}, results come back in the same order. A due date can
+        # shorten the loan but never extend it past the kiosk loan period.
+        # The scan's "checkout_date" is only trusted when replaying offline
+        # events.
+        today = fields.Date.context_today(self)
+        scan_dates = self.env.context.get("library_kiosk_scan_dates")
+        loan_days = int(self.env["ir.config_parameter"].sudo().get_param(KIOSK_LOAN_DAYS_PARAM, KIOSK_LOAN_DAYS))
+        results = [None] * len(items)
+        pending = []
+        books = self._kiosk_resolve_books(items)
+        members = self._kiosk_resolve_members(items)
+        for index, (item, (book_id, copy_id, book_error), (member_id, member_error)) in enumerate(zip(items, books, members)):
+            error = book_error or member_error or (not member_id and "missing member_id or member_email")
+            checkout_date, due_date = today, None
+            try:
+                if scan_dates:
+                    checkout_date = fields.Date.to_date(item.get("checkout_date")) or today
+                due_date = fields.Date.to_date(item.get("due_date"))
+            except (TypeError, ValueError):
+                error = error or "invalid checkout or due date"
+            max_due_date = checkout_date + timedelta(days=loan_days)
+            due_date = min(due_date, max_due_date) if due_date else max_due_date
+            if error:
+                results[index] = {"ok": False, "error": error}
+                continue
+            vals = {"book_id": book_id, "member_id": member_id, "checkout_date": checkout_date, "due_date": due_date}
+            if copy_id:
+                vals["copy_id"] = copy_id
+            pending.append((index, vals))
+
+        def checkout(vals_list):
+            # create() fills in the vals, a replay must start from the scan
+            rentals = self.create([dict(vals) for vals in vals_list])
+            return [{
+                "ok": True,
+                "rental_id": rental.id,
+                "book": rental.book_title,
+                "copy": rental.copy_id.barcode or False,
+                "due_date": fields.Date.to_string(rental.due_date),
+            } for rental in rentals]
+
+        self._kiosk_apply(pending, results, checkout)
+        return results
+
+    @api.model
+    @instrumented("kiosk.return")
+    def _kiosk_return(self, items):
+        # items: {"rental_id"} or a scanned {"isbn" | "barcode" | "book_id"},
+        # optionally with the member, to find the active rental. Offline
+        # events replayed with library_kiosk_scan_dates keep their
+        # "return_date", live returns are always dated today.
+        scan_dates = self.env.context.get("library_kiosk_scan_dates")
+        results = [None] * len(items)
+        books = self._kiosk_resolve_books(items)
+        members = self._kiosk_resolve_members(items)
+        rental_ids = [rental_id for item in items if (rental_id := _kiosk_id(item.get("rental_id")))]
+        active = self.search_fetch(
+            Domain("state", "in", ["ongoing", "overdue"]) & (
+                Domain("id", "in", rental_ids)
+                | Domain("copy_id", "in", [copy_id for book_id, copy_id, error in books if copy_id])
+                | Domain("book_id", "in", [book_id for book_id, copy_id, error in books if book_id])
+            ),
+            ["book_id", "copy_id", "member_id"],
+            order="due_date, id",
+        )
+        taken = set()
+        pending = []
+        for index, (item, (book_id, copy_id, error), (member_id, member_error)) in enumerate(zip(items, books, members)):
+            if item.get("rental_id"):
+                rental_id = _kiosk_id(item["rental_id"])
+                candidates = active.filtered(lambda rental: rental.id == rental_id)
+                error = None if candidates else f"no active rental {item['rental_id']}"
+            else:
+                candidates = active.filtered(
+                    lambda rental: (rental.copy_id.id == copy_id if copy_id else rental.book_id.id == book_id)
+                    and (not member_id or rental.member_id.id == member_id)
+                )
+            error = error or member_error
+            candidates = candidates.filtered(lambda rental: rental.id not in taken)
+            if not error and not candidates:
+                error = "no active rental for this scan"
+            elif not error and len(candidates.member_id) > 1:
+                # never guess whose loan a title-level scan closes
+                error = "several members hold this title, scan the copy barcode or give the member"
+            if error:
+                results[index] = {"ok": False, "error": error}
+                continue
+            try:
+                return_date = fields.Date.to_date(item.get("return_date")) if scan_dates else None
+            except (TypeError, ValueError):
+                results[index] = {"ok": False, "error": f"invalid return date '{item['return_date']}'"}
+                continue
+            taken.add(candidates[0].id)
+            pending.append((index, (candidates[0].id, return_date)))
+
+        def return_rentals(payloads):
+            by_date = defaultdict(list)
+            for rental_id, return_date in payloads:
+                by_date[return_date].append(rental_id)
+            for return_date, ids in by_date.items():
+                self.browse(ids)._return_rentals(return_date)
+            rentals = self.browse(rental_id for rental_id, return_date in payloads)
+            return [{
+                "ok": True,
+                "rental_id": rental.id,
+                "book": rental.book_title,
+                "days_overdue": rental.days_overdue,
+            } for rental in rentals]
+
+        self._kiosk_apply(pending, results, return_rentals)
+        return results
+
     # CRUD Methods
     @api.model_create_multi
+    @instrumented("rental.create")
     def create(self, vals_list):
+        Copy = self.env["library.book.copy"]
+        copy_ids = [vals["copy_id"] for vals in vals_list if vals.get("copy_id")]
+        if len(set(copy_ids)) != len(copy_ids):
+            raise UserError(
+                "Can't create rental: the same copy is checked out more than once in the same batch."
+            )
+        scanned_copies = {copy.id: copy for copy in Copy.browse(copy_ids)}
         for vals in vals_list:
-            book_id = vals.get("book_id")
-            if book_id:
-                book = self.env["library.book"].browse(book_id)
-                if book.status == "rented":
+            if vals.get("copy_id"):
+                vals["book_id"] = scanned_copies[vals["copy_id"]].book_id.id
+            vals["state"] = "ongoing"
+        self._check_loan_rules(vals_list)
+
+        # members collecting a hold get the copy that was set aside for them
+        book_ids = list({vals["book_id"] for vals in vals_list if vals.get("book_id")})
+        holds = self.env["library.hold"].search([
+            ("book_id", "in", book_ids),
+            ("state", "=", "allocated"),
+        ]) if book_ids else self.env["library.hold"]
+        hold_by_member = {(hold.book_id.id, hold.member_id.id): hold for hold in holds}
+        collected = self.env["library.hold"]
+        for vals in vals_list:
+            hold = hold_by_member.get((vals.get("book_id"), vals.get("member_id")))
+            if hold and not vals.get("copy_id"):
+                vals["copy_id"] = hold.copy_id.id
+            if hold and vals.get("copy_id") == hold.copy_id.id:
+                collected |= hold
+            elif vals.get("copy_id"):
+                copy = scanned_copies.get(vals["copy_id"]) or Copy.browse(vals["copy_id"])
+                if copy.status == "reserved":
                     raise UserError(
-                        f"Can't create rental: '{book.name} is currently rented. "
+                        f"Can't create rental: '{copy.display_name}' is reserved "
+                        "for another member."
+                    )
+                if copy.status == "rented":
+                    raise UserError(
+                        f"Can't create rental: '{copy.display_name} is currently rented. "
                         "Please check availability before creating a rental."
                     )
-            vals["state"] = "ongoing"
 
-        rentals = super().create(vals_list)
+        # everybody else gets any free copy, taken without blocking other desks
+        needs = Counter(
+            vals["book_id"] for vals in vals_list if vals.get("book_id") and not vals.get("copy_id")
+        )
+        free_copies = {
+            book_id: list(copies) for book_id, copies in Copy._lock_available(needs).items()
+        }
+        for book_id, count in needs.items():
+            if len(free_copies.get(book_id, [])) < count:
+                book = self.env["library.book"].browse(book_id)
+                raise UserError(
+                    f"Can't create rental: '{book.name} is currently rented. "
+                    "Please check availability before creating a rental."
+                )
+        for vals in vals_list:
+            if vals.get("book_id") and not vals.get("copy_id"):
+                vals["copy_id"] = free_copies[vals["book_id"]].pop().id
 
-        for rental in rentals:
-            rental.book_id.write({"status": "rented"})
+        tracked, policy = self._system_tracking(batch=len(vals_list) > 1)
+        with self._map_active_rental_violation():
+            rentals = super(LibraryRental, tracked).create(vals_list).with_env(self.env)
+        rentals._log_batch_summary(policy, "Bulk checkout")
+        rentals.copy_id.write({"status": "rented"})
+        if collected:
+            collected._mark_collected(rentals)
 
         return rentals
 
+    def write(self, vals):
+        if "copy_id" in vals or "state" in vals:
+            with self._map_active_rental_violation():
+                return super().write(vals)
+        return super().write(vals)
+
     def unlink(self):
         for rental in self:
             if rental.state in ["ongoing", "overdue"]:
@@ -164,7 +682,17 @@ class LibraryRental(models.Model):
                     "Can't delete an active rental. Please return the book "
                     f"'{rental.book_id.name}' first."
                 )
-        return super().unlink()
+        stat_keys = [
+            (rental.checkout_date, rental.book_id.id, rental.member_id.id) for rental in self
+        ]
+        res = super().unlink()
+        if stat_keys:
+            dates, book_ids, member_ids = zip(*stat_keys)
+            self.env["library.circulation.stat"]._refresh_keys(SQL(
+                "SELECT * FROM unnest(%s::date[], %s::int[], %s::int[])",
+                list(dates), list(book_ids), list(member_ids),
+            ))
+        return res
 
     # SET DEFAULT Methods
     @api.onchange("checkout_date")
@@ -184,25 +712,48 @@ class LibraryRental(models.Model):
 
     # Action Methods
     def action_return_book(self):
-        for rental in self:
-            if rental.state == "returned":
-                raise UserError(
-                    f"this book has already been returned on {rental.return_date}"
-                )
-            today = fields.Date.context_today(self)
-            rental.write({
-                'return_date': today, 
-                'state': 'returned',
-            })
-            rental.book_id.write({
-                'status': 'available'
-            })
-            
+        returned, errors = self._return_rentals()
+        if errors and not returned:
+            raise UserError("\n".join(errors))
+        if not errors:
             return {
                 'type': 'ir.actions.client', 
                 'tag': 'reload',
             }
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Books Returned',
+                'message': f"{len(returned)} book(s) returned, {len(errors)} skipped:\n"
+                + "\n".join(errors),
+                'type': 'warning',
+                'sticky': True,
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            }
+        }
+
+    @instrumented("rental.return")
+    def _return_rentals(self, return_date=None):
+        # errors are collected per rental so one bad scan doesn't abort the cart
+        already_returned = self.filtered(lambda rental: rental.state == "returned")
+        errors = [
+            f"'{rental.book_id.name}': this book has already been returned on {rental.return_date}"
+            for rental in already_returned
+        ]
+        to_return = self - already_returned
+        if to_return:
+            tracked, policy = to_return._system_tracking(batch=len(to_return) > 1)
+            tracked.write({
+                'return_date': return_date or fields.Date.context_today(self),
+                'state': 'returned',
+            })
+            to_return._log_batch_summary(policy, "Bulk return")
+            self.env["library.fine"]._accrue_fines(to_return)
+            to_return.copy_id._release_to_queue()
+        return to_return, errors
             
+    @instrumented("rental.mark_overdue")
     def action_mark_overdue(self):
         for rental in self:
             if rental.state != 'ongoing':
@@ -218,38 +769,125 @@ class LibraryRental(models.Model):
         
     
     # CRON Methods
-    def _cron_check_overdue_rentals(self):
+    def _cron_check_overdue_rentals(self, batch_size=None):
+        ICP = self.env["ir.config_parameter"].sudo()
+        batch_size = batch_size or int(
+            ICP.get_param("library_management.overdue_batch_size", OVERDUE_BATCH_SIZE)
+        )
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
         today = fields.Date.context_today(self)
-        
-        overdue_rentals = self.search([
-            ('due_date', '<', today),
-            ('return_date', '=', False), 
-            ('state', 'in', ['ongoing', 'overdue'])
-        ])
-        
-        template = self.env.ref(
-            'library_management.email_template_overdue_remainder',
-            raise_if_not_found=False
+        Cursor = self.env["library.job.cursor"].sudo()
+
+        # the cursor is "<day>:<last rental id>" so a crashed run resumes on
+        # the same day but a new day always starts a full sweep
+        last_id = 0
+        cursor_day, _sep, cursor_id = (Cursor._get_position(OVERDUE_CURSOR_JOB) or "").partition(":")
+        if cursor_day == str(today) and cursor_id.isdigit():
+            last_id = int(cursor_id)
+            _logger.info("Resuming overdue sweep after rental %s", last_id)
+
+        self._refresh_days_overdue()
+        self.env["library.fine"]._accrue_fines()
+
+        # 'rental' queues one reminder per overdue rental while sweeping,
+        # 'digest' sends one reminder per member once the sweep is done.
+        # With reminder shards the sweep only flags, the shards remind
+        # members through the day.
+        sharded = int(ICP.get_param(REMINDER_SHARDS_PARAM, 0) or 0) > 0
+        digest = not sharded and ICP.get_param(REMINDER_MODE_PARAM, "rental") == "digest"
+        template = not (digest or sharded) and self.env.ref(
+            "library_management.email_template_overdue_remainder",
+            raise_if_not_found=False,
         )
-        
-        for rental in overdue_rentals:
-            if rental.state != 'overdue':
-                rental.write({
-                    'state': 'overdue'
-                })
-                
-        _logger.info(template)
-        _logger.info(rental.member_id.email)
-                
-        if template and rental.member_id.email:
+
+        batches = 0
+        while True:
+            batch = self.search([
+                ("due_date", "<", today),
+                ("return_date", "=", False),
+                ("state", "in", ["ongoing", "overdue"]),
+                ("id", ">", last_id),
+            ], order="id", limit=batch_size)
+            if not batch:
+                break
+
+            batch._process_overdue_batch(template)
+            last_id = batch[-1].id
+            batches += 1
+            # queued reminders must not be queued again by a resumed run
+            if template or batches % OVERDUE_CURSOR_EVERY == 0:
+                Cursor._set_position(OVERDUE_CURSOR_JOB, f"{today}:{last_id}")
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+
+        Cursor._set_position(OVERDUE_CURSOR_JOB, False)
+        if digest:
+            self.env["library.member"]._send_overdue_digests()
+        return True
+
+    @instrumented("rental.overdue_batch")
+    def _process_overdue_batch(self, template):
+        to_flag = self.filtered(lambda rental: rental.state == "ongoing")
+        if to_flag:
+            tracked, policy = to_flag._system_tracking()
+            tracked.write({"state": "overdue"})
+            to_flag._log_batch_summary(policy, "Marked overdue by the nightly check")
+
+        if template:
+            self._queue_reminders(template)
+
+    def _queue_reminders(self, template):
+        # one read of the batch's members serves member_email for every rental
+        self.member_id.fetch(["name", "email"])
+        recipients = self.filtered("member_email")
+        if recipients:
             try:
-                _logger.info("Trying to send mail")
-                template.send_mail(rental.id, force_send=True)
+                # rendered in one pass and left in the mail queue, the mail
+                # cron takes care of the actual delivery
+                with self.env.cr.savepoint():
+                    template.send_mail_batch(recipients.ids)
             except Exception as e:
-                _logger.error(e)
-                
-        
+                _logger.error("Could not queue %s: %s", template.name, e)
+
+    def _send_due_soon_reminders(self):
+        template = self.env.ref("library_management.email_template_due_soon", raise_if_not_found=False)
+        if template and self:
+            self._queue_reminders(template)
+
+    def _cron_sync_names(self, batch_size=None):
+        ICP = self.env["ir.config_parameter"].sudo()
+        batch_size = batch_size or int(
+            ICP.get_param("library_management.names_batch_size", NAMES_BATCH_SIZE)
+        )
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        for column, (table, key) in NAME_SOURCES.items():
+            synced = 0
+            while count := self._sync_names(column, limit=batch_size):
+                synced += count
+                if auto_commit:
+                    self.env.cr.commit()
+            # a source stays dirty while any of its rentals lags behind, so a
+            # rename committed during the run is picked up by the next one
+            self.env.cr.execute(SQL(
+                """
+                UPDATE %(table)s source
+                   SET rental_names_dirty = false
+                 WHERE source.rental_names_dirty
+                   AND NOT EXISTS (
+                        SELECT 1
+                          FROM library_rental rental
+                         WHERE %(rental_key)s = source.id
+                           AND %(rental_column)s IS DISTINCT FROM source.name
+                       )
+                """,
+                table=SQL.identifier(table),
+                rental_key=SQL.identifier("rental", key),
+                rental_column=SQL.identifier("rental", column),
+            ))
+            if auto_commit:
+                self.env.cr.commit()
+            if synced:
+                _logger.info("Propagated %s renames to %s rentals", column, synced)
+        self.env.invalidate_all()
         return True
-    
-            
-    
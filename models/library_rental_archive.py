@@ -0,0 +1,128 @@
+from odoo import models, fields, api
+from odoo.tools import SQL
+from datetime import timedelta
+
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+ARCHIVE_HORIZON_PARAM = "library_management.archive_horizon_days"
+ARCHIVE_HORIZON_DAYS = 365
+ARCHIVE_BATCH_SIZE = 10000
+
+
+class LibraryRentalArchive(models.Model):
+
+    _name = "library.rental.archive"
+    _description = "Archived Library Rental"
+    _inherit = ['mail.thread']
+    _order = "return_date desc, id desc"
+    _rec_name = "book_title"
+
+    # Returned rentals older than the archive horizon, moved out of
+    # library.rental with their id so links and chatter stay valid.
+
+    # Fields
+    book_id = fields.Many2one(
+        comodel_name="library.book", string="Book", required=True, readonly=True,
+        index=True, ondelete="restrict",
+    )
+    copy_id = fields.Many2one(
+        comodel_name="library.book.copy", string="Copy", readonly=True,
+        ondelete="set null",
+    )
+    member_id = fields.Many2one(
+        comodel_name="library.member", string="Member", required=True, readonly=True,
+        index=True, ondelete="restrict",
+    )
+    checkout_date = fields.Date(string="Checkout Date", required=True, readonly=True)
+    due_date = fields.Date(string="Due Date", required=True, readonly=True)
+    return_date = fields.Date(string="Return Date", readonly=True, index=True)
+    days_overdue = fields.Integer(string="Days Overdue", readonly=True)
+    book_title = fields.Char(string="Book Title", readonly=True)
+    member_name = fields.Char(string="Member Name", readonly=True)
+    archive_date = fields.Datetime(string="Archived On", readonly=True)
+
+    # Methods
+    def _archive_batch(self, horizon, limit):
+        # one statement moves the rows, the returned ids are then used to
+        # re-point the chatter, followers, attachments and activities
+        self.env.cr.execute(SQL(
+            """
+            WITH moved AS (
+                DELETE FROM library_rental
+                 WHERE id IN (
+                        SELECT id
+                          FROM library_rental
+                         WHERE state = 'returned'
+                           AND return_date < %(horizon)s
+                      ORDER BY return_date, id
+                         LIMIT %(limit)s
+                           FOR UPDATE SKIP LOCKED
+                       )
+             RETURNING id, book_id, copy_id, member_id, checkout_date, due_date, return_date,
+                       days_overdue, book_title, member_name,
+                       create_uid, create_date, write_uid, write_date
+            )
+            INSERT INTO library_rental_archive (
+                   id, book_id, copy_id, member_id, checkout_date, due_date, return_date,
+                   days_overdue, book_title, member_name,
+                   create_uid, create_date, write_uid, write_date, archive_date)
+            SELECT id, book_id, copy_id, member_id, checkout_date, due_date, return_date,
+                   days_overdue, book_title, member_name,
+                   create_uid, create_date, write_uid, write_date, now() AT TIME ZONE 'UTC'
+              FROM moved
+         RETURNING id
+            """,
+            horizon=horizon,
+            limit=limit,
+        ))
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        if not ids:
+            return ids
+        for table, column in (
+            ("mail_message", "model"),
+            ("mail_followers", "res_model"),
+            ("ir_attachment", "res_model"),
+        ):
+            self.env.cr.execute(SQL(
+                "UPDATE %(table)s SET %(column)s = %(archive)s WHERE %(column)s = 'library.rental' AND res_id = ANY(%(ids)s)",
+                table=SQL.identifier(table),
+                column=SQL.identifier(column),
+                archive=self._name,
+                ids=ids,
+            ))
+        self.env.cr.execute(SQL(
+            """
+            UPDATE mail_activity
+               SET res_model = %(archive)s,
+                   res_model_id = (SELECT id FROM ir_model WHERE model = %(archive)s)
+             WHERE res_model = 'library.rental'
+               AND res_id = ANY(%(ids)s)
+            """,
+            archive=self._name,
+            ids=ids,
+        ))
+        return ids
+
+    # CRON Methods
+    @api.model
+    def _cron_archive_rentals(self, batch_size=None):
+        ICP = self.env["ir.config_parameter"].sudo()
+        horizon_days = int(ICP.get_param(ARCHIVE_HORIZON_PARAM, ARCHIVE_HORIZON_DAYS))
+        batch_size = batch_size or int(
+            ICP.get_param("library_management.archive_batch_size", ARCHIVE_BATCH_SIZE)
+        )
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        horizon = fields.Date.context_today(self) - timedelta(days=horizon_days)
+
+        self.env.flush_all()
+        total = 0
+        while moved := self._archive_batch(horizon, batch_size):
+            total += len(moved)
+            if auto_commit:
+                self.env.cr.commit()
+        self.env.invalidate_all()
+        _logger.info("Archived %s rentals returned before %s", total, horizon)
+        return True
@@ -0,0 +1,58 @@
+from odoo import models, fields, tools
+from odoo.tools import SQL
+
+HISTORY_FIELDS = [
+    "book_id", "copy_id", "member_id", "checkout_date", "due_date", "return_date", "days_overdue",
+]
+
+
+class LibraryRentalHistory(models.Model):
+
+    _name = "library.rental.history"
+    _description = "Library Rental History"
+    _auto = False
+    _order = "checkout_date desc, id desc"
+    _depends = {
+        "library.rental": HISTORY_FIELDS + ["state"],
+        "library.rental.archive": HISTORY_FIELDS,
+    }
+
+    # Live and archived rentals in one place, ids are shared between both
+    # tables so a rental keeps its id once archived.
+
+    # Fields
+    book_id = fields.Many2one(comodel_name="library.book", string="Book", readonly=True)
+    copy_id = fields.Many2one(comodel_name="library.book.copy", string="Copy", readonly=True)
+    member_id = fields.Many2one(comodel_name="library.member", string="Member", readonly=True)
+    checkout_date = fields.Date(string="Checkout Date", readonly=True)
+    due_date = fields.Date(string="Due Date", readonly=True)
+    return_date = fields.Date(string="Return Date", readonly=True)
+    state = fields.Selection(
+        selection=[
+            ("ongoing", "Ongoing"),
+            ("returned", "Returned"),
+            ("overdue", "Overdue"),
+        ],
+        string="Status",
+        readonly=True,
+    )
+    days_overdue = fields.Integer(string="Days Overdue", readonly=True, aggregator="sum")
+    archived = fields.Boolean(string="Archived", readonly=True)
+
+    # Methods
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(SQL(
+            """
+            CREATE OR REPLACE VIEW %s AS (
+                SELECT id, book_id, copy_id, member_id, checkout_date, due_date, return_date,
+                       state, days_overdue, false AS archived
+                  FROM library_rental
+             UNION ALL
+                SELECT id, book_id, copy_id, member_id, checkout_date, due_date, return_date,
+                       'returned'::varchar, days_overdue, true
+                  FROM library_rental_archive
+            )
+            """,
+            SQL.identifier(self._table),
+        ))
@@ -0,0 +1,125 @@
+from odoo import models, fields, api
+from odoo.exceptions import ValidationError
+
+
+class ResConfigSettings(models.TransientModel):
+
+    _inherit = "res.config.settings"
+
+    # Fields
+    library_max_active_loans = fields.Integer(
+        string="Maximum Active Loans",
+        config_parameter="library_management.max_active_loans",
+        help="Number of books a member can hold at once, 0 for no limit",
+    )
+    library_block_when_overdue = fields.Boolean(
+        string="Block Members With Overdue Loans",
+        config_parameter="library_management.block_when_overdue",
+        help="Refuse new checkouts to members who still have an overdue book",
+    )
+    library_fine_per_day = fields.Float(
+        string="Fine per Day",
+        config_parameter="library_management.fine_per_day",
+        help="Amount charged for each day a book is late, 0 disables fines",
+    )
+    library_kiosk_loan_days = fields.Integer(
+        string="Kiosk Loan Period (days)",
+        config_parameter="library_management.kiosk_loan_days",
+        default=14,
+        help="Due date given to books checked out at a self-service kiosk",
+    )
+    library_overdue_batch_size = fields.Integer(
+        string="Overdue Sweep Batch Size",
+        config_parameter="library_management.overdue_batch_size",
+        default=1000,
+        help="Rentals processed and committed together by the overdue check",
+    )
+    library_tracking_policy = fields.Selection(
+        selection=[
+            ("full", "Full tracking"),
+            ("summary", "One note per batch"),
+            ("none", "No tracking"),
+        ],
+        string="Batch Tracking",
+        config_parameter="library_management.tracking_policy",
+        default="summary",
+        help="Chatter logged when rentals change state in batches",
+    )
+    library_hold_pickup_days = fields.Integer(
+        string="Hold Pickup Days",
+        config_parameter="library_management.hold_pickup_days",
+        default=3,
+        help="Days a member has to collect a book set aside for them",
+    )
+    library_archive_horizon_days = fields.Integer(
+        string="Archive After (days)",
+        config_parameter="library_management.archive_horizon_days",
+        default=365,
+        help="Returned rentals older than this are moved to the archive",
+    )
+    library_reminder_mode = fields.Selection(
+        selection=[("rental", "One email per overdue book"), ("digest", "One digest per member")],
+        string="Overdue Reminders",
+        config_parameter="library_management.reminder_mode",
+        default="rental",
+        help="How the nightly check reminds members of their overdue books",
+    )
+    library_reminder_interval_days = fields.Integer(
+        string="Digest Interval (days)",
+        config_parameter="library_management.reminder_interval_days",
+        default=1,
+        help="Members get at most one overdue digest per interval",
+    )
+    library_reminder_rate = fields.Integer(
+        string="Digests per Minute",
+        config_parameter="library_management.reminder_rate",
+        help="Spread the digests over time for slow mail servers, 0 sends them all at once",
+    )
+    library_reminder_shards = fields.Integer(
+        string="Reminder Shards per Day",
+        config_parameter="library_management.reminder_shards",
+        help="Split reminders into this many slices of members sent through the day, 0 sends them with the nightly check",
+    )
+    library_reminder_pre_due_days = fields.Char(
+        string="Remind Before Due (days)",
+        config_parameter="library_management.reminder_pre_due_days",
+        default="2",
+        help="Comma separated days before the due date when a due soon reminder is sent",
+    )
+    library_reminder_post_due_days = fields.Char(
+        string="Remind After Due (days)",
+        config_parameter="library_management.reminder_post_due_days",
+        default="1,3,7",
+        help="Comma separated days after the due date when an overdue reminder is sent",
+    )
+    library_names_propagation = fields.Selection(
+        selection=[("immediate", "Immediately"), ("deferred", "By a background job")],
+        string="Rename Propagation",
+        config_parameter="library_management.names_propagation",
+        default="deferred",
+        help="When book and member renames are copied onto their rentals",
+    )
+    library_slow_call_ms = fields.Integer(
+        string="Slow Call Threshold (ms)",
+        config_parameter="library_management.slow_call_ms",
+        default=1000,
+        help="Circulation calls slower than this are logged as warnings",
+    )
+    library_metrics_token = fields.Char(
+        string="Metrics Token",
+        config_parameter="library_management.metrics_token",
+        help="Bearer token required by /library/metrics, the endpoint is disabled while empty",
+    )
+
+    # Constraints
+    @api.constrains("library_reminder_interval_days")
+    def _check_library_reminder_interval_days(self):
+        if any(settings.library_reminder_interval_days < 1 for settings in self):
+            raise ValidationError("The digest interval must be at least one day.")
+
+    @api.constrains("library_reminder_post_due_days")
+    def _check_library_reminder_post_due_days(self):
+        for settings in self:
+            days = [day.strip() for day in (settings.library_reminder_post_due_days or "").split(",") if day.strip()]
+            if not all(day.isdigit() and int(day) >= 1 for day in days):
+                raise ValidationError("Overdue reminders can only be sent one day or more after the due date.")
@@ -1 +1,16 @@
-from . import test_rental
\ No newline at end of file
+from . import test_rental
+from . import test_book
+from . import test_hold
+from . import test_member
+from . import test_circulation_stat
+from . import test_import
+from . import test_rental_archive
+from . import test_fine
+from . import test_reminder
+from . import test_reminder_shard
+from . import test_metrics
+from . import test_kiosk
+from . import test_circulation_event
+from . import test_benchmark
+from . import test_benchmark_suite
+from . import test_concurrency
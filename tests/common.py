@@ -0,0 +1,257 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# generated library sizes, rentals are returned history spread over two years
+LIBRARY_SCALES = {
+    "10k": {"authors": 1_000, "books": 10_000, "members": 2_000, "rentals": 50_000},
+    "100k": {"authors": 10_000, "books": 100_000, "members": 20_000, "rentals": 500_000},
+    "1m": {"authors": 50_000, "books": 1_000_000, "members": 200_000, "rentals": 5_000_000},
+}
+
+
+class LibraryBenchmarkCase(TransactionCase):
+
+    # Seeding helpers, plain SQL so that large fixtures build in seconds
+    def _seed_books(self, count, status="available", copies=1):
+        self.env.flush_all()
+        self.env.cr.execute(SQL(
+            """
+            WITH books AS (
+                INSERT INTO library_book (name, isbn, isbn_normalized, catalog_text,
+                                          copy_count, available_copy_count, available, status,
+                                          create_uid, write_uid, create_date, write_date)
+                     SELECT 'Benchmark Book ' || g, isbn, upper(replace(isbn, '-', '')),
+                            'Benchmark Book ' || g || ' ' || isbn,
+                            %(copies)s, CASE WHEN %(status)s = 'available' THEN %(copies)s ELSE 0 END,
+                            %(status)s = 'available' AND %(copies)s > 0,
+                            CASE WHEN %(copies)s > 0 THEN %(status)s ELSE 'no_copies' END,
+                            %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                       FROM generate_series(1, %(count)s) g,
+                            LATERAL (SELECT 'BENCH-' || gen_random_uuid() AS isbn) code
+                  RETURNING id
+            ), copies AS (
+                INSERT INTO library_book_copy (book_id, status,
+                                               create_uid, write_uid, create_date, write_date)
+                     SELECT books.id, %(status)s,
+                            %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                       FROM books, generate_series(1, %(copies)s)
+            )
+            SELECT id FROM books
+            """,
+            status=status,
+            uid=self.env.uid,
+            count=count,
+            copies=copies,
+        ))
+        return self.env["library.book"].browse(row[0] for row in self.env.cr.fetchall())
+
+    def _seed_members(self, count):
+        self.env.flush_all()
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO library_member (name, email, active,
+                                        create_uid, write_uid, create_date, write_date)
+                 SELECT 'Benchmark Member ' || g, 'member' || g || '@example.com', true,
+                        %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                   FROM generate_series(1, %(count)s) g
+              RETURNING id
+            """,
+            uid=self.env.uid,
+            count=count,
+        ))
+        return self.env["library.member"].browse(row[0] for row in self.env.cr.fetchall())
+
+    def _seed_rentals(self, books, members, checkout_date, due_date, state="ongoing", return_date=None):
+        # one rental per book on its first copy, members are assigned round-robin
+        self.env.flush_all()
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO library_rental (book_id, copy_id, member_id, checkout_date, due_date,
+                                        return_date, state, book_title, member_name,
+                                        create_uid, write_uid, create_date, write_date)
+                 SELECT b.id, c.id, m.id, %(checkout_date)s, %(due_date)s,
+                        %(return_date)s, %(state)s, b.name, m.name,
+                        %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                   FROM unnest(%(book_ids)s::int[]) WITH ORDINALITY AS bk(id, n)
+                   JOIN library_book b ON b.id = bk.id
+                   JOIN LATERAL (SELECT id FROM library_book_copy
+                                  WHERE book_id = b.id ORDER BY id LIMIT 1) c ON true
+                   JOIN library_member m
+                     ON m.id = (%(member_ids)s::int[])[(bk.n - 1) %% %(member_count)s + 1]
+              RETURNING id
+            """,
+            checkout_date=checkout_date,
+            due_date=due_date,
+            return_date=return_date,
+            state=state,
+            uid=self.env.uid,
+            book_ids=books.ids,
+            member_ids=members.ids,
+            member_count=len(members),
+        ))
+        return self.env["library.rental"].browse(row[0] for row in self.env.cr.fetchall())
+
+    def _seed_library(self, scale, seed=0.42):
+        # A whole library for one of LIBRARY_SCALES, identical for a given
+        # seed. Popularity is skewed: a few authors, books and members carry
+        # most of the history. 10% of the books are out, a fifth of them
+        # past their due date, with one to three copies per title.
+        sizes = LIBRARY_SCALES[scale]
+        self.env.flush_all()
+        cr = self.env.cr
+        cr.execute("SELECT setseed(%s)", [seed])
+        params = {
+            "uid": self.env.uid,
+            "today": fields.Date.context_today(self.env.user),
+            "prefix": f"GEN-{scale}-",
+            **sizes,
+        }
+        cr.execute(SQL(
+            """
+            INSERT INTO library_author (name, biography, book_count,
+                                        create_uid, write_uid, create_date, write_date)
+                 SELECT 'Generated Author ' || g, 'Writes about topic ' || (g %% 97), 0,
+                        %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                   FROM generate_series(1, %(authors)s) g
+              RETURNING id
+            """,
+            **params,
+        ))
+        params["author_ids"] = [row[0] for row in cr.fetchall()]
+        cr.execute(SQL(
+            """
+            WITH books AS (
+                INSERT INTO library_book (name, isbn, isbn_normalized, author_id, publication_date,
+                                          create_uid, write_uid, create_date, write_date)
+                     SELECT 'Generated Book ' || g, %(prefix)s || g, upper(%(prefix)s || g),
+                            (%(author_ids)s::int[])[1 + floor(power(random(), 2) * %(authors)s)::int],
+                            %(today)s::date - (random() * 20000)::int,
+                            %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                       FROM generate_series(1, %(books)s) g
+                  RETURNING id
+            )
+            INSERT INTO library_book_copy (book_id, status,
+                                           create_uid, write_uid, create_date, write_date)
+                 SELECT books.id, 'available',
+                        %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                   FROM books, LATERAL generate_series(1, 1 + (random() * 2)::int + books.id * 0) n
+              RETURNING book_id
+            """,
+            **params,
+        ))
+        params["book_ids"] = sorted({row[0] for row in cr.fetchall()})
+        cr.execute(SQL(
+            """
+            UPDATE library_book book
+               SET catalog_text = concat_ws(' ', book.name, book.isbn, author.name)
+              FROM library_author author
+             WHERE author.id = book.author_id
+               AND book.id = ANY(%(book_ids)s);
+
+            UPDATE library_author author
+               SET book_count = counts.total
+              FROM (SELECT author_id, count(*) AS total FROM library_book
+                     WHERE id = ANY(%(book_ids)s) GROUP BY author_id) counts
+             WHERE author.id = counts.author_id;
+
+            INSERT INTO library_member (name, email, active,
+                                        create_uid, write_uid, create_date, write_date)
+                 SELECT 'Generated Member ' || g, 'generated' || g || '@example.com', true,
+                        %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                   FROM generate_series(1, %(members)s) g
+              RETURNING id
+            """,
+            **params,
+        ))
+        params["member_ids"] = [row[0] for row in cr.fetchall()]
+        cr.execute(SQL(
+            """
+            INSERT INTO library_rental (book_id, copy_id, member_id, checkout_date, due_date,
+                                        return_date, state, days_overdue, book_title, member_name,
+                                        create_uid, write_uid, create_date, write_date)
+                 SELECT book.id, copy.id, member.id, pick.checkout, pick.checkout + 14,
+                        pick.checkout + pick.kept, 'returned', GREATEST(pick.kept - 14, 0),
+                        book.name, member.name,
+                        %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                   FROM (SELECT (%(book_ids)s::int[])[1 + floor(power(random(), 3) * %(books)s)::int] AS book_id,
+                                (%(member_ids)s::int[])[1 + floor(power(random(), 2) * %(members)s)::int] AS member_id,
+                                %(today)s::date - 30 - (random() * 700)::int AS checkout,
+                                (random() * 28)::int AS kept
+                           FROM generate_series(1, %(rentals)s)) pick
+                   JOIN library_book book ON book.id = pick.book_id
+                   JOIN library_member member ON member.id = pick.member_id
+                   JOIN LATERAL (SELECT id FROM library_book_copy
+                                  WHERE book_id = book.id ORDER BY id LIMIT 1) copy ON true;
+
+            WITH active AS (
+                INSERT INTO library_rental (book_id, copy_id, member_id, checkout_date, due_date,
+                                            state, days_overdue, book_title, member_name,
+                                            create_uid, write_uid, create_date, write_date)
+                     SELECT book.id, copy.id, member.id, pick.checkout, pick.checkout + 14,
+                            'ongoing', 0, book.name, member.name,
+                            %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                       FROM (SELECT book_id,
+                                    (%(member_ids)s::int[])[1 + floor(power(random(), 2) * %(members)s)::int] AS member_id,
+                                    %(today)s::date - CASE WHEN random() < 0.2 THEN 15 + (random() * 30)::int
+                                                          ELSE (random() * 13)::int END AS checkout
+                               FROM unnest(%(book_ids)s::int[]) book_id
+                              WHERE random() < 0.1) pick
+                       JOIN library_book book ON book.id = pick.book_id
+                       JOIN library_member member ON member.id = pick.member_id
+                       JOIN LATERAL (SELECT id FROM library_book_copy
+                                      WHERE book_id = book.id ORDER BY id LIMIT 1) copy ON true
+                  RETURNING copy_id
+            )
+            UPDATE library_book_copy SET status = 'rented' WHERE id IN (SELECT copy_id FROM active);
+
+            UPDATE library_book book
+               SET copy_count = counts.total,
+                   available_copy_count = counts.available,
+                   available = counts.available > 0,
+                   status = CASE WHEN counts.available > 0 THEN 'available' ELSE 'rented' END
+              FROM (SELECT book_id, count(*) AS total,
+                           count(*) FILTER (WHERE status = 'available') AS available
+                      FROM library_book_copy
+                     WHERE book_id = ANY(%(book_ids)s)
+                  GROUP BY book_id) counts
+             WHERE book.id = counts.book_id;
+
+            UPDATE library_member member
+               SET rental_count = counts.total,
+                   active_rental_count = counts.active,
+                   overdue_rental_count = 0
+              FROM (SELECT member_id, count(*) AS total,
+                           count(*) FILTER (WHERE state = 'ongoing') AS active
+                      FROM library_rental
+                     WHERE member_id = ANY(%(member_ids)s)
+                  GROUP BY member_id) counts
+             WHERE member.id = counts.member_id;
+            """,
+            **params,
+        ))
+        self.env.invalidate_all()
+        cr.execute("ANALYZE library_author, library_book, library_book_copy, library_member, library_rental")
+        return {
+            "authors": self.env["library.author"].browse(params["author_ids"]),
+            "books": self.env["library.book"].browse(params["book_ids"]),
+            "members": self.env["library.member"].browse(params["member_ids"]),
+        }
+
+    @contextmanager
+    def _benchmark(self, label):
+        stats = {}
+        self.env.flush_all()
+        queries = self.env.cr.sql_log_count
+        start = time.perf_counter()
+        yield stats
+        self.env.flush_all()
+        stats["seconds"] = time.perf_counter() - start
+        stats["queries"] = self.env.cr.sql_log_count - queries
+        _logger.info("%s: %.3fs, %s queries", label, stats["seconds"], stats["queries"])
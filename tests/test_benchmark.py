@@ -0,0 +1,534 @@
+from datetime import date, datetime, timedelta
+import csv
+import io
+import resource
+import statistics
+import tempfile
+import time
+from unittest.mock import patch
+
+from freezegun import freeze_time
+
+from odoo.addons.base.tests.common import MockSmtplibCase
+from odoo.tests import tagged
+from odoo.tools import SQL
+
+from .common import LibraryBenchmarkCase
+from ..models import library_metrics
+
+
+@tagged('library_benchmark', '-standard', 'post_install', '-at_install')
+class TestLibraryBenchmark(LibraryBenchmarkCase, MockSmtplibCase):
+
+    def test_overdue_sweep_500k(self):
+
+        # Seed 500k rentals that are all past their due date and time the sweep.
+
+        books = self._seed_books(500_000, status='rented')
+        members = self._seed_members(5_000)
+        self._seed_rentals(
+            books, members,
+            checkout_date=date.today() - timedelta(days=30),
+            due_date=date.today() - timedelta(days=2),
+        )
+
+        with self._benchmark('overdue sweep (500k rentals)') as stats:
+            self.env['library.rental']._cron_check_overdue_rentals(batch_size=5_000)
+
+        self.assertFalse(self.env['library.rental'].search_count([('state', '=', 'ongoing')]))
+        self.assertLess(stats['queries'], 500_000)
+
+    def test_bulk_checkout_query_count(self):
+
+        # Test that a batch checkout costs the same number of queries whatever its size.
+
+        members = self._seed_members(50)
+        counts = {}
+        for size in (10, 100, 1_000):
+            books = self._seed_books(size)
+            vals_list = [{
+                'book_id': book.id,
+                'member_id': members[index % len(members)].id,
+                'checkout_date': date.today(),
+                'due_date': date.today() + timedelta(days=14),
+            } for index, book in enumerate(books)]
+            self.env.invalidate_all()
+            with self._benchmark(f'bulk checkout ({size} rentals)') as stats:
+                self.env['library.rental'].create(vals_list)
+            counts[size] = stats['queries']
+
+        self.assertLessEqual(counts[1_000] - counts[10], 5, counts)
+
+    def test_member_counters_large_history(self):
+
+        # Test that a checkout costs the same for members with 10 or 10k past rentals.
+
+        small, large = self._seed_members(2)
+        for member, history in ((small, 10), (large, 10_000)):
+            self._seed_rentals(
+                self._seed_books(history), member,
+                checkout_date=date.today() - timedelta(days=60),
+                due_date=date.today() - timedelta(days=46),
+                state='returned',
+                return_date=date.today() - timedelta(days=50),
+            )
+        (small | large)._compute_rental_count()
+        self.assertEqual(large.rental_count, 10_000)
+
+        counts = {}
+        for member in (small, large):
+            book = self._seed_books(1)
+            self.env.invalidate_all()
+            with self._benchmark(f'checkout for member with {member.rental_count} rentals') as stats:
+                rental = self.env['library.rental'].create({
+                    'book_id': book.id,
+                    'member_id': member.id,
+                    'checkout_date': date.today(),
+                    'due_date': date.today() + timedelta(days=14),
+                })
+                rental.action_mark_overdue()
+            counts[member] = stats['queries']
+            self.assertEqual(member.overdue_rental_count, 1)
+
+        self.assertEqual(counts[small], counts[large])
+
+    def test_overdue_domains_use_indexes(self):
+
+        # Test that the cron and "Due Today"/"Due This Week" domains are served by an index.
+
+        members = self._seed_members(1_000)
+        today = date.today()
+        for offset in range(-200, 200, 4):
+            state = 'returned' if offset < -30 else 'ongoing'
+            self._seed_rentals(
+                self._seed_books(1_000), members,
+                checkout_date=today + timedelta(days=offset - 14),
+                due_date=today + timedelta(days=offset),
+                state=state,
+                return_date=today + timedelta(days=offset) if state == 'returned' else None,
+            )
+        self.env.cr.execute("ANALYZE library_rental")
+
+        week_start = today - timedelta(days=today.weekday())
+        domains = {
+            'overdue cron': [
+                ('due_date', '<', today),
+                ('return_date', '=', False),
+                ('state', 'in', ['ongoing', 'overdue']),
+            ],
+            'due today': [('due_date', '=', today)],
+            'due this week': [
+                ('due_date', '>=', week_start),
+                ('due_date', '<=', week_start + timedelta(days=6)),
+            ],
+        }
+        for label, domain in domains.items():
+            query = self.env['library.rental']._search(domain)
+            self.env.cr.execute(SQL("EXPLAIN %s", query.select()))
+            plan = '\n'.join(row[0] for row in self.env.cr.fetchall())
+            self.assertIn('Index', plan, f'{label} does not use an index:\n{plan}')
+
+    def test_bulk_return_time_per_item(self):
+
+        # Test that the time per returned item stays flat from 1 to 1,000 items.
+
+        members = self._seed_members(50)
+        per_item = {}
+        for size in (1, 10, 100, 1_000):
+            rentals = self._seed_rentals(
+                self._seed_books(size, status='rented'), members,
+                checkout_date=date.today() - timedelta(days=7),
+                due_date=date.today() + timedelta(days=7),
+            )
+            self.env.invalidate_all()
+            with self._benchmark(f'bulk return ({size} rentals)') as stats:
+                rentals.action_return_book()
+            per_item[size] = stats['seconds'] / size
+
+        self.assertLessEqual(per_item[1_000], per_item[10], per_item)
+
+    def test_isbn_lookup_scans_per_second(self):
+
+        # Measure scans per second through the ISBN lookup with a cold and a warm cache.
+
+        books = self._seed_books(1_000)
+        codes = books.mapped('isbn')
+        Book = self.env['library.book']
+
+        rates = {}
+        for label in ('cold', 'warm'):
+            if label == 'cold':
+                self.env.registry.clear_cache()
+            with self._benchmark(f'isbn lookup ({label} cache)') as stats:
+                for code in codes:
+                    Book.lookup_isbn(code)
+            rates[label] = len(codes) / stats['seconds']
+            if label == 'warm':
+                self.assertEqual(stats['queries'], 0)
+
+        self.assertGreater(rates['warm'], rates['cold'], rates)
+
+    def test_catalog_search_1m_books(self):
+
+        # Measure ranked catalog search latency on a 1M book catalog.
+
+        self._seed_books(1_000_000)
+        self.env.cr.execute("ANALYZE library_book")
+        Book = self.env['library.book']
+
+        for text in ('bench 424242', 'book 99999', 'nothing matches this'):
+            with self._benchmark(f'catalog search "{text}" (1M books)') as stats:
+                Book._search_catalog(text, limit=20).mapped('display_name')
+            self.assertLess(stats['seconds'], 1.0, text)
+
+    def test_tracking_policy_rows_per_10k_transitions(self):
+
+        # Compare chatter rows written and latency for 10k overdue flips per tracking policy.
+
+        ICP = self.env['ir.config_parameter'].sudo()
+        members = self._seed_members(100)
+        results = {}
+        for policy in ('full', 'summary', 'none'):
+            ICP.set_param('library_management.tracking_policy', policy)
+            rentals = self._seed_rentals(
+                self._seed_books(10_000, status='rented'), members,
+                checkout_date=date.today() - timedelta(days=30),
+                due_date=date.today() - timedelta(days=2),
+            )
+            rows_before = self._chatter_rows()
+            with self._benchmark(f'10k overdue transitions (tracking {policy})') as stats:
+                rentals._process_overdue_batch(False)
+            results[policy] = (self._chatter_rows() - rows_before, stats['seconds'])
+
+        self.assertEqual(results['none'][0], 0, results)
+        self.assertEqual(results['summary'][0], 1, results)
+        self.assertGreaterEqual(results['full'][0], 10_000, results)
+
+    def _chatter_rows(self):
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT (SELECT count(*) FROM mail_message)
+                 + (SELECT count(*) FROM mail_tracking_value)
+        """)
+        return self.env.cr.fetchone()[0]
+
+    def test_circulation_report_flat_with_history(self):
+
+        # Test that the monthly report query time stays flat while rentals grow from 10k to 5M.
+
+        members = self._seed_members(1_000)
+        Stat = self.env['library.circulation.stat']
+        recent = date.today() - timedelta(days=10)
+        self._seed_rentals(
+            self._seed_books(10_000), members,
+            checkout_date=recent, due_date=recent + timedelta(days=14),
+            state='returned', return_date=recent + timedelta(days=7),
+        )
+
+        timings = {}
+        total, offset = 10_000, 0
+        for target in (10_000, 100_000, 1_000_000, 5_000_000):
+            while total < target:
+                offset += 1
+                batch = min(500_000, target - total)
+                old = date.today() - timedelta(days=60 + offset)
+                self._seed_rentals(
+                    self._seed_books(batch), members,
+                    checkout_date=old, due_date=old + timedelta(days=14),
+                    state='returned', return_date=old + timedelta(days=7),
+                )
+                total += batch
+            Stat._cron_refresh_stats()
+            self.env.cr.execute("ANALYZE library_circulation_stat")
+            with self._benchmark(f'monthly report ({target} rentals)') as stats:
+                Stat.read_group(
+                    [('date', '>=', date.today() - timedelta(days=30))],
+                    ['loan_count:sum', 'overdue_count:sum'],
+                    ['date:month', 'author_id'],
+                )
+            timings[target] = stats['seconds']
+
+        self.assertLess(timings[5_000_000], max(timings[10_000] * 5, 0.05), timings)
+
+    def test_import_rows_per_second_1m(self):
+
+        # Stream a 1M line book file through the importer and measure rows per second.
+
+        with tempfile.TemporaryFile() as fixture:
+            text = io.TextIOWrapper(fixture, encoding='utf-8', newline='', write_through=True)
+            writer = csv.writer(text)
+            writer.writerow(['name', 'isbn', 'author', 'publication_date'])
+            for index in range(1_000_000):
+                writer.writerow([f'Import Book {index}', f'IMPORT-{index:07d}', f'Import Author {index % 5_000}', '2000-01-01'])
+            text.detach()
+            fixture.seek(0)
+
+            wizard = self.env['library.import.wizard'].create({
+                'import_type': 'book',
+                'file': b'MQ==',
+                'chunk_size': 2_000,
+            })
+            with self._benchmark('import 1M book rows') as stats:
+                result = wizard._import_file(fixture, 'csv')
+
+        self.assertEqual(result['created'], 1_000_000)
+        self.assertFalse(result['errors'])
+        self.assertEqual(self.env['library.author'].search_count([('name', '=like', 'Import Author %')]), 5_000)
+        self.assertGreater(1_000_000 / stats['seconds'], 500)
+
+    def test_export_history_2m_rss_ceiling(self):
+
+        # Export 2M rentals and check that the peak memory of the worker stays bounded.
+
+        books = self._seed_books(2_000_000)
+        members = self._seed_members(10_000)
+        old = date.today() - timedelta(days=400)
+        self._seed_rentals(
+            books, members,
+            checkout_date=old, due_date=old + timedelta(days=14),
+            state='returned', return_date=old + timedelta(days=10),
+        )
+        self.env.invalidate_all()
+
+        peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with tempfile.TemporaryFile() as output:
+            with self._benchmark('export 2M rentals') as stats:
+                count = self.env['library.rental']._export_history(output, 'csv')
+            size = output.tell()
+        peak_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        self.assertEqual(count, 2_000_000)
+        self.assertGreater(size, 0)
+        # ru_maxrss is in KiB on Linux
+        self.assertLess(peak_after - peak_before, 100 * 1024, stats)
+
+    def test_checkout_latency_with_archived_history(self):
+
+        # Test that checkout latency stays flat while returned history grows, once archived.
+
+        members = self._seed_members(1_000)
+        Archive = self.env['library.rental.archive']
+        timings = {}
+        total = 0
+        for target in (100_000, 1_000_000, 3_000_000):
+            while total < target:
+                batch = min(500_000, target - total)
+                old = date.today() - timedelta(days=400 + total // 10_000)
+                self._seed_rentals(
+                    self._seed_books(batch), members,
+                    checkout_date=old, due_date=old + timedelta(days=14),
+                    state='returned', return_date=old + timedelta(days=7),
+                )
+                total += batch
+            Archive._cron_archive_rentals(batch_size=50_000)
+            self.env.cr.execute("ANALYZE library_rental")
+
+            books = self._seed_books(200)
+            vals_list = [{
+                'book_id': book.id,
+                'member_id': members[index % len(members)].id,
+                'checkout_date': date.today(),
+                'due_date': date.today() + timedelta(days=14),
+            } for index, book in enumerate(books)]
+            self.env.invalidate_all()
+            with self._benchmark(f'checkout 200 rentals ({target} archived)') as stats:
+                self.env['library.rental'].create(vals_list)
+            timings[target] = stats['seconds']
+
+        self.assertLess(
+            self.env['library.rental'].search_count([('state', '=', 'returned')]), 1_000,
+        )
+        self.assertLess(timings[3_000_000], timings[100_000] * 2 + 0.05, timings)
+
+    def test_checkout_10k_with_loan_rules(self):
+
+        # Compare a 10k checkout batch with the loan rules off and on.
+
+        ICP = self.env['ir.config_parameter'].sudo()
+        members = self._seed_members(2_500)
+        timings = {}
+        for enabled in (False, True):
+            ICP.set_param('library_management.max_active_loans', 10 if enabled else 0)
+            ICP.set_param('library_management.block_when_overdue', enabled)
+            books = self._seed_books(10_000)
+            vals_list = [{
+                'book_id': book.id,
+                'member_id': members[index % len(members)].id,
+                'checkout_date': date.today(),
+                'due_date': date.today() + timedelta(days=14),
+            } for index, book in enumerate(books)]
+            self.env.invalidate_all()
+            with self._benchmark(f'checkout 10k rentals (rules {"on" if enabled else "off"})') as stats:
+                self.env['library.rental'].create(vals_list)
+            timings[enabled] = stats
+
+        self.assertLessEqual(timings[True]['queries'] - timings[False]['queries'], 3, timings)
+        self.assertLess(timings[True]['seconds'], timings[False]['seconds'] * 1.2 + 0.1, timings)
+
+    def test_overdue_digests_100k_rentals(self):
+
+        # Queue and deliver digests for 100k overdue rentals spread over 20k members.
+
+        self.env['ir.config_parameter'].sudo().set_param('library_management.reminder_mode', 'digest')
+        members = self._seed_members(20_000)
+        self._seed_rentals(
+            self._seed_books(100_000), members,
+            checkout_date=date.today() - timedelta(days=30),
+            due_date=date.today() - timedelta(days=2),
+        )
+
+        with self._benchmark('overdue sweep with digests (100k rentals, 20k members)') as stats:
+            self.env['library.rental']._cron_check_overdue_rentals(batch_size=10_000)
+        digests = self.env['mail.mail'].search([('model', '=', 'library.member')])
+        self.assertEqual(len(digests), 20_000)
+        self.assertFalse(self.env['mail.mail'].search_count([('model', '=', 'library.rental')]))
+
+        with self.mock_smtplib_connection(), self._benchmark('deliver 20k digests') as delivery:
+            digests.send()
+        self.assertEqual(len(self.emails), 20_000)
+        self.assertEqual(len({email['smtp_to_list'][0] for email in self.emails}), 20_000)
+
+        self.env['library.rental']._cron_check_overdue_rentals(batch_size=10_000)
+        self.assertFalse(self.env['mail.mail'].search_count([('model', '=', 'library.member'), ('state', '=', 'outgoing')]))
+        self.assertLess(stats['queries'], 2_000, (stats, delivery))
+
+
+    def test_bulk_member_renames_deferred(self):
+
+        # Rename 50k members with a long history and time the save and the background propagation.
+
+        members = self._seed_members(50_000)
+        old = date.today() - timedelta(days=90)
+        self._seed_rentals(
+            self._seed_books(500_000), members,
+            checkout_date=old, due_date=old + timedelta(days=14),
+            state='returned', return_date=old + timedelta(days=7),
+        )
+        self.env.invalidate_all()
+
+        with self._benchmark('rename 50k members (deferred)') as rename:
+            members.write({'name': 'Corrected Name'})
+        with self._benchmark('propagate 50k renames to 500k rentals') as propagate:
+            self.env['library.rental']._cron_sync_names(batch_size=20_000)
+
+        self.assertFalse(self.env['library.rental'].search_count([
+            ('member_id', 'in', members.ids), ('member_name', '!=', 'Corrected Name'),
+        ]))
+        self.assertFalse(self.env['library.member'].search_count([('rental_names_dirty', '=', True)]))
+        self.assertLess(rename['seconds'], 5.0, rename)
+        self.assertLess(propagate['queries'], 100, propagate)
+
+    def test_checkout_instrumentation_overhead(self):
+
+        # Test that instrumenting checkout adds no query and less than 2% to its latency.
+
+        members = self._seed_members(200)
+        Rental = self.env['library.rental']
+        self.env['ir.config_parameter'].sudo().get_param(library_metrics.SLOW_CALL_PARAM)
+
+        def checkout(books):
+            self.env.invalidate_all()
+            queries = self.env.cr.sql_log_count
+            start = time.perf_counter()
+            for index, book in enumerate(books):
+                Rental.create({
+                    'book_id': book.id,
+                    'member_id': members[index % len(members)].id,
+                    'checkout_date': date.today(),
+                    'due_date': date.today() + timedelta(days=14),
+                })
+            return (time.perf_counter() - start) / len(books), self.env.cr.sql_log_count - queries
+
+        # rounds alternate so that cache warm-up and table growth hit both sides
+        timings = {True: [], False: []}
+        queries = {}
+        for _round in range(11):
+            for enabled in (False, True):
+                books = self._seed_books(100)
+                with patch.object(library_metrics, 'METRICS_ENABLED', enabled):
+                    seconds, queries[enabled] = checkout(books)
+                timings[enabled].append(seconds)
+
+        # a 2% difference is within the run-to-run noise of a checkout, so
+        # the wrapper is timed on its own around a method doing nothing
+        noop = library_metrics.instrumented('benchmark.noop')(lambda records: None)
+        rental = Rental.browse()
+        wrapper = []
+        for _round in range(11):
+            start = time.perf_counter()
+            for _call in range(10_000):
+                noop(rental)
+            wrapper.append((time.perf_counter() - start) / 10_000)
+        library_metrics.reset_metrics()
+
+        self.assertEqual(queries[True], queries[False])
+        checkout_seconds = statistics.median(timings[False])
+        overhead = statistics.median(wrapper) / checkout_seconds
+        self.assertLess(overhead, 0.02, {
+            'wrapper_us': statistics.median(wrapper) * 1e6,
+            'checkout_ms': checkout_seconds * 1000,
+            'instrumented_checkout_ms': statistics.median(timings[True]) * 1000,
+        })
+
+    def test_offline_events_100k(self):
+
+        # Ingest 100k offline events, replay the same upload and apply them in the background.
+
+        books = self._seed_books(50_000)
+        members = self._seed_members(5_000)
+        start = datetime(2024, 1, 1, 8, 0)
+        events = []
+        # every book goes out and comes back a week later
+        for index, book in enumerate(books.ids):
+            member = members.ids[index % len(members)]
+            events.append({
+                'id': f'bench:{index}:out', 'kiosk': f'kiosk-{index % 50}', 'type': 'checkout',
+                'book_id': book, 'member_id': member, 'time': (start + timedelta(seconds=index)).isoformat(),
+            })
+            events.append({
+                'id': f'bench:{index}:in', 'kiosk': f'kiosk-{index % 50}', 'type': 'return',
+                'book_id': book, 'time': (start + timedelta(days=7, seconds=index)).isoformat(),
+            })
+        Event = self.env['library.circulation.event']
+
+        with self._benchmark('ingest 100k offline events') as ingest:
+            result = Event._ingest(events)
+        self.assertEqual(result['queued'], 100_000)
+        with self._benchmark('replay 100k offline events') as replay:
+            result = Event._ingest(events)
+        self.assertEqual((result['queued'], result['duplicates']), (0, 100_000))
+
+        with self._benchmark('apply 100k offline events') as apply:
+            Event._cron_apply_events(batch_size=5_000)
+        self.assertFalse(Event.search_count([('state', '!=', 'applied')]))
+        self.assertLess(ingest['seconds'], 10, ingest)
+        self.assertLess(replay['seconds'], 10, replay)
+        self.assertLess(apply['queries'], 10_000, apply)
+
+    def test_reminder_shards_over_a_week(self):
+
+        # Run a week of reminder shards over 140k active rentals and time each day.
+
+        self.env['ir.config_parameter'].sudo().set_param('library_management.reminder_shards', 96)
+        members = self._seed_members(20_000)
+        # due dates spread from a week ago to a week ahead
+        for offset in range(-7, 7):
+            due = date.today() + timedelta(days=offset)
+            self._seed_rentals(
+                self._seed_books(10_000), members,
+                checkout_date=due - timedelta(days=14), due_date=due,
+            )
+        Shard = self.env['library.reminder.shard']
+
+        days = {}
+        for offset in range(5):
+            day = date.today() + timedelta(days=offset)
+            with freeze_time(datetime.combine(day, datetime.min.time()) + timedelta(hours=19)):
+                self.env.invalidate_all()
+                with self._benchmark(f'reminder shards of day {offset}') as stats:
+                    Shard._cron_run_shards()
+            shards = Shard.search([('reminder_date', '=', day)])
+            self.assertEqual(set(shards.mapped('state')), {'done'})
+            days[offset] = stats
+            self.assertLess(stats['queries'] / len(shards), 200, stats)
+        self.assertLess(max(stats['seconds'] for stats in days.values()), days[0]['seconds'] * 2 + 1, days)
@@ -0,0 +1,185 @@
+from datetime import date, timedelta
+import json
+import logging
+import os
+import tempfile
+
+from odoo.tests import tagged
+
+from .common import LibraryBenchmarkCase
+
+_logger = logging.getLogger(__name__)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+# LIBRARY_BENCHMARK_SCALES: comma separated scales to run, all by default
+# LIBRARY_BENCHMARK_RESULTS: where the results are written as JSON
+# LIBRARY_BENCHMARK_UPDATE_BASELINE: store the results as the new baseline
+# LIBRARY_BENCHMARK_TIME_TOLERANCE: allowed slowdown ratio, 1.5 by default
+QUERY_TOLERANCE = 0.1
+QUERY_SLACK = 2
+
+
+@tagged('library_benchmark', '-standard', 'post_install', '-at_install')
+class TestLibraryBenchmarkSuite(LibraryBenchmarkCase):
+
+    def _run_scenarios(self, scale):
+        library = self._seed_library(scale)
+        Rental = self.env['library.rental']
+        Book = self.env['library.book']
+        Member = self.env['library.member']
+        members = library['members'][:100]
+        results = {}
+
+        def measure(name, function):
+            self.env.invalidate_all()
+            with self._benchmark(f'{scale} {name}') as stats:
+                function()
+            results[name] = {'seconds': round(stats['seconds'], 4), 'queries': stats['queries']}
+
+        available = Book.search([('id', 'in', library['books'].ids), ('available', '=', True)], limit=100)
+        measure('checkout_100', lambda: Rental.create([{
+            'book_id': book.id,
+            'member_id': members[index % len(members)].id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        } for index, book in enumerate(available)]))
+
+        active = Rental.search([('state', '=', 'ongoing')], order='id', limit=100)
+        measure('return_100', lambda: active.action_return_book())
+
+        measure('overdue_cron', lambda: Rental._cron_check_overdue_rentals())
+
+        counted = library['members'][:1_000]
+
+        def recompute_member_counters():
+            self.env.add_to_compute(Member._fields['rental_count'], counted)
+            counted.flush_recordset()
+
+        measure('member_counters_1000', recompute_member_counters)
+
+        books = library['books'][:1_000]
+        measure('book_counters_1000', lambda: books.mapped('rental_count') + books.mapped('copy_count'))
+
+        measure('catalog_search', lambda: Book._search_catalog('generated book 4242', limit=20).mapped('display_name'))
+
+        measure('book_list_80', lambda: Book.web_search_read([], {
+            'name': {},
+            'isbn': {},
+            'author_id': {'fields': {'display_name': {}}},
+            'rental_count': {},
+            'status': {},
+            'available_copy_count': {},
+        }, limit=80))
+
+        measure('rental_list_80', lambda: Rental.web_search_read([], {
+            'book_id': {'fields': {'display_name': {}}},
+            'member_id': {'fields': {'display_name': {}}},
+            'checkout_date': {},
+            'due_date': {},
+            'state': {},
+            'days_overdue': {},
+        }, limit=80))
+        return results
+
+    def _write_results(self, scale, results):
+        path = os.environ.get('LIBRARY_BENCHMARK_RESULTS') or os.path.join(
+            tempfile.gettempdir(), 'library_benchmark_results.json'
+        )
+        stored = {}
+        if os.path.exists(path):
+            with open(path) as results_file:
+                stored = json.load(results_file)
+        stored[scale] = results
+        with open(path, 'w') as results_file:
+            json.dump(stored, results_file, indent=2, sort_keys=True)
+        _logger.info("Benchmark results for %s written to %s", scale, path)
+
+        if os.environ.get('LIBRARY_BENCHMARK_UPDATE_BASELINE'):
+            with open(BASELINE_PATH) as baseline_file:
+                baseline = json.load(baseline_file)
+            baseline[scale] = results
+            with open(BASELINE_PATH, 'w') as baseline_file:
+                json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+                baseline_file.write('\n')
+
+    def _compare_with_baseline(self, scale, results):
+        with open(BASELINE_PATH) as baseline_file:
+            baseline = json.load(baseline_file).get(scale, {})
+        time_tolerance = float(os.environ.get('LIBRARY_BENCHMARK_TIME_TOLERANCE', 1.5))
+        missing = sorted(set(results) - set(baseline))
+        if missing and not os.environ.get('LIBRARY_BENCHMARK_UPDATE_BASELINE'):
+            # an unbaselined scenario would never catch a regression
+            self.fail(
+                f"No {scale} baseline for {', '.join(missing)}, "
+                "record one with LIBRARY_BENCHMARK_UPDATE_BASELINE=1"
+            )
+        regressions = []
+        for name, measured in sorted(results.items()):
+            expected = baseline.get(name)
+            if not expected:
+                continue
+            query_limit = expected['queries'] * (1 + QUERY_TOLERANCE) + QUERY_SLACK
+            if measured['queries'] > query_limit:
+                regressions.append(
+                    f"{scale}/{name}: queries {expected['queries']} -> {measured['queries']} "
+                    f"(limit {int(query_limit)})"
+                )
+            time_limit = expected['seconds'] * time_tolerance + 0.05
+            if measured['seconds'] > time_limit:
+                regressions.append(
+                    f"{scale}/{name}: seconds {expected['seconds']} -> {measured['seconds']} "
+                    f"(limit {time_limit:.3f})"
+                )
+        if regressions:
+            self.fail("Performance regressions against the baseline:\n" + "\n".join(regressions))
+
+    def _run_scale(self, scale):
+        scales = os.environ.get('LIBRARY_BENCHMARK_SCALES')
+        if scales and scale not in scales.split(','):
+            self.skipTest(f"scale {scale} not selected")
+        results = self._run_scenarios(scale)
+        self._write_results(scale, results)
+        self._compare_with_baseline(scale, results)
+
+    def test_suite_10k(self):
+
+        # Record and compare the core operations on a generated 10k book library.
+
+        self._run_scale('10k')
+
+    def test_suite_100k(self):
+
+        # Record and compare the core operations on a generated 100k book library.
+
+        self._run_scale('100k')
+
+    def test_suite_1m(self):
+
+        # Record and compare the core operations on a generated 1M book library.
+
+        self._run_scale('1m')
+
+    def test_generator_is_reproducible(self):
+
+        # Test that the same seed builds the same library, ids aside.
+
+        def snapshot():
+            library = self._seed_library('10k', seed=0.1)
+            first_author, first_member = library['authors'][:1].id, library['members'][:1].id
+            self.env.cr.execute(
+                """
+                SELECT array_agg(book.author_id - %s ORDER BY book.id),
+                       (SELECT array_agg(rental.member_id - %s ORDER BY rental.id)
+                          FROM library_rental rental WHERE rental.book_id = ANY(%s))
+                  FROM library_book book
+                 WHERE book.id = ANY(%s)
+                """,
+                [first_author, first_member, library['books'].ids, library['books'].ids],
+            )
+            return self.env.cr.fetchone()
+
+        with self.env.cr.savepoint() as savepoint:
+            first = snapshot()
+            savepoint.rollback()
+        self.env.invalidate_all()
+        self.assertEqual(snapshot(), first)
@@ -0,0 +1,228 @@
+from datetime import date, timedelta
+
+from odoo.exceptions import UserError
+
+from .common import LibraryBenchmarkCase
+
+
+class TestLibraryBook(LibraryBenchmarkCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = cls.env['library.author'].create({
+            'name': 'Prolific Author',
+        })
+        cls.member = cls.env['library.member'].create({
+            'name': 'Catalog Member',
+            'email': 'catalog.member@example.com',
+        })
+
+    def _list_books(self, books):
+        # mirrors what the books list view asks for
+        return books.web_search_read([('id', 'in', books.ids)], {
+            'name': {},
+            'isbn': {},
+            'author_id': {'fields': {'display_name': {}}},
+            'publication_date': {},
+            'rental_count': {},
+            'status': {},
+        })
+
+    def test_01_counts_use_grouped_aggregates(self):
+
+        # Test that book and author counts are right when computed for a whole recordset.
+
+        books = self.env['library.book'].create([{
+            'name': f'Counted Book {index}',
+            'author_id': self.author.id,
+        } for index in range(3)])
+        self.env['library.rental'].create({
+            'book_id': books[0].id,
+            'member_id': self.member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        }).action_return_book()
+
+        self.assertEqual(self.author.book_count, 3)
+        self.assertEqual(books.mapped('rental_count'), [1, 0, 0])
+
+        books[2].author_id = False
+        self.assertEqual(self.author.book_count, 2)
+
+    def test_02_list_1000_books_fixed_query_count(self):
+
+        # Test that listing 1,000 books costs as many queries as listing 10.
+
+        members = self._seed_members(10)
+        counts = {}
+        for size in (10, 1_000):
+            books = self._seed_books(size, status='rented')
+            self._seed_rentals(
+                books, members,
+                checkout_date=date.today(),
+                due_date=date.today() + timedelta(days=14),
+            )
+            self.env.invalidate_all()
+            with self._benchmark(f'list {size} books') as stats:
+                result = self._list_books(books)
+            self.assertEqual(result['length'], size)
+            counts[size] = stats['queries']
+
+        self.assertEqual(counts[10], counts[1_000])
+
+    def test_03_isbn_lookup_resolves_variants(self):
+
+        # Test that raw, hyphenated and ISBN-10 codes resolve to the same book.
+
+        book = self.env['library.book'].create({
+            'name': 'Scanned Book',
+            'isbn': '978-0-306-40615-7',
+        })
+        Book = self.env['library.book']
+
+        for code in ('9780306406157', '978-0-306-40615-7', '0-306-40615-2', '0306406152'):
+            self.assertEqual(Book.lookup_isbn(code), book, code)
+
+        stats = Book._get_isbn_cache_stats()
+        Book.lookup_isbn('0306406152')
+        self.assertEqual(Book._get_isbn_cache_stats()['hits'], stats['hits'] + 1)
+
+    def test_04_isbn_lookup_invalidated_on_write(self):
+
+        # Test that changing or removing an ISBN is seen by the next lookup.
+
+        book = self.env['library.book'].create({
+            'name': 'Relabelled Book',
+            'isbn': '978-0-306-40615-7',
+        })
+        Book = self.env['library.book']
+        self.assertEqual(Book.lookup_isbn('0306406152'), book)
+
+        book.isbn = '978-1-4028-9462-6'
+        self.assertFalse(Book.lookup_isbn('0306406152'))
+        self.assertEqual(Book.lookup_isbn('1-4028-9462-7'), book)
+
+        book.unlink()
+        self.assertFalse(Book.lookup_isbn('1-4028-9462-7'))
+
+    def test_05_catalog_search(self):
+
+        # Test that catalog search matches partial terms across titles, ISBNs and authors.
+
+        author = self.env['library.author'].create({
+            'name': 'Joanne Rowling',
+            'biography': 'British novelist, wrote under a pen name.',
+        })
+        stone, chamber = self.env['library.book'].create([{
+            'name': "Harry Potter and the Philosopher's Stone",
+            'isbn': '978-0-7475-3269-9',
+            'author_id': author.id,
+        }, {
+            'name': 'Harry Potter and the Chamber of Secrets',
+            'isbn': '978-0-7475-3849-3',
+            'author_id': author.id,
+        }])
+        Book = self.env['library.book']
+
+        self.assertEqual(Book.search([('catalog_search', 'ilike', 'harr pot')]), stone | chamber)
+        self.assertEqual(Book.search([('catalog_search', 'ilike', 'chamb rowl')]), chamber)
+        self.assertEqual(Book.search([('catalog_search', 'ilike', 'novelist stone')]), stone)
+        self.assertEqual(Book.search([('catalog_search', 'ilike', '3269')]), stone)
+
+        results = Book.name_search('harr pot chamber')
+        self.assertEqual([book_id for book_id, _name in results], chamber.ids)
+
+        author.name = 'J. K. Rowling'
+        self.assertIn('J. K. Rowling', stone.catalog_text)
+
+    def test_06_multi_copy_checkout(self):
+
+        # Test that checkouts of a title allocate distinct copies until none is left.
+
+        book = self.env['library.book'].create({
+            'name': 'Bestseller',
+            'copy_ids': [(0, 0, {'barcode': f'BEST-{index}'}) for index in range(3)],
+        })
+        self.assertEqual((book.copy_count, book.available_copy_count), (3, 3))
+        members = self.env['library.member'].create([{
+            'name': f'Reader {index}',
+            'email': f'reader{index}@example.com',
+        } for index in range(4)])
+
+        rentals = self.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        } for member in members[:2]])
+
+        self.assertEqual(len(rentals.copy_id), 2)
+        self.assertEqual(book.available_copy_count, 1)
+        self.assertEqual(book.status, 'available')
+        self.assertIn(book, self.env['library.book'].search([('available', '=', True)]))
+
+        last = self.env['library.rental'].create({
+            'book_id': book.id,
+            'member_id': members[2].id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        })
+        self.assertEqual(book.status, 'rented')
+        self.assertIn(book, self.env['library.book'].search([('status', '=', 'rented')]))
+        with self.assertRaises(UserError):
+            self.env['library.rental'].create({
+                'book_id': book.id,
+                'member_id': members[3].id,
+                'checkout_date': date.today(),
+                'due_date': date.today() + timedelta(days=14),
+            })
+
+        last.action_return_book()
+        self.assertEqual(last.copy_id.status, 'available')
+        self.assertEqual(book.available_copy_count, 1)
+
+    def test_07_titles_without_copies(self):
+
+        # Test that a title whose copies were all removed has its own status instead of looking rented.
+
+        Book = self.env['library.book']
+        book = Book.create({'name': 'Withdrawn Title'})
+        book.copy_ids.unlink()
+
+        self.assertEqual((book.status, book.copy_count), ('no_copies', 0))
+        self.assertIn(book, Book.search([('status', '=', 'no_copies')]))
+        self.assertNotIn(book, Book.search([('status', '=', 'rented')]))
+        with self.assertRaises(UserError):
+            book.action_open_rental_wizard()
+
+    def test_08_copy_counters_are_stored(self):
+
+        # Test that copy status changes update the stored counters of their title, so titles group by status.
+
+        Book = self.env['library.book']
+        books = Book.create([{'name': f'Grouped Title {index}'} for index in range(3)])
+        member = self.env['library.member'].create({'name': 'Grouping Reader', 'email': 'grouping@example.com'})
+        books[2].copy_ids.unlink()
+        self.env['library.rental'].create({
+            'book_id': books[1].id,
+            'member_id': member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        })
+        self.env.flush_all()
+
+        self.env.cr.execute(
+            "SELECT id, status, available_copy_count, copy_count FROM library_book WHERE id IN %s ORDER BY id",
+            [tuple(books.ids)],
+        )
+        self.assertEqual(self.env.cr.fetchall(), [
+            (books[0].id, 'available', 1, 1),
+            (books[1].id, 'rented', 0, 1),
+            (books[2].id, 'no_copies', 0, 0),
+        ])
+        self.assertEqual(
+            dict(Book._read_group([('id', 'in', books.ids)], ['status'], ['__count'])),
+            {'available': 1, 'rented': 1, 'no_copies': 1},
+        )
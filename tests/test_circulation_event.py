@@ -0,0 +1,90 @@
+from odoo.tests.common import TransactionCase
+from datetime import date, datetime, timedelta
+
+
+class TestLibraryCirculationEvent(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.book = cls.env['library.book'].create({
+            'name': 'Offline Book',
+            'isbn': '978-0262033848',
+        })
+        cls.first, cls.second, cls.third = cls.env['library.member'].create([{
+            'name': f'Offline Member {index}',
+            'email': f'offline.member{index}@example.com',
+        } for index in range(3)])
+        cls.Event = cls.env['library.circulation.event']
+
+    def _payload(self):
+        now = datetime.now().replace(microsecond=0)
+        # sent out of order, as kiosks upload whatever they queued
+        return [{
+            'id': 'kiosk-1:3', 'kiosk': 'kiosk-1', 'type': 'checkout', 'isbn': '9780262033848',
+            'member_id': self.second.id, 'time': (now - timedelta(days=1)).isoformat(),
+        }, {
+            'id': 'kiosk-1:1', 'kiosk': 'kiosk-1', 'type': 'checkout', 'isbn': '0-262-03384-4',
+            'member_email': 'offline.member0@example.com', 'time': (now - timedelta(days=3)).isoformat(),
+        }, {
+            'id': 'kiosk-2:1', 'kiosk': 'kiosk-2', 'type': 'checkout', 'book_id': self.book.id,
+            'member_id': self.third.id, 'time': (now - timedelta(days=1, seconds=-60)).isoformat(),
+        }, {
+            'id': 'kiosk-1:2', 'kiosk': 'kiosk-1', 'type': 'return', 'isbn': '9780262033848',
+            'time': (now - timedelta(days=2)).isoformat(),
+        }, {
+            'id': 'kiosk-1:4', 'type': 'renew', 'isbn': '9780262033848', 'time': now.isoformat(),
+        }]
+
+    def test_01_replayed_upload_is_a_no_op(self):
+
+        # Test that events are received once and invalid ones are reported, not stored.
+
+        result = self.Event._ingest(self._payload())
+        self.assertEqual((result['received'], result['queued'], result['duplicates']), (5, 4, 0))
+        self.assertEqual(result['rejected'], [{'index': 4, 'id': 'kiosk-1:4', 'error': "unknown type 'renew'"}])
+
+        self.Event._cron_apply_events()
+        rentals = self.env['library.rental'].search([('book_id', '=', self.book.id)])
+        replay = self.Event._ingest(self._payload())
+        self.assertEqual((replay['queued'], replay['duplicates']), (0, 4))
+        self.Event._cron_apply_events()
+        self.assertEqual(self.env['library.rental'].search([('book_id', '=', self.book.id)]), rentals)
+        self.assertEqual(self.Event.search_count([('client_event_id', 'like', 'kiosk-%')]), 4)
+
+    def test_02_events_applied_in_time_order(self):
+
+        # Test that events follow their scan time and a double checkout is reported as a conflict.
+
+        self.Event._ingest(self._payload())
+        self.Event._cron_apply_events(batch_size=2)
+
+        events = {event.client_event_id: event for event in self.Event.search([])}
+        self.assertEqual(events['kiosk-1:1'].state, 'applied')
+        self.assertEqual(events['kiosk-1:2'].state, 'applied')
+        self.assertEqual(events['kiosk-1:3'].state, 'applied')
+        self.assertEqual(events['kiosk-2:1'].state, 'conflict')
+        self.assertIn('currently rented', events['kiosk-2:1'].message)
+
+        first_rental = events['kiosk-1:1'].rental_id
+        self.assertEqual(first_rental.member_id, self.first)
+        self.assertEqual(first_rental.checkout_date, date.today() - timedelta(days=3))
+        self.assertEqual(first_rental.return_date, date.today() - timedelta(days=2))
+        self.assertEqual(events['kiosk-1:3'].rental_id.member_id, self.second)
+        self.assertEqual(self.book.status, 'rented')
+
+    def test_03_retry_conflicts(self):
+
+        # Test that a conflict applies once retried after the book came back.
+
+        self.Event._ingest(self._payload())
+        self.Event._cron_apply_events()
+        conflict = self.Event.search([('state', '=', 'conflict')])
+        self.env['library.rental'].search([('book_id', '=', self.book.id), ('state', '=', 'ongoing')]).action_return_book()
+
+        conflict.action_retry()
+        self.assertEqual(conflict.state, 'pending')
+        self.Event._cron_apply_events()
+        self.assertEqual(conflict.state, 'applied')
+        self.assertEqual(conflict.rental_id.member_id, self.third)
@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import psycopg2.errors
+
+from odoo import SUPERUSER_ID, api, sql_db
+from odoo.exceptions import UserError, ValidationError
+from odoo.tests import BaseCase, get_db_name, tagged
+
+_logger = logging.getLogger(__name__)
+
+MAX_TRIES = 10
+
+
+@tagged('library_concurrency', '-standard', 'post_install', '-at_install')
+class TestLibraryConcurrency(BaseCase):
+
+    # These tests need committed data seen by several real connections, they
+    # bypass the test cursor and clean up after themselves.
+    WORKERS = 8
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.db = sql_db.db_connect(get_db_name())
+
+    def _run_in_workers(self, target, count):
+        barrier = threading.Barrier(count)
+        results = [None] * count
+
+        def worker(index):
+            with self.db.cursor() as cr:
+                barrier.wait()
+                # like the RPC layer, retry transactions that lost a serialization race
+                for _attempt in range(MAX_TRIES):
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    try:
+                        results[index] = target(env, index)
+                        cr.commit()
+                        break
+                    except psycopg2.errors.SerializationFailure:
+                        cr.rollback()
+                    except (UserError, ValidationError) as error:
+                        cr.rollback()
+                        results[index] = error
+                        break
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _cleanup(self, books, members):
+        with self.db.cursor() as cr:
+            cr.execute("DELETE FROM library_hold WHERE book_id = ANY(%s)", [books])
+            cr.execute("DELETE FROM library_rental WHERE book_id = ANY(%s)", [books])
+            cr.execute("DELETE FROM library_book_copy WHERE book_id = ANY(%s)", [books])
+            cr.execute("DELETE FROM library_book WHERE id = ANY(%s)", [books])
+            cr.execute("DELETE FROM library_member WHERE id = ANY(%s)", [members])
+            cr.commit()
+
+    def test_parallel_checkouts_of_same_book(self):
+
+        # Test that only one of several parallel checkouts of the same book succeeds.
+
+        with self.db.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            book = env['library.book'].create({
+                'name': 'Concurrency Book',
+                'isbn': 'CONCURRENCY-0001',
+            })
+            members = env['library.member'].create([{
+                'name': f'Concurrent Member {index}',
+                'email': f'concurrent{index}@example.com',
+            } for index in range(self.WORKERS)])
+            book_ids, member_ids = book.ids, members.ids
+            cr.commit()
+
+        def checkout(env, index):
+            return env['library.rental'].create({
+                'book_id': book_ids[0],
+                'member_id': member_ids[index],
+                'checkout_date': date.today(),
+                'due_date': date.today() + timedelta(days=14),
+            }).id
+
+        try:
+            results = self._run_in_workers(checkout, self.WORKERS)
+            successes = [result for result in results if isinstance(result, int)]
+            self.assertEqual(len(successes), 1, results)
+            for result in results:
+                if not isinstance(result, int):
+                    self.assertIsInstance(result, (UserError, ValidationError))
+        finally:
+            self._cleanup(book_ids, member_ids)
+
+    def test_parallel_returns_allocate_queue_heads(self):
+
+        # Test that concurrent returns each allocate their own queue head exactly once.
+
+        with self.db.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            books = env['library.book'].create([{
+                'name': f'Queued Book {index}',
+                'isbn': f'QUEUED-{index:04d}',
+            } for index in range(self.WORKERS)])
+            members = env['library.member'].create([{
+                'name': f'Queued Member {index}',
+                'email': f'queued{index}@example.com',
+            } for index in range(3)])
+            rentals = env['library.rental'].create([{
+                'book_id': book.id,
+                'member_id': members[0].id,
+                'checkout_date': date.today(),
+                'due_date': date.today() + timedelta(days=14),
+            } for book in books])
+            # both remaining members queue for every book, in the same order
+            for member in members[1:]:
+                env['library.hold'].create([{
+                    'book_id': book.id,
+                    'member_id': member.id,
+                } for book in books])
+            book_ids, member_ids, rental_ids = books.ids, members.ids, rentals.ids
+            cr.commit()
+
+        def give_back(env, index):
+            return env['library.rental'].browse(rental_ids[index])._return_rentals()[0].ids
+
+        try:
+            results = self._run_in_workers(give_back, self.WORKERS)
+            self.assertEqual(sorted(sum(results, [])), sorted(rental_ids))
+
+            with self.db.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                holds = env['library.hold'].search([('book_id', 'in', book_ids)])
+                allocated = holds.filtered(lambda hold: hold.state == 'allocated')
+                self.assertEqual(len(allocated), len(book_ids))
+                self.assertEqual(set(allocated.member_id.ids), {member_ids[1]})
+                self.assertEqual(set(allocated.book_id.mapped('status')), {'reserved'})
+        finally:
+            self._cleanup(book_ids, member_ids)
+
+    def test_parallel_checkouts_of_multi_copy_title(self):
+
+        # Benchmark many desks checking out the same 40-copy title at once.
+
+        copies, workers = 40, 50
+        with self.db.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            book = env['library.book'].create({
+                'name': 'Forty Copies',
+                'isbn': 'FORTY-COPIES-0001',
+                'copy_ids': [(0, 0, {}) for _index in range(copies)],
+            })
+            members = env['library.member'].create([{
+                'name': f'Desk Member {index}',
+                'email': f'desk{index}@example.com',
+            } for index in range(workers)])
+            book_ids, member_ids = book.ids, members.ids
+            cr.commit()
+
+        def checkout(env, index):
+            return env['library.rental'].create({
+                'book_id': book_ids[0],
+                'member_id': member_ids[index],
+                'checkout_date': date.today(),
+                'due_date': date.today() + timedelta(days=14),
+            }).copy_id.id
+
+        try:
+            start = time.perf_counter()
+            results = self._run_in_workers(checkout, workers)
+            elapsed = time.perf_counter() - start
+            _logger.info("%s parallel checkouts of a %s-copy title: %.3fs", workers, copies, elapsed)
+
+            copy_ids = [result for result in results if isinstance(result, int)]
+            self.assertEqual(len(copy_ids), copies, results)
+            self.assertEqual(len(set(copy_ids)), copies)
+        finally:
+            self._cleanup(book_ids, member_ids)
+
+    def test_parallel_reminder_slices_claim_distinct_shards(self):
+
+        # Test that cron slices running at the same time never claim the same shard.
+
+        day = date(2000, 1, 1)
+        with self.db.cursor() as cr:
+            cr.execute(
+                """
+                INSERT INTO library_reminder_shard (reminder_date, bucket, bucket_count, scheduled_at, state)
+                     SELECT %s, bucket, %s, %s, 'pending' FROM generate_series(0, %s - 1) bucket
+                  RETURNING id
+                """,
+                [day, self.WORKERS, datetime(2000, 1, 1, 8), self.WORKERS],
+            )
+            shard_ids = [row[0] for row in cr.fetchall()]
+            cr.commit()
+
+        def claim(env, index):
+            shard = env['library.reminder.shard']._claim()
+            # hold the lock while the other slices look for work
+            time.sleep(0.5)
+            return shard.id
+
+        try:
+            results = self._run_in_workers(claim, self.WORKERS)
+            self.assertEqual(sorted(results), sorted(shard_ids))
+        finally:
+            with self.db.cursor() as cr:
+                cr.execute("DELETE FROM library_reminder_shard WHERE id = ANY(%s)", [shard_ids])
+                cr.commit()
@@ -0,0 +1,93 @@
+from odoo.tests.common import TransactionCase
+from odoo.exceptions import UserError
+from datetime import date, timedelta
+
+
+class TestLibraryFine(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.books = cls.env['library.book'].create([{
+            'name': f'Rule Book {index}',
+        } for index in range(4)])
+        cls.member, cls.other = cls.env['library.member'].create([{
+            'name': 'Rule Member',
+            'email': 'rule.member@example.com',
+        }, {
+            'name': 'Other Member',
+            'email': 'other.member@example.com',
+        }])
+        cls.ICP = cls.env['ir.config_parameter'].sudo()
+
+    def _vals(self, book, member, days_ago=0):
+        checkout = date.today() - timedelta(days=days_ago)
+        return {
+            'book_id': book.id,
+            'member_id': member.id,
+            'checkout_date': checkout,
+            'due_date': checkout + timedelta(days=14),
+        }
+
+    def test_01_max_active_loans_per_batch(self):
+
+        # Test that the loan limit counts current loans and the whole batch with one lookup.
+
+        self.ICP.set_param('library_management.max_active_loans', 2)
+        Rental = self.env['library.rental']
+        Rental.create(self._vals(self.books[0], self.member))
+
+        with self.assertRaisesRegex(UserError, 'Rule Member would hold 3 books'):
+            Rental.create([self._vals(book, self.member) for book in self.books[1:3]])
+
+        vals_list = [
+            self._vals(self.books[1], self.member),
+            self._vals(self.books[2], self.other),
+        ]
+        Rental._check_loan_rules(vals_list)
+        self.env.flush_all()
+        with self.assertQueryCount(1):
+            Rental._check_loan_rules(vals_list)
+
+    def test_02_block_when_overdue(self):
+
+        # Test that members with an overdue book can't borrow when blocking is on.
+
+        Rental = self.env['library.rental']
+        late = Rental.create(self._vals(self.books[0], self.member, days_ago=20))
+        late.action_mark_overdue()
+        Rental.create(self._vals(self.books[1], self.member))
+
+        self.ICP.set_param('library_management.block_when_overdue', True)
+        with self.assertRaisesRegex(UserError, 'overdue book'):
+            Rental.create(self._vals(self.books[2], self.member))
+        Rental.create(self._vals(self.books[2], self.other))
+
+    def test_03_cron_accrues_fines(self):
+
+        # Test that the overdue check upserts one fine per late rental and the return settles its days.
+
+        self.ICP.set_param('library_management.fine_per_day', 0.5)
+        Rental = self.env['library.rental']
+        late = Rental.create(self._vals(self.books[0], self.member, days_ago=20))
+        on_time = Rental.create(self._vals(self.books[1], self.member))
+
+        Rental._cron_check_overdue_rentals()
+        Fine = self.env['library.fine']
+        fine = Fine.search([('member_id', '=', self.member.id)])
+        self.assertEqual(fine.rental_id, late)
+        self.assertEqual((fine.days, fine.amount), (6, 3.0))
+        self.assertEqual(self.member.fine_balance, 3.0)
+
+        # the rate of an open fine is kept when the setting changes
+        self.ICP.set_param('library_management.fine_per_day', 1.0)
+        late.due_date -= timedelta(days=2)
+        Rental._cron_check_overdue_rentals()
+        self.assertEqual(Fine.search_count([('member_id', '=', self.member.id)]), 1)
+        self.assertEqual((fine.days, fine.amount), (8, 4.0))
+
+        fine.action_mark_paid()
+        (late | on_time).action_return_book()
+        self.assertEqual((fine.state, fine.amount), ('paid', 4.0))
+        self.assertEqual(self.member.fine_balance, 0.0)
@@ -0,0 +1,106 @@
+from odoo.tests.common import TransactionCase
+from odoo.exceptions import UserError
+from datetime import date, timedelta
+
+
+class TestLibraryHold(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.book_1, cls.book_2 = cls.env['library.book'].create([{
+            'name': 'Popular Book 1',
+            'isbn': '978-0-306-40615-7',
+        }, {
+            'name': 'Popular Book 2',
+            'isbn': '978-1-4028-9462-6',
+        }])
+        cls.reader, cls.first, cls.second, cls.urgent = cls.env['library.member'].create([{
+            'name': name,
+            'email': f'{name.lower()}@example.com',
+        } for name in ('Reader', 'First', 'Second', 'Urgent')])
+
+    def _rent(self, book, member):
+        return self.env['library.rental'].create({
+            'book_id': book.id,
+            'member_id': member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        })
+
+    def _hold(self, book, member, **vals):
+        return self.env['library.hold'].create({
+            'book_id': book.id,
+            'member_id': member.id,
+            **vals,
+        })
+
+    def test_01_return_allocates_queue_in_order(self):
+
+        # Test that urgent holds go first, then holds are served first come first served.
+
+        rental = self._rent(self.book_1, self.reader)
+        first = self._hold(self.book_1, self.first)
+        second = self._hold(self.book_1, self.second)
+        urgent = self._hold(self.book_1, self.urgent, priority='1')
+        self.assertEqual(self.book_1.hold_count, 3)
+
+        rental.action_return_book()
+
+        self.assertEqual(urgent.state, 'allocated')
+        self.assertEqual((first | second).mapped('state'), ['waiting', 'waiting'])
+        self.assertEqual(self.book_1.status, 'reserved')
+        self.assertFalse(self.book_1.available)
+
+        with self.assertRaises(UserError):
+            self._rent(self.book_1, self.first)
+        rental = self._rent(self.book_1, self.urgent)
+        self.assertEqual(urgent.state, 'collected')
+        self.assertEqual(urgent.rental_id, rental)
+
+        rental.action_return_book()
+        self.assertEqual(first.state, 'allocated')
+        self.assertEqual(second.state, 'waiting')
+
+    def test_02_bulk_return_allocates_each_book(self):
+
+        # Test that returning several books at once allocates the head of every queue.
+
+        rentals = self._rent(self.book_1, self.reader) | self._rent(self.book_2, self.urgent)
+        hold_1 = self._hold(self.book_1, self.first)
+        hold_2 = self._hold(self.book_2, self.first)
+        hold_3 = self._hold(self.book_2, self.second)
+
+        rentals.action_return_book()
+
+        self.assertEqual((hold_1 | hold_2 | hold_3).mapped('state'), ['allocated', 'allocated', 'waiting'])
+        self.assertEqual(set((self.book_1 | self.book_2).mapped('status')), {'reserved'})
+
+    def test_03_expired_holds_move_to_next_in_line(self):
+
+        # Test that the expiry cron hands uncollected books to the next member, or frees them.
+
+        rental = self._rent(self.book_1, self.reader)
+        first = self._hold(self.book_1, self.first)
+        second = self._hold(self.book_1, self.second)
+        rental.action_return_book()
+        first.expiry_date = date.today() - timedelta(days=1)
+
+        self.env['library.hold']._cron_expire_holds()
+
+        self.assertEqual(first.state, 'expired')
+        self.assertEqual(second.state, 'allocated')
+
+        second.action_cancel()
+        self.assertEqual(self.book_1.status, 'available')
+
+    def test_04_cannot_hold_available_book(self):
+
+        # Test that holds are only accepted for books that are not on the shelf.
+
+        with self.assertRaises(UserError):
+            self._hold(self.book_2, self.first)
+        self.assertEqual(self.book_2.action_open_rental_wizard()['res_model'], 'library.rental')
+        self._rent(self.book_2, self.reader)
+        self.assertEqual(self.book_2.action_open_rental_wizard()['res_model'], 'library.hold')
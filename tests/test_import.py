@@ -0,0 +1,146 @@
+from odoo.tests.common import TransactionCase
+from datetime import date, timedelta
+from unittest.mock import patch
+import base64
+import io
+import json
+
+
+class TestLibraryImport(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = cls.env['library.author'].create({
+            'name': 'Known Author',
+        })
+        cls.book = cls.env['library.book'].create({
+            'name': 'Old Title',
+            'isbn': '9780306406157',
+            'author_id': cls.author.id,
+        })
+
+    def _import(self, import_type, content, file_format='csv', chunk_size=1000):
+        wizard = self.env['library.import.wizard'].create({
+            'import_type': import_type,
+            'file': base64.b64encode(content.encode()),
+            'file_format': file_format,
+            'chunk_size': chunk_size,
+        })
+        return wizard._import_file(io.BytesIO(content.encode()))
+
+    def test_01_books_upsert_on_isbn(self):
+
+        # Test that books are matched on the normalized ISBN and authors are resolved or created once.
+
+        result = self._import('book', "\n".join([
+            "name,isbn,author,publication_date",
+            "New Title,0-306-40615-2,Known Author,2001-05-04",
+            "Second Book,978-1-4028-9462-6,New Author,",
+            "Third Book,,New Author,",
+        ]))
+
+        self.assertEqual((result['created'], result['updated'], result['errors']), (2, 1, []))
+        self.assertEqual(self.book.name, 'New Title')
+        self.assertEqual(str(self.book.publication_date), '2001-05-04')
+        new_author = self.env['library.author'].search([('name', '=', 'New Author')])
+        self.assertEqual(len(new_author), 1)
+        self.assertEqual(new_author.book_count, 2)
+        self.assertFalse(self.book.message_ids.filtered(lambda message: message.tracking_value_ids))
+
+    def test_02_error_report_without_aborting(self):
+
+        # Test that bad rows are reported by line while the rest of the file is imported.
+
+        lines = [
+            json.dumps({'name': 'Good Member', 'email': 'good@example.com'}),
+            json.dumps({'name': 'Bad Member', 'email': 'not-an-email'}),
+            '{broken json',
+            json.dumps({'email': 'nameless@example.com'}),
+            json.dumps({'name': 'Other Member', 'email': 'other@example.com'}),
+        ]
+        result = self._import('member', "\n".join(lines), file_format='jsonl', chunk_size=2)
+
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([line_no for line_no, error in result['errors']], [2, 3, 4])
+        self.assertEqual(self.env['library.member'].search_count([
+            ('email', 'in', ['good@example.com', 'other@example.com']),
+        ]), 2)
+
+    def test_03_failing_chunk_falls_back_per_row(self):
+
+        # Test that a database error in a chunk only rejects the faulty row.
+
+        drifted = self.env['library.book'].create({'name': 'Drifted', 'isbn': 'DRIFT-1'})
+        self.env.flush_all()
+        # the upsert misses the title, so its create hits the raw ISBN constraint
+        self.env.cr.execute("UPDATE library_book SET isbn_normalized = 'OTHER' WHERE id = %s", [drifted.id])
+
+        result = self._import('book', "\n".join([
+            "name,isbn",
+            "Book D,ISBN-D",
+            "Book E,DRIFT-1",
+            "Book F,ISBN-F",
+        ]))
+
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([line_no for line_no, error in result['errors']], [3])
+        self.assertEqual(self.env['library.book'].search_count([('isbn', 'in', ['ISBN-D', 'ISBN-F'])]), 2)
+
+    def test_04_isbn_cache_cleared_once_per_file(self):
+
+        # Test that a book import clears the ISBN lookup cache once, not once per chunk.
+
+        content = "\n".join(["name,isbn"] + [f"Cached Book {index},CACHE-{index:04d}" for index in range(10)])
+        registry = self.env.registry
+        with patch.object(registry, 'clear_cache', wraps=registry.clear_cache) as clear_cache:
+            result = self._import('book', content, chunk_size=2)
+        self.assertEqual(result['created'], 10)
+        self.assertEqual(clear_cache.call_count, 1)
+        self.assertEqual(self.env['library.book'].lookup_isbn('cache-0007').name, 'Cached Book 7')
+
+    def test_05_unchanged_books_are_not_rewritten(self):
+
+        # Test that existing books are written once per distinct change and not at all when unchanged.
+
+        Book = self.env['library.book']
+        books = Book.create([{'name': f'Kept Book {index}', 'isbn': f'KEPT-{index}'} for index in range(6)])
+        content = "\n".join(["name,isbn,author"] + [
+            f"Kept Book {index},KEPT-{index},{'Known Author' if index < 4 else ''}" for index in range(6)
+        ])
+        with patch.object(type(Book), 'write', autospec=True, side_effect=type(Book).write) as write:
+            result = self._import('book', content)
+        self.assertEqual(result['updated'], 6)
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(books[:4].author_id, self.author)
+        self.assertFalse(books[4:].author_id)
+
+    def test_06_member_and_author_updates_in_one_round(self):
+
+        # Test that renamed members and new biographies are written per chunk, with one rename sync.
+
+        Member = self.env['library.member']
+        members = Member.create([{'name': f'Old Name {index}', 'email': f'bulk{index}@example.com'} for index in range(5)])
+        book = self.env['library.book'].create({'name': 'Bulk Book'})
+        rental = self.env['library.rental'].create({
+            'book_id': book.id,
+            'member_id': members[0].id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        })
+        content = "\n".join(["name,email"] + [f"New Name {index},bulk{index}@example.com" for index in range(5)])
+
+        Rental = type(self.env['library.rental'])
+        with patch.object(Rental, '_trigger_names_sync', autospec=True) as trigger:
+            result = self._import('member', content)
+        self.assertEqual(result['updated'], 5)
+        self.assertEqual(trigger.call_count, 1)
+        self.assertEqual(members.mapped('name'), [f'New Name {index}' for index in range(5)])
+        self.assertTrue(members[0].rental_names_dirty)
+        self.env['library.rental']._cron_sync_names()
+        self.assertEqual(rental.member_name, 'New Name 0')
+
+        result = self._import('author', "name,biography\nKnown Author,Wrote a lot.")
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual(self.author.biography, 'Wrote a lot.')
@@ -0,0 +1,290 @@
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import HttpCase, TransactionCase, new_test_user
+from datetime import date, datetime, timedelta
+import logging
+import statistics
+import threading
+import time
+
+import requests
+
+_logger = logging.getLogger(__name__)
+
+
+class TestLibraryKiosk(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.book_1, cls.book_2, cls.book_3 = cls.env['library.book'].create([{
+            'name': 'Kiosk Book One',
+            'isbn': '978-0306406157',
+        }, {
+            'name': 'Kiosk Book Two',
+            'isbn': '978-1861972712',
+        }, {
+            'name': 'Kiosk Book Three',
+        }])
+        cls.book_3.copy_ids.barcode = 'KIOSK-0003'
+        cls.member = cls.env['library.member'].create({
+            'name': 'Kiosk Member',
+            'email': 'kiosk.member@example.com',
+        })
+        cls.Rental = cls.env['library.rental']
+
+    def test_01_batched_checkout_reports_per_item(self):
+
+        # Test that good scans are checked out while bad ones get their own error.
+
+        results = self.Rental._kiosk_checkout([
+            {'isbn': '0306406152', 'member_email': 'kiosk.member@example.com'},
+            {'isbn': '000-UNKNOWN', 'member_id': self.member.id},
+            {'barcode': 'KIOSK-0003', 'member_id': self.member.id},
+            {'isbn': '978-1861972712'},
+            {'book_id': self.book_2.id, 'member_id': self.member.id, 'due_date': '2100-01-01'},
+            {'book_id': self.book_2.id, 'member_id': self.member.id},
+        ])
+
+        self.assertEqual([result['ok'] for result in results], [True, False, True, False, True, False])
+        self.assertIn('unknown ISBN', results[1]['error'])
+        self.assertIn('missing member', results[3]['error'])
+        self.assertIn('currently rented', results[5]['error'])
+        self.assertEqual(results[0]['book'], 'Kiosk Book One')
+        self.assertEqual(results[0]['due_date'], fields.Date.to_string(date.today() + timedelta(days=14)))
+        self.assertEqual(results[2]['copy'], 'KIOSK-0003')
+        # a kiosk can't extend the loan period
+        self.assertEqual(results[4]['due_date'], results[0]['due_date'])
+        self.assertEqual(
+            self.Rental.search([('member_id', '=', self.member.id)]).book_id,
+            self.book_1 | self.book_2 | self.book_3,
+        )
+
+    def test_02_batched_return_by_scan(self):
+
+        # Test that returns find the active rental from the scan and refuse double scans.
+
+        rentals = self.Rental._kiosk_checkout([
+            {'book_id': book.id, 'member_id': self.member.id}
+            for book in (self.book_1, self.book_2, self.book_3)
+        ])
+        results = self.Rental._kiosk_return([
+            {'isbn': '9780306406157'},
+            {'isbn': '9780306406157'},
+            {'barcode': 'KIOSK-0003', 'member_email': 'nobody@example.com'},
+            {'rental_id': rentals[1]['rental_id']},
+        ])
+
+        self.assertEqual([result['ok'] for result in results], [True, False, False, True])
+        self.assertIn('no active rental', results[1]['error'])
+        self.assertIn('unknown member', results[2]['error'])
+        self.assertEqual(self.book_1.status, 'available')
+        self.assertEqual(self.book_3.status, 'rented')
+
+    def test_03_lookup_and_availability(self):
+
+        # Test that lookups return compact payloads in scan order.
+
+        self.Rental._kiosk_checkout([{'book_id': self.book_2.id, 'member_id': self.member.id}])
+        payloads = self.env['library.book']._kiosk_lookup(['0-306-40615-2', 'unknown', '9781861972712'])
+
+        self.assertIsNone(payloads[1])
+        self.assertEqual(payloads[0]['id'], self.book_1.id)
+        self.assertEqual((payloads[0]['available_copies'], payloads[0]['copies']), (1, 1))
+        self.assertEqual((payloads[2]['status'], payloads[2]['available_copies']), ('rented', 0))
+
+        results = self.env['library.book']._kiosk_availability([self.book_2.id, 'abc', 0, str(self.book_1.id)])
+        self.assertEqual([result['ok'] for result in results], [True, False, False, True])
+        self.assertEqual(results[0]['status'], 'rented')
+        self.assertIn('unknown book', results[1]['error'])
+        self.assertEqual(results[3]['id'], self.book_1.id)
+
+    def test_04_live_scans_are_dated_today(self):
+
+        # Test that live kiosk calls can't backdate a checkout or a return.
+
+        today = fields.Date.context_today(self.Rental)
+        [checkout] = self.Rental._kiosk_checkout([
+            {'book_id': self.book_1.id, 'member_id': self.member.id, 'checkout_date': '2020-01-01'},
+        ])
+        rental = self.Rental.browse(checkout['rental_id'])
+        self.assertEqual(rental.checkout_date, today)
+
+        rental.write({'checkout_date': today - timedelta(days=20), 'due_date': today - timedelta(days=3)})
+        [returned] = self.Rental._kiosk_return([{'rental_id': rental.id, 'return_date': '2020-01-02'}])
+        self.assertTrue(returned['ok'], returned)
+        self.assertEqual((rental.return_date, rental.days_overdue), (today, 3))
+
+    def test_05_malformed_fields_fail_their_own_item(self):
+
+        # Test that a malformed field in one item doesn't fail the rest of the call.
+
+        results = self.Rental._kiosk_checkout([
+            {'book_id': 'abc', 'member_id': self.member.id},
+            {'isbn': 9780306406157, 'member_id': self.member.id},
+            {'book_id': self.book_2.id, 'member_email': ['kiosk.member@example.com']},
+            {'book_id': self.book_2.id, 'member_id': self.member.id, 'due_date': 20240101},
+            {'book_id': str(self.book_1.id), 'member_id': self.member.id},
+        ])
+        self.assertEqual([result['ok'] for result in results], [False, False, False, False, True])
+        self.assertIn('unknown book', results[0]['error'])
+        self.assertIn('unknown ISBN', results[1]['error'])
+        self.assertIn('unknown member', results[2]['error'])
+        self.assertIn('invalid checkout or due date', results[3]['error'])
+
+        results = self.Rental._kiosk_return([{'rental_id': {'id': 1}}, {'rental_id': results[4]['rental_id']}])
+        self.assertEqual([result['ok'] for result in results], [False, True])
+
+    def test_06_title_scan_held_by_several_members(self):
+
+        # Test that a title-level return held by several members asks for the copy or the member.
+
+        self.book_1.copy_ids.barcode = 'KIOSK-0001-A'
+        self.env['library.book.copy'].create({'book_id': self.book_1.id, 'barcode': 'KIOSK-0001-B'})
+        other = self.env['library.member'].create({'name': 'Other Kiosk Member', 'email': 'kiosk.other@example.com'})
+        self.Rental._kiosk_checkout([
+            {'barcode': 'KIOSK-0001-A', 'member_id': self.member.id},
+            {'barcode': 'KIOSK-0001-B', 'member_id': other.id},
+        ])
+
+        results = self.Rental._kiosk_return([
+            {'isbn': '9780306406157'},
+            {'isbn': '9780306406157', 'member_email': 'kiosk.other@example.com'},
+            {'isbn': '9780306406157'},
+        ])
+        self.assertEqual([result['ok'] for result in results], [False, True, True])
+        self.assertIn('several members', results[0]['error'])
+        self.assertEqual(
+            self.Rental.search([('book_id', '=', self.book_1.id), ('state', '=', 'returned')]).member_id, other,
+        )
+
+
+class LibraryKioskCase(HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.kiosk_user = new_test_user(cls.env, 'library_kiosk', groups='library_management.group_library_user')
+        cls.api_key = cls.env['res.users.apikeys'].with_user(cls.kiosk_user)._generate(
+            None, 'Kiosk', fields.Datetime.now() + timedelta(days=1),
+        )
+
+    def _kiosk_call(self, route, **params):
+        return self.make_jsonrpc_request(route, params, headers={'Authorization': f'Bearer {self.api_key}'})
+
+
+@tagged('post_install', '-at_install')
+class TestLibraryKioskHttp(LibraryKioskCase):
+
+    def test_01_checkout_and_return_round_trip(self):
+
+        # Test that a kiosk checks out, looks up and returns books with its API key.
+
+        book = self.env['library.book'].create({'name': 'Kiosk Http Book', 'isbn': '978-0131103627'})
+        member = self.env['library.member'].create({'name': 'Kiosk Http Member', 'email': 'kiosk.http@example.com'})
+
+        checkout = self._kiosk_call('/library/kiosk/checkout', items=[
+            {'isbn': '9780131103627', 'member_email': 'kiosk.http@example.com'},
+        ])
+        self.assertTrue(checkout[0]['ok'], checkout)
+        [payload] = self._kiosk_call('/library/kiosk/availability', book_ids=[book.id])
+        self.assertTrue(payload['ok'], payload)
+        self.assertEqual(payload['status'], 'rented')
+        returned = self._kiosk_call('/library/kiosk/return', items=[{'isbn': '9780131103627'}])
+        self.assertEqual(returned[0]['rental_id'], checkout[0]['rental_id'])
+        self.assertEqual(self._kiosk_call('/library/kiosk/lookup', codes=['9780131103627'])[0]['status'], 'available')
+        self.assertEqual(self.env['library.rental'].search([('member_id', '=', member.id)]).state, 'returned')
+
+    def test_03_offline_sync_is_idempotent(self):
+
+        # Test that uploading the same offline events twice only queues them once.
+
+        book = self.env['library.book'].create({'name': 'Kiosk Sync Book', 'isbn': 'SYNC-0001'})
+        member = self.env['library.member'].create({'name': 'Kiosk Sync Member', 'email': 'kiosk.sync@example.com'})
+        events = [{
+            'id': 'sync-test:1', 'type': 'checkout', 'isbn': 'SYNC-0001',
+            'member_id': member.id, 'time': '2024-05-02T09:30:00+02:00',
+        }]
+        first = self._kiosk_call('/library/kiosk/sync', events=events)
+        second = self._kiosk_call('/library/kiosk/sync', events=events)
+        self.assertEqual((first['queued'], second['queued'], second['duplicates']), (1, 0, 1))
+
+        event = self.env['library.circulation.event'].search([('client_event_id', '=', 'sync-test:1')])
+        self.assertEqual(event.event_time, datetime(2024, 5, 2, 7, 30))
+        event._cron_apply_events()
+        self.assertEqual(event.rental_id.book_id, book)
+
+    def test_02_rejects_anonymous_calls(self):
+
+        # Test that calls without a valid API key are refused.
+
+        response = self.url_open(
+            '/library/kiosk/lookup',
+            data='{"jsonrpc": "2.0", "method": "call", "params": {"codes": []}}',
+            headers={'Content-Type': 'application/json', 'Authorization': 'Bearer invalid'},
+        )
+        error = response.json()['error']
+        self.assertEqual(error['data']['name'], 'werkzeug.exceptions.Unauthorized')
+
+
+@tagged('library_benchmark', '-standard', 'post_install', '-at_install')
+class TestLibraryKioskLoad(LibraryKioskCase):
+
+    KIOSKS = 200
+
+    def test_concurrent_kiosks_latency(self):
+
+        # 200 kiosks each run a lookup, a checkout and a return at the same time.
+
+        books = self.env['library.book'].create([{
+            'name': f'Load Book {index}',
+            'isbn': f'LOAD-{index:04d}',
+        } for index in range(self.KIOSKS)])
+        members = self.env['library.member'].create([{
+            'name': f'Load Member {index}',
+            'email': f'load.member{index}@example.com',
+        } for index in range(self.KIOSKS)])
+        url = self.base_url()
+        headers = {'Authorization': f'Bearer {self.api_key}'}
+        barrier = threading.Barrier(self.KIOSKS)
+        latencies = {'lookup': [], 'checkout': [], 'return': []}
+        failures = []
+
+        def call(session, name, route, params):
+            start = time.perf_counter()
+            response = session.post(f'{url}{route}', json={
+                'jsonrpc': '2.0', 'method': 'call', 'params': params,
+            }, headers=headers, timeout=120)
+            latencies[name].append(time.perf_counter() - start)
+            body = response.json()
+            if 'error' in body or not all(item and item.get('ok', True) for item in body['result']):
+                failures.append((name, body))
+
+        def kiosk(isbn, member_id):
+            with requests.Session() as session:
+                barrier.wait()
+                call(session, 'lookup', '/library/kiosk/lookup', {'codes': [isbn]})
+                call(session, 'checkout', '/library/kiosk/checkout', {
+                    'items': [{'isbn': isbn, 'member_id': member_id}],
+                })
+                call(session, 'return', '/library/kiosk/return', {'items': [{'isbn': isbn}]})
+
+        # threads only get plain values, records stay on the test cursor
+        threads = [
+            threading.Thread(target=kiosk, args=(book.isbn, member.id))
+            for book, member in zip(books, members)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertFalse(failures, failures[:5])
+        for name, timings in latencies.items():
+            timings.sort()
+            p50 = statistics.median(timings)
+            p99 = timings[int(len(timings) * 0.99) - 1]
+            _logger.info("Kiosk %s with %s kiosks: p50 %.1f ms, p99 %.1f ms", name, self.KIOSKS, p50 * 1000, p99 * 1000)
+            self.assertEqual(len(timings), self.KIOSKS)
@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+from .common import LibraryBenchmarkCase
+
+
+class TestLibraryMember(LibraryBenchmarkCase):
+
+    def _member_with_history(self, history):
+        member = self._seed_members(1)
+        old = date.today() - timedelta(days=60)
+        self._seed_rentals(
+            self._seed_books(history), member,
+            checkout_date=old, due_date=old + timedelta(days=14),
+            state='returned', return_date=old + timedelta(days=7),
+        )
+        self._seed_rentals(
+            self._seed_books(2), member,
+            checkout_date=date.today(), due_date=date.today() + timedelta(days=14),
+        )
+        self.env.invalidate_all()
+        return member
+
+    def test_01_current_rentals_query_count(self):
+
+        # Test that reading current rentals costs the same queries and rows whatever the history size.
+
+        queries = {}
+        for history in (10, 2_000):
+            member = self._member_with_history(history)
+            with self._benchmark(f'current rentals ({history} returned)') as stats:
+                current = member.current_rental_ids
+                self.assertEqual(len(current), 2)
+                self.assertEqual(set(current.mapped('state')), {'ongoing'})
+            queries[history] = stats['queries']
+
+        self.assertEqual(queries[10], queries[2_000], queries)
+        self.assertLessEqual(queries[2_000], 3)
+
+    def test_02_members_holding_books(self):
+
+        # Test that members holding books are found with a single search on current rentals.
+
+        holding = self._member_with_history(5)
+        idle = self._seed_members(1)
+        Member = self.env['library.member']
+
+        with self._benchmark('members holding books') as stats:
+            members = Member.search([('id', 'in', (holding | idle).ids), ('current_rental_ids', '!=', False)])
+        self.assertEqual(members, holding)
+        self.assertEqual(stats['queries'], 1)
+
+        self.env['library.rental'].search([('member_id', '=', holding.id), ('state', '=', 'ongoing')]).action_return_book()
+        self.assertFalse(Member.search([('id', '=', holding.id), ('current_rental_ids', '!=', False)]))
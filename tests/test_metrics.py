@@ -0,0 +1,111 @@
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+from odoo.tests.common import HttpCase, TransactionCase
+from datetime import date, timedelta
+
+from ..models import library_metrics
+
+
+class TestLibraryMetrics(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.books = cls.env['library.book'].create([{
+            'name': f'Metrics Book {index}',
+        } for index in range(3)])
+        cls.member = cls.env['library.member'].create({
+            'name': 'Metrics Member',
+            'email': 'metrics.member@example.com',
+        })
+
+    def setUp(self):
+        super().setUp()
+        library_metrics.reset_metrics()
+        self.addCleanup(library_metrics.reset_metrics)
+
+    def _checkout(self, books):
+        return self.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        } for book in books])
+
+    def test_01_hot_paths_are_recorded(self):
+
+        # Test that checkout and return record calls, queries, records and the latency histogram.
+
+        rentals = self._checkout(self.books)
+        rentals.action_return_book()
+        self.books[0].action_check_availability()
+
+        metrics = library_metrics.get_metrics()
+        create = metrics['rental.create']
+        self.assertEqual(create['count'], 1)
+        self.assertEqual(create['rows'], 3)
+        self.assertGreater(create['queries'], 0)
+        self.assertEqual(sum(create['buckets']), 1)
+        self.assertEqual(metrics['rental.return']['rows'], 3)
+        self.assertEqual(metrics['book.check_availability']['count'], 1)
+
+    def test_02_slow_calls_are_logged(self):
+
+        # Test that calls above the threshold are counted and logged as warnings.
+
+        self.env['ir.config_parameter'].sudo().set_param(library_metrics.SLOW_CALL_PARAM, 0)
+        with self.assertLogs('odoo.addons.library_management.models.library_metrics', 'WARNING') as logs:
+            self._checkout(self.books[:1])
+        self.assertIn('Slow rental.create', logs.output[0])
+        self.assertEqual(library_metrics.get_metrics()['rental.create']['slow'], 1)
+
+    def test_03_dashboard_and_prometheus_output(self):
+
+        # Test that the dashboard and the text exposition show the worker counters.
+
+        self._checkout(self.books[:2])
+        action = self.env['library.metrics.report'].action_open_dashboard()
+        report = self.env['library.metrics.report'].search(action['domain'])
+        line = report.filtered(lambda line: line.operation == 'rental.create')
+        self.assertEqual((line.calls, line.rows), (1, 2))
+        self.assertGreaterEqual(line.p95_ms, line.avg_ms)
+
+        text = library_metrics.render_prometheus()
+        self.assertIn('# TYPE library_call_duration_seconds histogram', text)
+        self.assertRegex(text, r'library_call_duration_seconds_bucket\{operation="rental.create",pid="\d+",le="\+Inf"\} 1')
+        self.assertRegex(text, r'library_call_records_total\{operation="rental.create",pid="\d+"\} 2')
+
+        self.env['library.metrics.report'].action_reset_metrics()
+        self.assertFalse(library_metrics.get_metrics())
+
+    def test_04_failed_calls_are_recorded(self):
+
+        # Test that a call raising an error is still recorded and counted as an error.
+
+        rental = self._checkout(self.books[:1])
+        rental.action_return_book()
+        with self.assertRaises(UserError):
+            rental.action_mark_overdue()
+        stats = library_metrics.get_metrics()['rental.mark_overdue']
+        self.assertEqual((stats['count'], stats['errors'], stats['rows']), (1, 1, 1))
+        self.assertRegex(
+            library_metrics.render_prometheus(),
+            r'library_call_errors_total\{operation="rental.mark_overdue",pid="\d+"\} 1',
+        )
+
+
+@tagged('post_install', '-at_install')
+class TestLibraryMetricsEndpoint(HttpCase):
+
+    def test_01_endpoint_requires_token(self):
+
+        # Test that the metrics endpoint stays hidden without the configured bearer token.
+
+        self.assertEqual(self.url_open('/library/metrics').status_code, 404)
+        self.env['ir.config_parameter'].sudo().set_param('library_management.metrics_token', 's3cret')
+        self.assertEqual(self.url_open('/library/metrics?token=wrong').status_code, 404)
+
+        response = self.url_open('/library/metrics', headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('library_call_duration_seconds', response.text)
@@ -0,0 +1,84 @@
+from odoo.addons.base.tests.common import MockSmtplibCase
+from odoo.tests.common import TransactionCase
+from datetime import date, timedelta
+
+
+class TestLibraryReminder(TransactionCase, MockSmtplibCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.books = cls.env['library.book'].create([{
+            'name': f'Late Book {index}',
+        } for index in range(3)])
+        cls.member, cls.other = cls.env['library.member'].create([{
+            'name': 'Digest Member',
+            'email': 'digest.member@example.com',
+        }, {
+            'name': 'Other Member',
+            'email': 'other.member@example.com',
+        }])
+        cls.env['ir.config_parameter'].sudo().set_param('library_management.reminder_mode', 'digest')
+        cls.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': member.id,
+            'checkout_date': date.today() - timedelta(days=21),
+            'due_date': date.today() - timedelta(days=7),
+        } for book, member in zip(cls.books, (cls.member, cls.member, cls.other))])
+
+    def _digests(self):
+        return self.env['mail.mail'].search([
+            ('model', '=', 'library.member'),
+            ('res_id', 'in', (self.member | self.other).ids),
+        ])
+
+    def test_01_one_digest_per_member(self):
+
+        # Test that overdue rentals are grouped into one queued email per member, once per interval.
+
+        self.env['library.rental']._cron_check_overdue_rentals()
+
+        digests = self._digests()
+        self.assertEqual(len(digests), 2)
+        self.assertEqual(set(digests.mapped('state')), {'outgoing'})
+        digest = digests.filtered(lambda mail: mail.res_id == self.member.id)
+        self.assertIn('Late Book 0', digest.body_html)
+        self.assertIn('Late Book 1', digest.body_html)
+        self.assertEqual(self.member.last_overdue_reminder_date, date.today())
+        self.assertEqual(self.member.overdue_digest_mail_id, digest)
+        self.assertFalse(self.env['mail.mail'].search_count([('model', '=', 'library.rental')]))
+
+        self.env['library.rental']._cron_check_overdue_rentals()
+        self.assertEqual(len(self._digests()), 2)
+
+    def test_02_queue_throttling_and_retry(self):
+
+        # Test that digests are spread over the queue, sent by the mail cron and retried after a failure.
+
+        self.env['ir.config_parameter'].sudo().set_param('library_management.reminder_rate', 1)
+        self.env['library.rental']._cron_check_overdue_rentals()
+        digests = self._digests().sorted('res_id')
+        self.assertEqual(
+            digests[1].scheduled_date - digests[0].scheduled_date, timedelta(minutes=1),
+        )
+
+        digests[0].write({'state': 'exception', 'failure_type': 'mail_smtp'})
+        digests[1].write({'state': 'exception', 'failure_type': 'mail_email_invalid'})
+        self.env['library.member']._cron_retry_overdue_digests()
+        self.assertEqual(digests.mapped('state'), ['outgoing', 'exception'])
+
+        with self.mock_smtplib_connection():
+            digests[0].send()
+        self.assertEqual(len(self.emails), 1)
+        self.assertIn('digest.member@example.com', self.emails[0]['smtp_to_list'])
+
+    def test_03_zero_interval_sends_once_per_run(self):
+
+        # Test that an interval of 0 is treated as one day instead of reminding the same members forever.
+
+        self.env['ir.config_parameter'].sudo().set_param('library_management.reminder_interval_days', 0)
+        self.env['library.member']._send_overdue_digests(batch_size=1)
+        self.assertEqual(len(self._digests()), 2)
+        self.env['library.member']._send_overdue_digests(batch_size=1)
+        self.assertEqual(len(self._digests()), 2)
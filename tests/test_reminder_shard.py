@@ -0,0 +1,187 @@
+from odoo.exceptions import ValidationError
+from odoo.tests.common import TransactionCase
+from datetime import date, datetime, time, timedelta
+from freezegun import freeze_time
+
+SHARDS = 12
+
+
+class TestLibraryReminderShard(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.today = date.today()
+        cls.members = cls.env['library.member'].create([{
+            'name': f'Shard Member {index}',
+            'email': f'shard.member{index}@example.com',
+        } for index in range(24)])
+        cls.books = cls.env['library.book'].create([{
+            'name': f'Shard Book {index}',
+        } for index in range(120)])
+        # due dates spread from eight days ago to a week ahead
+        cls.rentals = cls.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': cls.members[index % len(cls.members)].id,
+            'checkout_date': cls.today - timedelta(days=30),
+            'due_date': cls.today + timedelta(days=index % 15 - 8),
+        } for index, book in enumerate(cls.books)])
+        cls.ICP = cls.env['ir.config_parameter'].sudo()
+        cls.ICP.set_param('library_management.reminder_shards', SHARDS)
+        cls.Shard = cls.env['library.reminder.shard']
+
+    def _at(self, day, hour):
+        return freeze_time(datetime.combine(day, time(hour)))
+
+    def _mails(self, subject):
+        return self.env['mail.mail'].search([
+            ('model', '=', 'library.rental'),
+            ('res_id', 'in', self.rentals.ids),
+            ('subject', 'like', subject),
+        ])
+
+    def test_01_shards_spread_over_the_day(self):
+
+        # Test that a day is planned once and shards only run once their slot is reached.
+
+        with self._at(self.today, 7):
+            self.Shard._cron_run_shards()
+        shards = self.Shard.search([('reminder_date', '=', self.today)])
+        self.assertEqual(len(shards), SHARDS)
+        self.assertEqual(set(shards.mapped('state')), {'pending'})
+        self.assertFalse(self._mails('Due soon'))
+
+        # ten hours for twelve shards, one every 50 minutes from 08:00
+        with self._at(self.today, 10):
+            self.Shard._cron_run_shards()
+        done = shards.filtered(lambda shard: shard.state == 'done')
+        self.assertEqual(done.mapped('bucket'), [0, 1, 2])
+
+        with self._at(self.today, 19):
+            self.Shard._cron_run_shards()
+            self.Shard._cron_run_shards()
+        self.assertEqual(set(shards.mapped('state')), {'done'})
+        self.assertEqual(self.Shard.search_count([('reminder_date', '=', self.today)]), SHARDS)
+
+        due_soon = self.rentals.filtered(lambda rental: rental.due_date == self.today + timedelta(days=2))
+        self.assertEqual(sorted(self._mails('Due soon').mapped('res_id')), sorted(due_soon.ids))
+        self.assertEqual(sum(shards.mapped('due_soon_count')), len(due_soon))
+
+    def test_02_several_days_of_reminders(self):
+
+        # Test a week of shards: late rentals are flagged nightly and reminded only on the configured offsets.
+
+        reminded = set()
+        for offset in range(7):
+            day = self.today + timedelta(days=offset)
+            with self._at(day, 1):
+                self.env['library.rental']._cron_check_overdue_rentals()
+            with self._at(day, 19):
+                self.Shard._cron_run_shards()
+                self.Shard._cron_run_shards()
+
+            self.assertEqual(
+                set(self.Shard.search([('reminder_date', '=', day)]).mapped('state')), {'done'},
+            )
+            late = self.rentals.filtered(lambda rental: rental.due_date < day)
+            self.assertEqual(set(late.mapped('state')), {'overdue'})
+            self.assertFalse(
+                (self.rentals - late).filtered(lambda rental: rental.state == 'overdue'),
+            )
+            expected = {
+                (rental.id, day) for rental in late
+                if (day - rental.due_date).days in (1, 3, 7)
+            }
+            reminded |= expected
+            self.assertEqual(len(self._mails('Overdue Book Reminder')), len(reminded))
+
+        due_soon = self.rentals.filtered(
+            lambda rental: self.today + timedelta(days=2) <= rental.due_date <= self.today + timedelta(days=8)
+        )
+        self.assertEqual(len(self._mails('Due soon')), len(due_soon))
+
+    def test_03_nightly_check_leaves_reminders_to_shards(self):
+
+        # Test that the nightly check still flags late rentals but leaves the reminders to the shards.
+
+        self.env['library.rental']._cron_check_overdue_rentals()
+        late = self.rentals.filtered(lambda rental: rental.due_date < self.today)
+        self.assertEqual(set(late.mapped('state')), {'overdue'})
+        self.assertEqual((self.rentals - late).mapped('state'), ['ongoing'] * len(self.rentals - late))
+        self.assertFalse(self._mails('Overdue Book Reminder'))
+        self.assertEqual(min(late.mapped('days_overdue')), 1)
+
+        with self._at(self.today, 19):
+            self.Shard._cron_run_shards()
+            self.Shard._cron_run_shards()
+        reminded = late.filtered(lambda rental: (self.today - rental.due_date).days in (1, 3, 7))
+        self.assertEqual(sorted(self._mails('Overdue Book Reminder').mapped('res_id')), sorted(reminded.ids))
+
+    def test_04_bucket_count_fixed_for_the_day(self):
+
+        # Test that changing the number of shards only applies from the next day.
+
+        with self._at(self.today, 7):
+            self.Shard._cron_run_shards()
+        self.ICP.set_param('library_management.reminder_shards', 4)
+        with self._at(self.today, 12):
+            self.Shard._cron_run_shards()
+        with self._at(self.today + timedelta(days=1), 7):
+            self.Shard._cron_run_shards()
+        self.assertEqual(self.Shard.search_count([('reminder_date', '=', self.today)]), SHARDS)
+        self.assertEqual(self.Shard.search_count([('reminder_date', '=', self.today + timedelta(days=1))]), 4)
+
+    def test_05_missed_shards_are_caught_up(self):
+
+        # Test that shards left pending on a day the cron didn't run are still sent the next day.
+
+        with self._at(self.today, 7):
+            self.Shard._cron_run_shards()
+        with self._at(self.today + timedelta(days=1), 7):
+            self.Shard._cron_run_shards()
+        shards = self.Shard.search([('reminder_date', '=', self.today)])
+        self.assertEqual(set(shards.mapped('state')), {'done'})
+
+        due_soon = self.rentals.filtered(lambda rental: rental.due_date == self.today + timedelta(days=2))
+        self.assertEqual(sorted(self._mails('Due soon').mapped('res_id')), sorted(due_soon.ids))
+        self.assertFalse(self.Shard.search_count([
+            ('reminder_date', '=', self.today + timedelta(days=1)), ('state', '=', 'done'),
+        ]))
+
+    def test_06_digest_shards_respect_the_interval(self):
+
+        # Test that in digest mode a member gets one digest per interval, however many shards remind them.
+
+        self.ICP.set_param('library_management.reminder_mode', 'digest')
+        self.ICP.set_param('library_management.reminder_interval_days', 7)
+        for offset in range(3):
+            day = self.today + timedelta(days=offset)
+            with self._at(day, 1):
+                self.env['library.rental']._cron_check_overdue_rentals()
+            with self._at(day, 19):
+                self.Shard._cron_run_shards()
+                self.Shard._cron_run_shards()
+
+        digests = self.env['mail.mail'].search([
+            ('model', '=', 'library.member'),
+            ('res_id', 'in', self.members.ids),
+        ])
+        self.assertTrue(digests)
+        self.assertEqual(len(digests), len(set(digests.mapped('res_id'))))
+        self.assertFalse(self._mails('Overdue Book Reminder'))
+
+    def test_07_post_due_offsets_start_the_day_after(self):
+
+        # Test that a post-due offset of 0 is refused and never flags rentals due today.
+
+        with self.assertRaises(ValidationError):
+            self.env['res.config.settings'].create({'library_reminder_post_due_days': '0,3'})
+
+        self.ICP.set_param('library_management.reminder_post_due_days', '0,1')
+        with self._at(self.today, 19):
+            self.Shard._cron_run_shards()
+            self.Shard._cron_run_shards()
+        due_today = self.rentals.filtered(lambda rental: rental.due_date == self.today)
+        self.assertEqual(set(due_today.mapped('state')), {'ongoing'})
+        self.assertFalse(self._mails('Overdue Book Reminder').filtered(lambda mail: mail.res_id in due_today.ids))
@@ -1,6 +1,10 @@
-from odoo.tests.common import TransactionCase
+from odoo.tests.common import TransactionCase, new_test_user
 from odoo.exceptions import UserError, ValidationError
 from datetime import date, timedelta
+import csv
+import io
+import json
+from unittest.mock import patch
 
 
 class TestLibraryRental(TransactionCase):
@@ -184,4 +188,297 @@ class TestLibraryRental(TransactionCase):
         rental.action_return_book()
 
         rental.unlink()
-        self.assertFalse(rental.exists())
\ No newline at end of file
+        self.assertFalse(rental.exists())
+
+    def test_10_cron_queues_reminder_per_overdue_rental(self):
+
+        # Test that the cron queues one reminder for every overdue rental instead of sending inline.
+
+        rentals = self.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today() - timedelta(days=21),
+            'due_date': date.today() - timedelta(days=7),
+        } for book in (self.book_1, self.book_2)])
+
+        self.env['library.rental']._cron_check_overdue_rentals(batch_size=1)
+
+        self.assertEqual(set(rentals.mapped('state')), {'overdue'})
+        mails = self.env['mail.mail'].search([
+            ('model', '=', 'library.rental'),
+            ('res_id', 'in', rentals.ids),
+        ])
+        self.assertEqual(len(mails), 2)
+        self.assertEqual(set(mails.mapped('state')), {'outgoing'})
+        self.assertFalse(self.env['library.job.cursor']._get_position('overdue_sweep'))
+
+    def test_11_cron_resumes_from_cursor(self):
+
+        # Test that an interrupted sweep resumes after the last processed rental.
+
+        rental_1, rental_2 = self.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today() - timedelta(days=21),
+            'due_date': date.today() - timedelta(days=7),
+        } for book in (self.book_1, self.book_2)])
+
+        self.env['library.job.cursor']._set_position('overdue_sweep', f'{date.today()}:{rental_1.id}')
+        self.env['library.rental']._cron_check_overdue_rentals()
+
+        self.assertEqual(rental_1.state, 'ongoing')
+        self.assertEqual(rental_2.state, 'overdue')
+
+    def test_12_bulk_checkout(self):
+
+        # Test that a batch checkout flips every book and rejects duplicate books.
+
+        rentals = self.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        } for book in (self.book_1, self.book_2)])
+
+        self.assertEqual(len(rentals), 2)
+        self.assertEqual(set((self.book_1 | self.book_2).mapped('status')), {'rented'})
+
+        rentals.action_return_book()
+        with self.assertRaises(UserError):
+            self.env['library.rental'].create([{
+                'book_id': self.book_1.id,
+                'member_id': self.member.id,
+                'checkout_date': date.today(),
+                'due_date': date.today() + timedelta(days=14),
+            }] * 2)
+
+    def test_13_database_rejects_second_active_rental(self):
+
+        # Test that the partial unique index rejects a second active rental of a book.
+
+        rental = self.env['library.rental'].create({
+            'book_id': self.book_1.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        })
+        rental.copy_id.status = 'available'
+
+        with self.assertRaises(ValidationError), self.cr.savepoint():
+            self.env['library.rental'].create({
+                'book_id': self.book_1.id,
+                'member_id': self.member.id,
+                'checkout_date': date.today(),
+                'due_date': date.today() + timedelta(days=14),
+            })
+        self.assertEqual(rental.state, 'ongoing')
+
+    def test_14_member_counters_follow_state_changes(self):
+
+        # Test that member counters stay correct through bulk state transitions.
+
+        rentals = self.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today() - timedelta(days=21),
+            'due_date': date.today() - timedelta(days=7),
+        } for book in (self.book_1, self.book_2)])
+
+        self.assertEqual(self.member.rental_count, 2)
+        self.assertEqual(self.member.active_rental_count, 2)
+
+        rentals.write({'state': 'overdue'})
+        self.assertEqual(self.member.active_rental_count, 0)
+        self.assertEqual(self.member.overdue_rental_count, 2)
+
+    def test_15_cron_refreshes_days_overdue(self):
+
+        # Test that the cron materializes days_overdue for active rentals.
+
+        rental = self.env['library.rental'].create({
+            'book_id': self.book_1.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today() - timedelta(days=21),
+            'due_date': date.today() - timedelta(days=7),
+        })
+        self.env.flush_all()
+        self.env.cr.execute(
+            "UPDATE library_rental SET days_overdue = 1 WHERE id = %s", [rental.id]
+        )
+        rental.invalidate_recordset()
+
+        self.env['library.rental']._cron_check_overdue_rentals()
+
+        self.assertEqual(rental.days_overdue, 7)
+        self.assertEqual(
+            self.env['library.rental'].search([('days_overdue', '>', 5)]), rental
+        )
+
+    def test_16_bulk_return_collects_errors(self):
+
+        # Test that returning several rentals at once returns all of them and reports the rest.
+
+        rental_1, rental_2 = self.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        } for book in (self.book_1, self.book_2)])
+        rental_1.action_return_book()
+
+        action = (rental_1 | rental_2).action_return_book()
+
+        self.assertEqual(action['tag'], 'display_notification')
+        self.assertEqual(rental_2.state, 'returned')
+        self.assertEqual(set((self.book_1 | self.book_2).mapped('status')), {'available'})
+        with self.assertRaises(UserError):
+            rental_1.action_return_book()
+
+    def test_17_return_wizard_by_isbn(self):
+
+        # Test that scanned ISBNs return the matching rentals and report unknown codes.
+
+        rentals = self.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        } for book in (self.book_1, self.book_2)])
+
+        wizard = self.env['library.rental.return.wizard'].create({
+            'isbn_list': f'{self.book_1.isbn}\n{self.book_2.isbn}\n000-UNKNOWN\n',
+        })
+        action = wizard.action_return_books()
+
+        self.assertEqual(set(rentals.mapped('state')), {'returned'})
+        self.assertIn('000-UNKNOWN', action['params']['message'])
+
+    def test_18_tracking_policy_on_batch_paths(self):
+
+        # Test that batch transitions follow the tracking policy while single edits stay tracked.
+
+        ICP = self.env['ir.config_parameter'].sudo()
+        Message = self.env['mail.message']
+        rentals = self.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today() - timedelta(days=21),
+            'due_date': date.today() - timedelta(days=7),
+        } for book in (self.book_1, self.book_2)])
+        domain = [('model', '=', 'library.rental'), ('res_id', 'in', rentals.ids)]
+        self.assertEqual(Message.search_count(domain), 1)
+
+        ICP.set_param('library_management.tracking_policy', 'none')
+        before = Message.search_count(domain)
+        rentals._process_overdue_batch(False)
+        self.assertEqual(Message.search_count(domain), before)
+
+        ICP.set_param('library_management.tracking_policy', 'summary')
+        rentals.action_return_book()
+        self.assertEqual(Message.search_count(domain), before + 1)
+
+        rental = self.env['library.rental'].create({
+            'book_id': self.book_1.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        })
+        rental.due_date = date.today() + timedelta(days=21)
+        self.env.flush_all()
+        self.assertTrue(rental.message_ids.tracking_value_ids)
+
+    def test_19_export_history_streams_rows(self):
+
+        # Test that the history export writes one row per rental in CSV and JSONL.
+
+        rentals = self.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today() - timedelta(days=3),
+            'due_date': date.today() + timedelta(days=11),
+        } for book in (self.book_1, self.book_2)])
+        rentals[0].action_return_book()
+        domain = [('id', 'in', rentals.ids)]
+
+        output = io.BytesIO()
+        count = self.env['library.rental']._export_history(output, 'csv', domain, chunk_size=1)
+        rows = list(csv.DictReader(io.StringIO(output.getvalue().decode())))
+        self.assertEqual(count, 2)
+        self.assertEqual([row['book'] for row in rows], ['Test Book 1', 'Test Book 2'])
+        self.assertEqual([row['state'] for row in rows], ['returned', 'ongoing'])
+        self.assertEqual(rows[0]['return_date'], str(date.today()))
+
+        output = io.BytesIO()
+        self.env['library.rental']._export_history(output, 'jsonl', domain)
+        lines = [json.loads(line) for line in output.getvalue().decode().splitlines()]
+        self.assertEqual([line['id'] for line in lines], rentals.ids)
+        self.assertEqual(lines[1]['member'], 'Test Member')
+
+        # the export only sees the rentals the user's record rules let through
+        clerk = new_test_user(self.env, 'export_clerk', groups='library_management.group_library_user')
+        self.env['ir.rule'].create({
+            'name': 'Export clerk sees one book',
+            'model_id': self.env['ir.model']._get_id('library.rental.history'),
+            'domain_force': f"[('book_id', '=', {self.book_2.id})]",
+        })
+        output = io.BytesIO()
+        count = self.env['library.rental'].with_user(clerk)._export_history(output, 'csv', domain)
+        rows = list(csv.DictReader(io.StringIO(output.getvalue().decode())))
+        self.assertEqual((count, [row['book'] for row in rows]), (1, ['Test Book 2']))
+
+    def test_20_renames_propagate_eventually(self):
+
+        # Test that deferred renames reach every rental through bounded batches of the background job.
+
+        Rental = self.env['library.rental']
+        rentals = Rental.create([{
+            'book_id': book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today() - timedelta(days=20),
+            'due_date': date.today() - timedelta(days=6),
+        } for book in (self.book_1, self.book_2)])
+        rentals.action_return_book()
+        rentals |= Rental.create({
+            'book_id': self.book_1.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        })
+
+        self.member.name = 'Renamed Member'
+        self.book_1.name = 'Fixed Title'
+        self.env.flush_all()
+        self.assertEqual(set(rentals.mapped('member_name')), {'Test Member'})
+        self.assertTrue(self.member.rental_names_dirty)
+        self.assertTrue(self.book_1.rental_names_dirty)
+
+        # the unstored email is read from the member prefetched by the batch
+        self.assertEqual(rentals.mapped('member_email'), ['test.member@example.com'] * 3)
+
+        Rental._cron_sync_names(batch_size=1)
+        self.assertEqual(set(rentals.mapped('member_name')), {'Renamed Member'})
+        self.assertEqual(rentals.filtered(lambda rental: rental.book_id == self.book_1).mapped('book_title'), ['Fixed Title'] * 2)
+        self.assertFalse(self.member.rental_names_dirty)
+        self.assertFalse(self.book_1.rental_names_dirty)
+
+        self.env['ir.config_parameter'].sudo().set_param('library_management.names_propagation', 'immediate')
+        self.member.name = 'Test Member'
+        self.assertEqual(set(rentals.mapped('member_name')), {'Test Member'})
+        self.assertFalse(self.member.rental_names_dirty)
+
+    def test_21_sweep_leaves_the_registry_cache_alone(self):
+
+        # Test that saving the sweep cursor doesn't invalidate the caches of every worker.
+
+        self.env['library.rental'].create([{
+            'book_id': book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today() - timedelta(days=21),
+            'due_date': date.today() - timedelta(days=7),
+        } for book in (self.book_1, self.book_2)])
+        self.env['ir.config_parameter'].sudo().set_param('library_management.reminder_shards', 4)
+
+        registry = self.env.registry
+        with patch.object(registry, 'clear_cache', wraps=registry.clear_cache) as clear_cache:
+            self.env['library.rental']._cron_check_overdue_rentals(batch_size=1)
+        self.assertFalse(clear_cache.called)
@@ -0,0 +1,75 @@
+from odoo.tests.common import TransactionCase
+from datetime import date, timedelta
+
+
+class TestLibraryRentalArchive(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.book = cls.env['library.book'].create({
+            'name': 'Archived Book',
+        })
+        cls.member = cls.env['library.member'].create({
+            'name': 'Archive Member',
+            'email': 'archive.member@example.com',
+        })
+
+    def _returned_rental(self, days_ago):
+        checkout = date.today() - timedelta(days=days_ago)
+        rental = self.env['library.rental'].create({
+            'book_id': self.book.id,
+            'member_id': self.member.id,
+            'checkout_date': checkout,
+            'due_date': checkout + timedelta(days=14),
+        })
+        rental.action_return_book()
+        rental.return_date = checkout + timedelta(days=10)
+        return rental
+
+    def test_01_archive_moves_old_returned_rentals(self):
+
+        # Test that old returned rentals leave the hot table with their id and chatter.
+
+        old = self._returned_rental(500)
+        recent = self._returned_rental(30)
+        old.message_post(body='Returned with a torn cover')
+        old_id = old.id
+        ongoing = self.env['library.rental'].create({
+            'book_id': self.book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        })
+
+        self.env['library.rental.archive']._cron_archive_rentals(batch_size=1)
+
+        Rental = self.env['library.rental']
+        self.assertFalse(Rental.browse(old_id).exists())
+        self.assertEqual(Rental.search([('member_id', '=', self.member.id)]), recent | ongoing)
+        archived = self.env['library.rental.archive'].browse(old_id)
+        self.assertTrue(archived.exists())
+        self.assertEqual(archived.book_title, 'Archived Book')
+        self.assertIn('torn cover', ' '.join(archived.message_ids.mapped('body')))
+
+    def test_02_history_spans_archive(self):
+
+        # Test that member and book history and totals still include archived rentals.
+
+        self._returned_rental(500)
+        self._returned_rental(400)
+        self._returned_rental(30)
+        self.env['library.rental.archive']._cron_archive_rentals()
+
+        self.assertEqual(len(self.member.rental_history_ids), 3)
+        self.assertEqual(self.member.rental_history_ids.filtered('archived').mapped('state'), ['returned'] * 2)
+        self.assertEqual(self.book.rental_count, 3)
+
+        self.env['library.rental'].create({
+            'book_id': self.book.id,
+            'member_id': self.member.id,
+            'checkout_date': date.today(),
+            'due_date': date.today() + timedelta(days=14),
+        })
+        self.assertEqual((self.member.rental_count, self.member.active_rental_count), (4, 1))
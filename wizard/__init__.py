@@ -0,0 +1,2 @@
+from . import library_rental_return_wizard
+from . import library_import_wizard
@@ -0,0 +1,313 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL, split_every
+from ..models.library_member import EMAIL_PATTERN
+from collections import defaultdict
+import base64
+import csv
+import io
+import json
+import logging
+
+import psycopg2
+
+_logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_COLUMNS = {
+    "author": ("name", "biography"),
+    "book": ("name", "isbn", "author", "publication_date"),
+    "member": ("name", "email"),
+}
+
+
+class LibraryImportWizard(models.TransientModel):
+
+    _name = "library.import.wizard"
+    _description = "Import Catalog Data"
+
+    # Fields
+    import_type = fields.Selection(
+        selection=[("book", "Books"), ("author", "Authors"), ("member", "Members")],
+        string="Import",
+        required=True,
+        default="book",
+        help="Kind of records contained in the file",
+    )
+    file = fields.Binary(string="File", required=True, attachment=False)
+    filename = fields.Char(string="File Name")
+    file_format = fields.Selection(
+        selection=[("csv", "CSV"), ("jsonl", "JSON Lines")],
+        string="Format",
+        required=True,
+        default="csv",
+        help="CSV with a header row, or one JSON object per line",
+    )
+    chunk_size = fields.Integer(
+        string="Chunk Size",
+        default=IMPORT_CHUNK_SIZE,
+        help="Number of rows written per database round",
+    )
+    state = fields.Selection(
+        selection=[("draft", "Draft"), ("done", "Done")], default="draft"
+    )
+    created_count = fields.Integer(string="Created", readonly=True)
+    updated_count = fields.Integer(string="Updated", readonly=True)
+    error_count = fields.Integer(string="Errors", readonly=True)
+    report = fields.Text(string="Error Report", readonly=True)
+
+    # Methods
+    @api.onchange("filename")
+    def _onchange_filename(self):
+        if self.filename and self.filename.lower().endswith((".jsonl", ".ndjson")):
+            self.file_format = "jsonl"
+        elif self.filename and self.filename.lower().endswith(".csv"):
+            self.file_format = "csv"
+
+    def _iter_rows(self, fileobj, fmt):
+        # yields (line number, values, error) without loading the file in memory
+        text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for values in reader:
+                yield reader.line_num, values, None
+            return
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                values = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f"invalid JSON ({e})"
+                continue
+            if isinstance(values, dict):
+                yield line_no, values, None
+            else:
+                yield line_no, None, "expected a JSON object"
+
+    def _clean_row(self, values):
+        columns = IMPORT_COLUMNS[self.import_type]
+        row = {
+            column: str(values[column]).strip()
+            for column in columns if values.get(column) not in (None, "")
+        }
+        if not row.get("name"):
+            return row, "missing name"
+        if self.import_type == "member":
+            if not EMAIL_PATTERN.match(row.get("email", "")):
+                return row, f"invalid email '{row.get('email', '')}'"
+        if self.import_type == "book" and row.get("publication_date"):
+            try:
+                row["publication_date"] = fields.Date.to_date(row["publication_date"])
+            except ValueError:
+                return row, f"invalid publication date '{row['publication_date']}'"
+        return row, None
+
+    def _import_file(self, fileobj, fmt=None):
+        self.ensure_one()
+        result = {"created": 0, "updated": 0, "errors": []}
+        author_cache = {}
+        for chunk in split_every(self.chunk_size or IMPORT_CHUNK_SIZE, self._iter_rows(fileobj, fmt or self.file_format)):
+            # rows rejected by the parser or the bulk validation never reach
+            # the database, the others are written in one round
+            rows = []
+            for line_no, values, error in chunk:
+                if not error:
+                    values, error = self._clean_row(values)
+                if error:
+                    result["errors"].append((line_no, error))
+                else:
+                    rows.append((line_no, values))
+            if not rows:
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    outcome = self._import_chunk(rows, author_cache)
+            except (psycopg2.Error, UserError, ValidationError):
+                # isolate the faulty rows, the rest of the chunk still goes in
+                outcome = {"created": 0, "updated": 0, "authors": {}}
+                for row in rows:
+                    try:
+                        with self.env.cr.savepoint():
+                            row_outcome = self._import_chunk([row], author_cache)
+                    except (psycopg2.Error, UserError, ValidationError) as e:
+                        result["errors"].append((row[0], str(e).strip()))
+                        continue
+                    outcome["created"] += row_outcome["created"]
+                    outcome["updated"] += row_outcome["updated"]
+                    author_cache.update(row_outcome["authors"])
+            result["created"] += outcome["created"]
+            result["updated"] += outcome["updated"]
+            author_cache.update(outcome["authors"])
+            self.env.invalidate_all()
+        if self.import_type == "book" and result["created"]:
+            # chunks defer the ISBN lookup cache, it is cleared once per file
+            self.env.registry.clear_cache()
+        _logger.info(
+            "Imported %s rows: %s created, %s updated, %s error(s)",
+            self.import_type, result["created"], result["updated"], len(result["errors"]),
+        )
+        return result
+
+    def _import_chunk(self, rows, author_cache):
+        # author_cache is only extended by the caller once the chunk is
+        # committed to the savepoint, newly created ids come back in "authors"
+        if self.import_type == "author":
+            return self._import_authors(rows)
+        if self.import_type == "member":
+            return self._import_members(rows)
+        return self._import_books(rows, author_cache)
+
+    def _update_column(self, model, column, values, extra=None):
+        # Writes a value per record in one UPDATE ... FROM unnest, values is
+        # {id: value}. Only for plain columns that no stored field depends
+        # on, the ORM business logic is the caller's job.
+        if not values:
+            return
+        Model = self.env[model]
+        Model.flush_model([column])
+        self.env.cr.execute(SQL(
+            """
+            UPDATE %(table)s target
+               SET %(column)s = source.value,
+                   %(extra)s
+                   write_uid = %(uid)s,
+                   write_date = now() AT TIME ZONE 'UTC'
+              FROM unnest(%(ids)s::int[], %(values)s::text[]) AS source(id, value)
+             WHERE target.id = source.id
+            """,
+            table=SQL.identifier(Model._table),
+            column=SQL.identifier(column),
+            extra=extra or SQL(),
+            uid=self.env.uid,
+            ids=list(values),
+            values=list(values.values()),
+        ))
+        Model.invalidate_model()
+
+    def _resolve_authors(self, names, author_cache):
+        Author = self.env["library.author"].with_context(tracking_disable=True)
+        resolved = {name: author_cache[name] for name in names if name in author_cache}
+        missing = [name for name in names if name not in resolved]
+        if missing:
+            for author in Author.search_fetch([("name", "in", missing)], ["name"], order="id"):
+                resolved.setdefault(author.name, author.id)
+            new_names = [name for name in missing if name not in resolved]
+            if new_names:
+                new_authors = Author.create([{"name": name} for name in new_names])
+                resolved.update(zip(new_names, new_authors.ids))
+        return resolved
+
+    def _import_authors(self, rows):
+        Author = self.env["library.author"].with_context(tracking_disable=True)
+        pending = {values["name"]: values for line_no, values in rows}
+        existing = {
+            author.name: author
+            for author in Author.search_fetch([("name", "in", list(pending))], ["name", "biography"], order="id desc")
+        }
+        biographies = {}
+        for name, author in existing.items():
+            biography = pending.pop(name).get("biography")
+            if biography and biography != author.biography:
+                biographies[author.id] = biography
+        self._update_column("library.author", "biography", biographies)
+        new_authors = Author.create(list(pending.values()))
+        return {
+            "created": len(new_authors),
+            "updated": len(existing),
+            "authors": dict(zip(pending, new_authors.ids)),
+        }
+
+    def _import_books(self, rows, author_cache):
+        Book = self.env["library.book"].with_context(tracking_disable=True, library_isbn_cache_deferred=True)
+        authors = self._resolve_authors(
+            list(dict.fromkeys(values["author"] for line_no, values in rows if values.get("author"))),
+            author_cache,
+        )
+        # upsert on the normalized ISBN, the last row of the chunk wins
+        pending, without_isbn = {}, []
+        for line_no, values in rows:
+            vals = {
+                "name": values["name"],
+                "author_id": authors.get(values.get("author"), False),
+            }
+            if values.get("publication_date"):
+                vals["publication_date"] = values["publication_date"]
+            normalized = Book._normalize_isbn(values.get("isbn"))
+            if normalized:
+                vals["isbn"] = values["isbn"]
+                pending[normalized] = vals
+            else:
+                without_isbn.append(vals)
+        existing = Book.search_fetch(
+            [("isbn_normalized", "in", list(pending))],
+            ["isbn_normalized", "name", "author_id", "publication_date"],
+        )
+        # only the changed values are written, books sharing the same
+        # changes are written together
+        changes = defaultdict(list)
+        updated = 0
+        for book in existing:
+            vals = pending.pop(book.isbn_normalized, None)
+            if vals:
+                del vals["isbn"]
+                current = {"name": book.name, "author_id": book.author_id.id, "publication_date": book.publication_date}
+                changes[frozenset(
+                    (field, value) for field, value in vals.items() if current[field] != value
+                )].append(book.id)
+                updated += 1
+        for vals, book_ids in changes.items():
+            if vals:
+                Book.browse(book_ids).write(dict(vals))
+        new_books = Book.create(list(pending.values()) + without_isbn)
+        new_authors = {name: author_id for name, author_id in authors.items() if name not in author_cache}
+        return {"created": len(new_books), "updated": updated, "authors": new_authors}
+
+    def _import_members(self, rows):
+        Member = self.env["library.member"].with_context(tracking_disable=True)
+        pending = {values["email"]: values for line_no, values in rows}
+        existing = Member.search_fetch([("email", "in", list(pending))], ["name", "email"], order="id desc")
+        updated = 0
+        names = {}
+        for member in existing:
+            values = pending.pop(member.email, None)
+            if values:
+                updated += 1
+                if values["name"] != member.name:
+                    names[member.id] = values["name"]
+        if names:
+            # renames reach the rentals once per chunk, see library.member.write
+            Rental = self.env["library.rental"]
+            deferred = Rental._names_deferred()
+            self._update_column(
+                "library.member", "name", names,
+                extra=SQL("rental_names_dirty = true,") if deferred else None,
+            )
+            if deferred:
+                Rental._trigger_names_sync()
+            else:
+                Rental._sync_names("member_name", list(names))
+        new_members = Member.create(list(pending.values()))
+        return {"created": len(new_members), "updated": updated, "authors": {}}
+
+    # Action Methods
+    def action_import(self):
+        self.ensure_one()
+        # the form already holds the whole upload, only the parsing is streamed
+        result = self._import_file(io.BytesIO(base64.b64decode(self.file)))
+        errors = sorted(result["errors"])
+        self.write({
+            "state": "done",
+            "created_count": result["created"],
+            "updated_count": result["updated"],
+            "error_count": len(errors),
+            "report": "\n".join(f"Line {line_no}: {error}" for line_no, error in errors) or False,
+        })
+        return {
+            "type": "ir.actions.act_window",
+            "name": "Import Result",
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
@@ -0,0 +1,79 @@
+from odoo import models, fields
+from odoo.exceptions import UserError
+
+
+class LibraryRentalReturnWizard(models.TransientModel):
+
+    _name = "library.rental.return.wizard"
+    _description = "Return Scanned Books"
+
+    # Fields
+    isbn_list = fields.Text(
+        string="Scanned ISBNs",
+        required=True,
+        help="One ISBN or copy barcode per line, as read by the barcode scanner",
+    )
+
+    # Action Methods
+    def action_return_books(self):
+        self.ensure_one()
+        codes = list(dict.fromkeys(
+            code.strip() for code in self.isbn_list.splitlines() if code.strip()
+        ))
+        if not codes:
+            raise UserError("Scan at least one ISBN.")
+
+        # copy barcodes identify the rental directly, an ISBN only does when
+        # a single copy of the title is out
+        copies = self.env["library.book.copy"].search([("barcode", "in", codes)])
+        by_barcode = {copy.barcode: copy for copy in copies}
+        Book = self.env["library.book"]
+        normalized = {
+            code: Book._normalize_isbn(code) for code in codes if code not in by_barcode
+        }
+        books = Book.search([("isbn_normalized", "in", list(normalized.values()))])
+        active_rentals = self.env["library.rental"].search([
+            "|", ("copy_id", "in", copies.ids), ("book_id", "in", books.ids),
+            ("state", "in", ["ongoing", "overdue"]),
+        ])
+        rental_by_copy = {rental.copy_id.id: rental for rental in active_rentals}
+        book_by_isbn = {book.isbn_normalized: book for book in books}
+
+        rentals = self.env["library.rental"]
+        errors = []
+        for code in codes:
+            if code in by_barcode:
+                rental = rental_by_copy.get(by_barcode[code].id)
+                if rental:
+                    rentals |= rental
+                else:
+                    errors.append(f"{code}: '{by_barcode[code].display_name}' is not rented")
+                continue
+            book = book_by_isbn.get(normalized[code])
+            if not book:
+                errors.append(f"{code}: no book with this ISBN")
+                continue
+            book_rentals = active_rentals.filtered(lambda rental: rental.book_id == book) - rentals
+            if not book_rentals:
+                errors.append(f"{code}: '{book.name}' is not rented")
+            elif len(book_rentals) > 1:
+                errors.append(f"{code}: several copies of '{book.name}' are out, scan the copy barcode")
+            else:
+                rentals |= book_rentals
+        if rentals:
+            errors += rentals._return_rentals()[1]
+
+        message = f"{len(rentals)} book(s) returned."
+        if errors:
+            message += "\n" + "\n".join(errors)
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": "Books Returned",
+                "message": message,
+                "type": "warning" if errors else "success",
+                "sticky": bool(errors),
+                "next": {"type": "ir.actions.act_window_close"},
+            },
+        }